@@ -23,6 +23,8 @@
 
 import sys
 
+import dimacs
+
 def trim(s):
     while len(s) > 0 and s[-1] in ' \r\n\t':
         s = s[:-1]
@@ -71,6 +73,9 @@ class CnfException(Exception):
 
 # Save list of clauses, each is a list of literals (zero at end removed)
 # Also saves comment lines
+# The clause body is parsed in bulk when possible, with the variable declarations
+# checked line by line, falling back to reading the whole file line by line
+# for standard input and for files that fail the bulk validation checks.
 class DqcnfReader():
     file = None
     clauses = []
@@ -81,6 +86,20 @@ class DqcnfReader():
     tautologyOK = True
     
     def __init__(self, fname = None):
+        if fname is not None:
+            declarations = []
+            carray = dimacs.readClauses(fname, prefixChars = b'aed', declarations = declarations)
+            if carray is not None:
+                self.nvar = carray.nvar
+                self.universalList = []
+                self.existentialList = []
+                self.dependencyMap = {}
+                foundDict = {}
+                for (lineNumber, line) in declarations:
+                    self.declareVariables(lineNumber, trim(line), foundDict)
+                self.addOuterVariables(foundDict)
+                self.clauses = carray.clauseLists()
+                return
         if fname is None:
             opened = False
             self.file = sys.stdin
@@ -133,43 +152,7 @@ class DqcnfReader():
                 except Exception:
                     raise CnfException("Line %d.  Bad header line '%s'.  Invalid number of variables or clauses" % (lineNumber, line))
             elif line[0] in ['a', 'e', 'd']:
-                vtype = line[0]
-                # Variable declaration
-                try:
-                    vars = [int(s) for s in line[1:].split()]
-                except:
-                    raise CnfException("Line %d.  Non-integer field" % lineNumber)
-                # Last one should be 0
-                if vars[-1] != 0:
-                    raise CnfException("Line %d.  Clause line should end with 0" % lineNumber)
-                vars = vars[:-1]
-                # First make sure all vars are legitimate
-                if vtype == 'd':
-                    v = vars[0]
-                    dvars = vars[1:]
-                    if v <= 0 or v > self.nvar:
-                        raise CnfException("Line %d.  Invalid variable %d" % (lineNumber, v))
-                    foundDict[v] = lineNumber
-                    self.existentialList.append(v)
-                    for u in dvars:
-                        if u not in foundDict or u not in self.universalList:
-                            flist = sorted(foundDict.keys())
-                            print("Declared so far: %s.  Universal: %s" % str(flist), str(self.universalList))
-                            raise CnfException("Line %d.  Invalid dependency variable %d" % (lineNumber, u))
-                    self.dependencyMap[v] = dvars
-                else:
-                    for v in vars:
-                        if v <= 0 or v > self.nvar:
-                            raise CnfException("Line %d.  Invalid variable %d" % (lineNumber, v))
-                        if v in foundDict:
-                            raise CnfException("Line %d.  Variable %d already declared on line %d" % (lineNumber, v, foundDict[v]))
-                        foundDict[v] = lineNumber
-                        if vtype == 'a':
-                            self.universalList.append(v)
-                        else:
-                            self.existentialList.append(v)
-                            self.dependencyMap[v] = list(self.universalList)
-
+                self.declareVariables(lineNumber, line, foundDict)
             else:
                 if nclause == 0:
                     raise CnfException("Line %d.  No header line.  Not cnf" % (lineNumber))
@@ -205,7 +188,50 @@ class DqcnfReader():
 
         if clauseCount != nclause:
             raise CnfException("Line %d: Got %d clauses.  Expected %d" % (lineNumber, clauseCount, nclause))
-        # See if there are any undeclared variables
+        self.addOuterVariables(foundDict)
+
+    # Process variable declaration line.
+    # Dictionary foundDict maps each variable declared so far to its line number.
+    def declareVariables(self, lineNumber, line, foundDict):
+        vtype = line[0]
+        # Variable declaration
+        try:
+            vars = [int(s) for s in line[1:].split()]
+        except:
+            raise CnfException("Line %d.  Non-integer field" % lineNumber)
+        # Last one should be 0
+        if vars[-1] != 0:
+            raise CnfException("Line %d.  Clause line should end with 0" % lineNumber)
+        vars = vars[:-1]
+        # First make sure all vars are legitimate
+        if vtype == 'd':
+            v = vars[0]
+            dvars = vars[1:]
+            if v <= 0 or v > self.nvar:
+                raise CnfException("Line %d.  Invalid variable %d" % (lineNumber, v))
+            foundDict[v] = lineNumber
+            self.existentialList.append(v)
+            for u in dvars:
+                if u not in foundDict or u not in self.universalList:
+                    flist = sorted(foundDict.keys())
+                    print("Declared so far: %s.  Universal: %s" % str(flist), str(self.universalList))
+                    raise CnfException("Line %d.  Invalid dependency variable %d" % (lineNumber, u))
+            self.dependencyMap[v] = dvars
+        else:
+            for v in vars:
+                if v <= 0 or v > self.nvar:
+                    raise CnfException("Line %d.  Invalid variable %d" % (lineNumber, v))
+                if v in foundDict:
+                    raise CnfException("Line %d.  Variable %d already declared on line %d" % (lineNumber, v, foundDict[v]))
+                foundDict[v] = lineNumber
+                if vtype == 'a':
+                    self.universalList.append(v)
+                else:
+                    self.existentialList.append(v)
+                    self.dependencyMap[v] = list(self.universalList)
+
+    # Add any undeclared variables as existential variables with no dependencies
+    def addOuterVariables(self, foundDict):
         outerVars = [v for v in range(1, self.nvar+1) if v not in foundDict]
         for v in outerVars:
             # These must be added as existential variables in first quantifier block
@@ -0,0 +1,335 @@
+# Bulk parsing of DIMACS CNF files
+# Maps the file into memory, converts all of the clause literals with a single NumPy call,
+# and validates them with array operations over the whole file.
+# Files that NumPy can't handle, or that fail validation, are rejected,
+# and the caller should then use a line-by-line reader,
+# which reports any error along with its line number.
+# Formats with declaration lines between the header and the clauses,
+# such as the quantifier prefix of QCNF files, are parsed by returning
+# the declarations for the caller to check and converting the clause body in bulk.
+# Also supports a binary cache of the clauses, stored next to the CNF file,
+# so that repeated runs on the same file need not parse it again.
+
+#####################################################################################
+# Copyright (c) 2021 Marijn Heule, Randal E. Bryant, Carnegie Mellon University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or
+# substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT
+# NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT
+# OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+########################################################################################
+
+import sys
+import os
+import gc
+import mmap
+import re
+import warnings
+import array
+import struct
+import hashlib
+
+# NumPy is optional.  Without it, all files are rejected
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Clauses stored as flat array of literals (without terminating zeros),
+# with clause i consisting of the literals from offsets[i] up to offsets[i+1]
+class ClauseArray:
+    nvar = 0
+    literals = None
+    offsets = None
+    commentLines = []
+
+    def __init__(self, nvar, literals, offsets, commentLines = []):
+        self.nvar = nvar
+        self.literals = literals
+        self.offsets = offsets
+        self.commentLines = commentLines
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # Convert to list of clauses, each a list of literals.
+    # The lists can't form cycles, so suspend the cyclic garbage collector,
+    # which would otherwise be triggered repeatedly as they are allocated
+    def clauseLists(self):
+        flat = self.literals.tolist()
+        offsets = self.offsets.tolist()
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return [flat[offsets[i]:offsets[i+1]] for i in range(len(offsets) - 1)]
+        finally:
+            if enabled:
+                gc.enable()
+
+# Create ClauseArray from list of clauses, each a list of literals
+def fromLists(nvar, clauses):
+    literals = array.array('i', [lit for clause in clauses for lit in clause])
+    offsets = array.array('q', [0])
+    for clause in clauses:
+        offsets.append(offsets[-1] + len(clause))
+    return ClauseArray(nvar, literals, offsets)
+
+# Whitespace characters, as recognized by str.split
+whiteSpace = b' \t\n\r\x0b\x0c'
+
+# Parse header portion of file: comments and blank lines, followed by 'p cnf' line.
+# Return (nvar, nclause, position following header), or None if not in expected form
+def parseHeader(data, commentLines):
+    pos = 0
+    while pos < len(data):
+        end = data.find(b'\n', pos)
+        if end < 0:
+            end = len(data)
+        line = data[pos:end].rstrip(b'\r')
+        pos = end + 1
+        if len(line.split()) == 0:
+            continue
+        if line[0:1] == b'c':
+            commentLines.append(line.decode('ascii', errors = 'replace'))
+        elif line[0:1] == b'p':
+            fields = line[1:].split()
+            if len(fields) != 3 or fields[0] != b'cnf':
+                return None
+            try:
+                return (int(fields[1]), int(fields[2]), pos)
+            except ValueError:
+                return None
+        else:
+            return None
+    return None
+
+# Parse declaration lines following header, such as the quantifier declarations of QCNF files.
+# These are the lines starting with one of the characters in prefixChars,
+# along with interspersed comments and blank lines.
+# Declarations are added to list as pairs (lineNumber, line).
+# Return position of first line of clause body
+def parsePrefix(data, pos, prefixChars, declarations, commentLines):
+    lineNumber = data[:pos].count(b'\n')
+    while pos < len(data):
+        end = data.find(b'\n', pos)
+        if end < 0:
+            end = len(data)
+        line = data[pos:end].rstrip(b'\r')
+        blank = len(line.split()) == 0
+        if not blank and line[0:1] != b'c' and line[0:1] not in prefixChars:
+            break
+        pos = end + 1
+        lineNumber += 1
+        if blank:
+            continue
+        if line[0:1] == b'c':
+            commentLines.append(line.decode('ascii', errors = 'replace'))
+        else:
+            declarations.append((lineNumber, line.decode('ascii', errors = 'replace')))
+    return pos
+
+# Read clauses from CNF file.
+# For formats with declarations between the header and the clauses,
+# prefixChars gives their starting characters, and they are added to list declarations.
+# Return ClauseArray, or None if the file must be handled by a line-by-line reader
+def readClauses(fname, keepComments = False, prefixChars = b'', declarations = None):
+    if numpy is None:
+        return None
+    try:
+        with open(fname, 'rb') as infile:
+            data = mmap.mmap(infile.fileno(), 0, access = mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Includes files that can't be mapped, such as empty files and pipes
+        return None
+    try:
+        return parseClauses(data, keepComments, prefixChars, declarations)
+    finally:
+        data.close()
+
+def parseClauses(data, keepComments, prefixChars = b'', declarations = None):
+    commentLines = []
+    header = parseHeader(data, commentLines)
+    if header is None:
+        return None
+    (nvar, nclause, pos) = header
+    if len(prefixChars) > 0:
+        pos = parsePrefix(data, pos, prefixChars, declarations, commentLines)
+    if not keepComments:
+        commentLines = None
+    return parseBody(data[pos:], nvar, nclause, commentLines)
+
+# Parse clause body: the portion of the file following the header and any declarations.
+# Comment lines found in the body are added to commentLines.
+# Return ClauseArray, or None if the body must be handled by a line-by-line reader
+def parseBody(body, nvar, nclause, commentLines = None):
+    # Comment lines following the header are rare.  Remove them before conversion
+    if body.startswith(b'c') or b'\nc' in body:
+        if commentLines is not None:
+            commentLines += [line.rstrip(b'\r').decode('ascii', errors = 'replace') for line in re.findall(rb'(?m)^c.*$', body)]
+        body = re.sub(rb'(?m)^c.*(\n|$)', b'', body)
+    if len(body.split(None, 1)) == 0:
+        return None
+    with warnings.catch_warnings():
+        # NumPy only warns when it can't convert the whole string
+        warnings.simplefilter('error')
+        try:
+            literals = numpy.fromstring(body, dtype = numpy.int64, sep = ' ')
+        except (ValueError, DeprecationWarning):
+            return None
+    chars = numpy.frombuffer(body, dtype = numpy.uint8)
+    # Each nonblank line must end with a separate 0
+    isSpace = numpy.zeros(256, dtype = bool)
+    isSpace[list(whiteSpace)] = True
+    spaceChars = isSpace[chars]
+    lineEnds = numpy.flatnonzero(chars == ord('\n'))
+    if len(chars) > 0 and chars[-1] != ord('\n'):
+        lineEnds = numpy.append(lineEnds, len(chars))
+    visible = numpy.flatnonzero(~spaceChars)
+    # Position of last visible character before each line end, and whether it is within the line
+    index = numpy.searchsorted(visible, lineEnds) - 1
+    lineStarts = numpy.concatenate(([0], lineEnds[:-1] + 1))
+    hasVisible = index >= 0
+    lastVisible = visible[numpy.maximum(index, 0)]
+    hasVisible &= lastVisible >= lineStarts
+    lastVisible = lastVisible[hasVisible]
+    if numpy.any(chars[lastVisible] != ord('0')):
+        return None
+    preceding = lastVisible[lastVisible > 0] - 1
+    if numpy.any(~spaceChars[preceding]):
+        return None
+    isZero = literals == 0
+    ends = numpy.flatnonzero(isZero)
+    if len(ends) != numpy.count_nonzero(hasVisible) or len(ends) != nclause:
+        return None
+    # Clauses must be nonempty, with literals in range
+    starts = numpy.concatenate(([0], ends[:-1] + 1))
+    if numpy.any(ends == starts):
+        return None
+    if literals.max() > nvar or literals.min() < -nvar:
+        return None
+    vars = numpy.abs(literals)
+    # No variable can occur twice in a clause.
+    # Combine variable with clause number to get keys that must be distinct
+    clauseIds = numpy.cumsum(isZero) - isZero
+    keys = (clauseIds * (nvar + 1) + vars)[~isZero]
+    keys.sort(kind = 'stable')
+    if numpy.any(keys[1:] == keys[:-1]):
+        return None
+    offsets = numpy.append(starts - numpy.arange(len(starts)), len(literals) - len(ends))
+    return ClauseArray(nvar, literals[~isZero], offsets, [] if commentLines is None else commentLines)
+
+# Binary cache file format (little endian):
+#   Header: magic, size and modification time (ns) of CNF file, number of variables,
+#           number of clauses, number of literals, and SHA-256 digest of CNF file
+#   Literals: 32-bit integers
+#   Offsets: 64-bit integers, one more than the number of clauses
+#   Prefix (optional): 32-bit integers encoding declarations, for formats such as QCNF
+# Comment lines are not cached.
+# Caches for formats with declarations use a different magic string
+cacheMagic = b'BDDCNF01'
+cacheHeader = struct.Struct('<8sQqqqq32s')
+cacheSuffix = '.cache'
+
+def cacheName(fname):
+    return fname + cacheSuffix
+
+def fileDigest(fname):
+    with open(fname, 'rb') as infile:
+        try:
+            data = mmap.mmap(infile.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            return hashlib.sha256().digest()
+        try:
+            return hashlib.sha256(data).digest()
+        finally:
+            data.close()
+
+# Convert array from little-endian storage order to native order, or vice versa
+def littleEndian(a):
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a
+
+# Load clauses from cache for CNF file.
+# When list prefix is given, the cached prefix integers are added to it.
+# Return ClauseArray, or None if there is no cache or it is out of date.
+# Cache is up to date when it records the size and either the modification time or the digest of the CNF file
+def loadCache(fname, magic = cacheMagic, prefix = None):
+    try:
+        stat = os.stat(fname)
+        infile = open(cacheName(fname), 'rb')
+    except OSError:
+        return None
+    try:
+        data = mmap.mmap(infile.fileno(), 0, access = mmap.ACCESS_READ)
+    except ValueError:
+        infile.close()
+        return None
+    try:
+        if len(data) < cacheHeader.size:
+            return None
+        (fileMagic, size, mtime, nvar, nclause, nliteral, digest) = cacheHeader.unpack_from(data, 0)
+        if magic != fileMagic or size != stat.st_size:
+            return None
+        prefixBytes = len(data) - (cacheHeader.size + 4 * nliteral + 8 * (nclause + 1))
+        if prefixBytes < 0 or prefixBytes % 4 != 0 or (prefix is None and prefixBytes > 0):
+            return None
+        if mtime != stat.st_mtime_ns and digest != fileDigest(fname):
+            return None
+        pos = cacheHeader.size
+        literals = array.array('i')
+        literals.frombytes(data[pos:pos + 4 * nliteral])
+        pos += 4 * nliteral
+        offsets = array.array('q')
+        offsets.frombytes(data[pos:pos + 8 * (nclause + 1)])
+        pos += 8 * (nclause + 1)
+        if prefix is not None:
+            values = array.array('i')
+            values.frombytes(data[pos:])
+            prefix += littleEndian(values).tolist()
+        return ClauseArray(nvar, littleEndian(literals), littleEndian(offsets))
+    finally:
+        data.close()
+        infile.close()
+
+# Little-endian bytes of array of integers, stored with array typecode
+def packIntegers(values, typecode):
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return values.astype('<i4' if typecode == 'i' else '<i8').tobytes()
+    return littleEndian(array.array(typecode, values)).tobytes()
+
+# Write cache for CNF file, optionally including list of prefix integers.
+# Written to temporary file and then renamed,
+# so that concurrent runs never see a partial cache.
+# Raises OSError if cache can't be written
+def saveCache(fname, carray, magic = cacheMagic, prefix = None):
+    stat = os.stat(fname)
+    digest = fileDigest(fname)
+    nclause = len(carray)
+    nliteral = len(carray.literals)
+    cname = cacheName(fname)
+    tname = "%s.%d.tmp" % (cname, os.getpid())
+    try:
+        with open(tname, 'wb') as outfile:
+            outfile.write(cacheHeader.pack(magic, stat.st_size, stat.st_mtime_ns,
+                                           carray.nvar, nclause, nliteral, digest))
+            outfile.write(packIntegers(carray.literals, 'i'))
+            outfile.write(packIntegers(carray.offsets, 'q'))
+            if prefix is not None:
+                outfile.write(packIntegers(prefix, 'i'))
+        os.replace(tname, cname)
+    except OSError:
+        if os.path.exists(tname):
+            os.remove(tname)
+        raise
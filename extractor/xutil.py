@@ -4,6 +4,8 @@
 
 import sys
 
+import dimacs
+
 verbLevel = 1
 errfile = sys.stderr
 careful = False
@@ -27,6 +29,8 @@ class CnfException(Exception):
 
 # Read CNF file.
 # Save list of clauses, each is a list of literals (zero at end removed)
+# Files are parsed in bulk when possible, falling back to reading line by line
+# for standard input and for files that fail the bulk validation checks.
 class CnfReader():
     file = None
     clauses = []
@@ -35,6 +39,15 @@ class CnfReader():
     reason = None
     
     def __init__(self, fname = None, maxclause = None, rejectClause = None):
+        self.nvar = 0
+        self.clauses = []
+        self.reason = None
+        if fname is not None:
+            carray = dimacs.readClauses(fname)
+            if carray is not None:
+                self.nvar = carray.nvar
+                self.addClauses(carray.clauseLists(), maxclause, rejectClause)
+                return
         if fname is None:
             opened = False
             self.file = sys.stdin
@@ -44,9 +57,6 @@ class CnfReader():
                 self.file = open(fname, 'r')
             except Exception:
                 raise CnfException("Could not open file '%s'\n" % fname)
-        self.nvar = 0
-        self.clauses = []
-        self.reason = None
         try:
             self.readCnf(maxclause, rejectClause)
         except Exception as ex:
@@ -114,3 +124,18 @@ class CnfReader():
             raise CnfException("Line %d: Got %d clauses.  Expected %d" % (lineNumber, clauseCount, nclause))
         return
 
+    # Add clauses from bulk reader, applying same limits and checks as readCnf
+    def addClauses(self, clauses, maxclause = None, rejectClause = None):
+        if maxclause is not None and len(clauses) > maxclause:
+            self.reason = "%d clauses exceeds limit of %d" % (len(clauses), maxclause)
+            return
+        for lits in clauses:
+            # Sort literals by variable
+            lits.sort(key = lambda l: abs(l))
+            # See if this clause indicates that the CNF cannot be converted
+            if rejectClause is not None:
+                self.reason = rejectClause(lits, len(self.clauses)+1)
+                if self.reason is not None:
+                    return
+            self.clauses.append(lits)
+
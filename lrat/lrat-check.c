@@ -21,7 +21,11 @@ OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWA
 #include <stdio.h>
 #include <stdlib.h>
 #include <assert.h>
+#include <string.h>
 #include <sys/time.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <unistd.h>
 
 #define DELETED		-1
 #define SUCCESS		1
@@ -32,6 +36,7 @@ OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWA
 
 void usage(char *name) {
   printf("Usage: %s FILE1.cnf FILE2.lrat [optional: FILE3.drat]\n", name);
+  printf("Files ending in .gz, .xz, or .bz2 are decompressed while reading\n");
   exit(0);
 }
 
@@ -244,6 +249,43 @@ int parseLine (FILE* file, int mode, int line) {
   }
   return 0; }
 
+// Compressed files (.gz, .xz, .bz2) are read through a decompression pipe
+const char* decompressor (const char* name) {
+  const char* suffix = strrchr (name, '.');
+  if (suffix == NULL) return NULL;
+  if (strcmp (suffix, ".gz")  == 0) return "gzip";
+  if (strcmp (suffix, ".xz")  == 0) return "xz";
+  if (strcmp (suffix, ".bz2") == 0) return "bzip2";
+  return NULL; }
+
+// The decompressor is run directly, with the file name as a separate argument,
+// so that no shell interprets the name.  Sets *child to its process id, or 0 if there is none
+FILE* openInput (const char* name, pid_t* child) {
+  const char* command = decompressor (name);
+  *child = 0;
+  if (command == NULL) return fopen (name, "r");
+  FILE* file = fopen (name, "r");
+  if (!file) return NULL;
+  fclose (file);
+  int fds[2];
+  if (pipe (fds) != 0) return NULL;
+  pid_t pid = fork ();
+  if (pid < 0) {
+    close (fds[0]); close (fds[1]);
+    return NULL; }
+  if (pid == 0) {
+    dup2 (fds[1], STDOUT_FILENO);
+    close (fds[0]); close (fds[1]);
+    execlp (command, command, "-dc", name, (char*) NULL);
+    _exit (127); }
+  close (fds[1]);
+  *child = pid;
+  return fdopen (fds[0], "r"); }
+
+void closeInput (FILE* file, pid_t child) {
+  fclose (file);
+  if (child > 0) waitpid (child, NULL, 0); }
+
 int main (int argc, char** argv) {
   if (argc < 3)
      usage(argv[0]);
@@ -254,7 +296,8 @@ int main (int argc, char** argv) {
 
   int i, nVar = 0, nCls = 0;
   char ignore[1024];
-  FILE* cnf   = fopen (argv[1], "r");
+  pid_t cnfPipe, proofPipe;
+  FILE* cnf   = openInput (argv[1], &cnfPipe);
   if (!cnf) {
       printf("Couldn't open file '%s'\n", argv[1]);
       exit(1); }
@@ -288,11 +331,11 @@ int main (int argc, char** argv) {
     int size = parseLine (cnf, CNF, index);
     if (size == 0) break;
     addClause (index++, litList, size, NULL); }
-  fclose (cnf);
+  closeInput (cnf, cnfPipe);
 
   printf ("c parsed a formula with %i variables and %i clauses\n", nVar, nCls);
 
-  FILE* proof = fopen (argv[2], "r");
+  FILE* proof = openInput (argv[2], &proofPipe);
   if (!proof) {
     printf("c Couldn't open file '%s'\n", argv[2]);
     exit(1); }
@@ -333,6 +376,7 @@ int main (int argc, char** argv) {
     }
   }
 
+  closeInput (proof, proofPipe);
   gettimeofday(&finish_time, NULL);
   double secs = (finish_time.tv_sec + 1e-6 * finish_time.tv_usec) -
       (start_time.tv_sec + 1e-6 * start_time.tv_usec);
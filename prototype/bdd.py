@@ -22,7 +22,11 @@
 from functools import total_ordering
 
 import sys
+import time
+import json
 import resolver
+import opcache
+import reorder
 
 class BddException(Exception):
 
@@ -36,11 +40,13 @@ class BddException(Exception):
 class DummyProver:
 
     clauseCount = 0
+    proofCount = 0
     writer = None
     verbLevel = 0
 
     def __init__(self, fname = None, verbLevel = None):
         self.clauseCount = 0
+        self.proofCount = 0
         self.writer = sys.stderr
 
     def comment(self, comment):
@@ -58,6 +64,9 @@ class DummyProver:
         self.clauseCount += 1
         return self.clauseCount
 
+    def getClause(self, cid):
+        return None
+
     def fileOutput(self):
         return False
 
@@ -105,8 +114,9 @@ class Variable:
 
 
 class Node:
-    id = 0 # Also serves as identity of ER variable
-    variable = None
+    # id also serves as identity of ER variable.
+    # Slots avoid the per-instance dictionary
+    __slots__ = ('id', 'variable')
 
     def __init__(self, id, variable):
         self.id = id
@@ -133,10 +143,16 @@ class Node:
     def isOne(self):
         return False
 
+    # Node with any complement removed
+    def regular(self):
+        return self
+
 
 class LeafNode(Node):
     value = None # 0 or 1
     inferValue = None # Number of unit clause asserting its value
+    # Other leaf.  Set by manager
+    complement = None
 
     def __init__(self, value):
         id = resolver.tautologyId if value == 1 else -resolver.tautologyId        
@@ -150,6 +166,9 @@ class LeafNode(Node):
     def label(self):
         return "C%d" % self.value
 
+    def negation(self):
+        return self.complement
+
     def isZero(self):
         return self.value == 0
 
@@ -163,18 +182,22 @@ class LeafNode(Node):
 class VariableNode(Node):
     # Defining clause types
     (HU, LU, HD, LD) = range(4)
-    high = None
-    low = None
-    # Identity of clauses generated from node
-    definingClauseBase = 0
+    # definingClauseBase is identity of clauses generated from node
+    __slots__ = ('high', 'low', 'definingClauseBase')
     
-    def __init__(self, id, variable, high, low, prover):
+    # Defining clauses are generated, unless their base id is supplied
+    def __init__(self, id, variable, high, low, prover, definingClauseBase = None):
         Node.__init__(self, id, variable)
         self.high = high
         self.low = low
-        vid = self.variable.id
-        hid = self.high.id
-        lid = self.low.id
+        if definingClauseBase is None:
+            definingClauseBase = self.assertDefiningClauses(prover)
+        self.definingClauseBase = definingClauseBase
+
+    # Generate the four defining clauses for the node.
+    # Return base id, from which the id of each clause can be computed
+    def assertDefiningClauses(self, prover):
+        definingClauseBase = 0
         # id should be first literal in clause for some proof checkers
         label = "node %s = ITE(%s,%s,%s)"  % (self.label(), str(self.variable), self.high.label(), self.low.label())
             
@@ -186,8 +209,8 @@ class VariableNode(Node):
         if huid != resolver.tautologyId:
             comment = None
             antecedents.append(-huid)
-            if self.definingClauseBase == 0:
-                self.definingClauseBase = huid - self.HU
+            if definingClauseBase == 0:
+                definingClauseBase = huid - self.HU
         
         if prover.verbLevel >= 3:
             comment = "ITE assertion for %s: LU" % label
@@ -195,24 +218,25 @@ class VariableNode(Node):
         if luid != resolver.tautologyId:
             comment = None
             antecedents.append(-luid)
-            if self.definingClauseBase == 0:
-                self.definingClauseBase = luid - self.LU
+            if definingClauseBase == 0:
+                definingClauseBase = luid - self.LU
 
         if prover.verbLevel >= 3:
             comment = "ITE assertion for %s: HD" % label
         hdid = prover.createClause(self.clauseHD(), antecedents, comment, alreadyClean = True)
         if hdid != resolver.tautologyId:
             comment = None
-            if self.definingClauseBase == 0:
-                self.definingClauseBase = hdid - self.HD
+            if definingClauseBase == 0:
+                definingClauseBase = hdid - self.HD
 
         if prover.verbLevel >= 3:
             comment = "ITE assertion for %s: LD" % label
         ldid = prover.createClause(self.clauseLD(), antecedents, comment, alreadyClean = True)
         if ldid != resolver.tautologyId:
             comment = None
-            if self.definingClauseBase == 0:
-                self.definingClauseBase = ldid - self.LD
+            if definingClauseBase == 0:
+                definingClauseBase = ldid - self.LD
+        return definingClauseBase
     
     def isLeaf(self):
         return False
@@ -222,28 +246,28 @@ class VariableNode(Node):
         vid = self.variable.id
         hid = self.high.id
         lid = self.low.id
-        return resolver.cleanClause([id, -vid, -hid])
+        return resolver.cleanTriple(id, -vid, -hid)
 
     def clauseLU(self):
         id = self.id
         vid = self.variable.id
         hid = self.high.id
         lid = self.low.id
-        return resolver.cleanClause([id, vid, -lid])
+        return resolver.cleanTriple(id, vid, -lid)
 
     def clauseHD(self):
         id = self.id
         vid = self.variable.id
         hid = self.high.id
         lid = self.low.id
-        return resolver.cleanClause([-id, -vid, hid])
+        return resolver.cleanTriple(-id, -vid, hid)
 
     def clauseLD(self):
         id = self.id
         vid = self.variable.id
         hid = self.high.id
         lid = self.low.id
-        return resolver.cleanClause([-id, vid, lid])
+        return resolver.cleanTriple(-id, vid, lid)
 
     def idHU(self):
         return resolver.tautologyId if self.high.isZero() else self.definingClauseBase + self.HU
@@ -292,11 +316,54 @@ class VariableNode(Node):
     # Return list of defining clauses
     def clauses(self, prover, up=True, down=True):
         idlist = self.clauseIds(up, down)
-        return [prover.clauseDict[id] for id in idlist]
+        return [prover.getClause(id) for id in idlist]
+
+    def negation(self):
+        return NegatedNode(self)
 
     def __str__(self):
         return "%d:%s->%s,%s" % (self.id, str(self.variable), self.high.label(), self.low.label())
 
+# Complemented reference to node, used when manager has complement edges.
+# Its id is the negation of the node id, and so it is represented in clauses
+# by the negated extension variable.  Its defining clauses are those of the node,
+# with the roles of the up and down clauses exchanged
+class NegatedNode(VariableNode):
+    node = None
+
+    def __init__(self, node):
+        Node.__init__(self, -node.id, node.variable)
+        self.node = node
+
+    @property
+    def high(self):
+        return self.node.high.negation()
+
+    @property
+    def low(self):
+        return self.node.low.negation()
+
+    def idHU(self):
+        return self.node.idHD()
+
+    def idLU(self):
+        return self.node.idLD()
+
+    def idHD(self):
+        return self.node.idHU()
+
+    def idLD(self):
+        return self.node.idLU()
+
+    def negation(self):
+        return self.node
+
+    def regular(self):
+        return self.node
+
+    def label(self):
+        return "!" + self.node.label()
+
 class Manager:
     prover = None
     writer = None
@@ -308,10 +375,18 @@ class Manager:
     leaf1 = None
     # Mapping from (variable, high, low) to node
     uniqueTable = {}
-    # Operation cache
-    # Key = (opName, operand1 ...) to (node, justification)
+    # Operation caches.  Mapping from operation name to OperationCache
+    # Each cache maps key = (opName, operand1 ...) to (node, justification)
     # Hack: justification is negative when preceding clause was generated as intermediate step
     operationCache = {}
+    # Maximum number of entries in each operation cache (None = unbounded)
+    cacheCapacity = None
+    # Replacement policy for bounded caches: 'lru', 'clock', or 'direct'
+    cachePolicy = 'lru'
+    # Clauses justifying results that have been evicted from the caches.
+    # They can't be deleted right away, since the results may still be in use.
+    # Instead, they get deleted at next check for GC
+    evictedClauses = []
     verbLevel = 1
     resolver = None
     # GC support
@@ -325,6 +400,26 @@ class Manager:
     gcMin = 10000
     # Dictionary mapping variables to their IDs
     quantifiedVariableSet = None
+    # Use iterative versions of apply operations
+    iterative = False
+    # Represent negation by complemented references to nodes.
+    # Stored nodes always have a regular high child
+    complementEdges = False
+    # Reference counting support.
+    # When enabled, a node is freed as soon as it is no longer referenced
+    # by a parent node or by the driver (via addRef/deref).
+    # Cache entries don't hold references.  Instead, entries mentioning a node
+    # are removed when the node is freed.
+    refCounting = False
+    # Mapping from node id to reference count
+    refCounts = {}
+    # Mapping from node id to set of keys of cache entries that mention the node.
+    # Keys are removed when their entries are evicted
+    cacheUsers = {}
+    # Nodes whose reference count has dropped to zero.
+    # Freed at the next call to checkGC, since they may still be in use
+    # by an operation in progress
+    zeroNodes = []
     # Statistics
     cacheJustifyAdded = 0
     cacheNoJustifyAdded = 0
@@ -334,9 +429,29 @@ class Manager:
     variableCount = 0
     cacheRemoved = 0
     nodesRemoved = 0
+    nodesFreed = 0
+    # Imported nodes mapped onto equivalent nodes
+    nodesMapped = 0
     gcCount = 0
-
-    def __init__(self, prover = None, rootGenerator = None, nextNodeId = 0, verbLevel = 1):
+    # GC pause statistics
+    gcSeconds = 0.0
+    gcMaxSeconds = 0.0
+    gcClausesDeleted = 0
+    # Mapping from pause bucket to count
+    gcPauseHistogram = {}
+    # Optional list of records, one per collection
+    gcTrace = None
+    # Dynamic variable reordering.
+    # Triggered when number of nodes reaches reorderNext (None = disabled)
+    reorderNext = None
+    # After reordering, trigger next one when node count grows by this factor
+    reorderGrowth = 2.0
+    reorderCount = 0
+    reorderSeconds = 0.0
+
+    def __init__(self, prover = None, rootGenerator = None, nextNodeId = 0, verbLevel = 1, iterative = False,
+                 cacheCapacity = None, cachePolicy = 'lru', refCounting = False,
+                 traceGC = False, reorderMin = None, complementEdges = False):
 
         self.verbLevel = verbLevel
         self.prover = DummyProver() if prover is None else prover
@@ -345,9 +460,15 @@ class Manager:
         self.variables = []
         self.leaf0 = LeafNode(0)
         self.leaf1 = LeafNode(1)
+        self.leaf0.complement = self.leaf1
+        self.leaf1.complement = self.leaf0
+        self.complementEdges = complementEdges
         self.nextNodeId = nextNodeId
         self.uniqueTable = {}
         self.operationCache = {}
+        self.cacheCapacity = cacheCapacity
+        self.cachePolicy = cachePolicy
+        self.evictedClauses = []
         self.vresolver = resolver.VResolver(self.prover)
         self.quantifiedVariableSet = set([])
         self.deadNodeCount = 0
@@ -359,7 +480,30 @@ class Manager:
         self.variableCount = 0
         self.cacheRemoved = 0
         self.nodesRemoved = 0
+        self.nodesFreed = 0
+        self.nodesMapped = 0
         self.gcCount = 0
+        self.gcSeconds = 0.0
+        self.gcMaxSeconds = 0.0
+        self.gcClausesDeleted = 0
+        self.gcPauseHistogram = {}
+        self.gcTrace = [] if traceGC else None
+        self.reorderNext = reorderMin
+        self.reorderCount = 0
+        self.reorderSeconds = 0.0
+        self.iterative = iterative
+        self.refCounting = refCounting
+        self.refCounts = {}
+        self.cacheUsers = {}
+        self.zeroNodes = []
+        # Pairs (terminal, body) for iterative apply operations
+        self.andOp = (self.andTerminal, self.andBody)
+        self.implyOp = (self.implyTerminal, self.implyBody)
+        self.andImplyOp = (self.andImplyTerminal, self.andImplyBody)
+        self.orOp = (self.orTerminal, self.orBody)
+        self.equantOp = (self.equantTerminal, self.equantBody)
+        self.andExistsOp = (self.andExistsTerminal, self.andExistsBody)
+        self.andListOp = (self.andListTerminal, self.andListBody)
 
     def newVariable(self, name, id = None):
         level = len(self.variables) + 1
@@ -369,6 +513,8 @@ class Manager:
         return var
         
     def findOrMake(self, variable, high, low):
+        if self.complementEdges and high.id < 0:
+            return self.findOrMake(variable, high.negation(), low.negation()).negation()
         key = (variable.level, high.id, low.id)
         if key in self.uniqueTable:
             return self.uniqueTable[key]
@@ -378,7 +524,166 @@ class Manager:
             self.uniqueTable[key] = node
             self.nodeCount += 1
             self.maxLiveCount = max(self.maxLiveCount, len(self.uniqueTable))
+            if self.refCounting:
+                self.newCounted(node)
             return node
+
+    # Describe nodes with ids >= firstId in DAGs with given roots, so that they can be
+    # imported by another manager.  Return list of tuples (id, level, high id, low id, defining clause base),
+    # with each node following its children
+    def exportNodes(self, roots, firstId):
+        result = []
+        visited = set([])
+        stack = [(r, False) for r in roots if not r.isLeaf() and r.id >= firstId]
+        while len(stack) > 0:
+            (node, expanded) = stack.pop()
+            if node.id in visited:
+                continue
+            if expanded:
+                visited.add(node.id)
+                result.append((node.id, node.variable.level, node.high.id, node.low.id, node.definingClauseBase))
+                continue
+            stack.append((node, True))
+            for child in [node.low, node.high]:
+                if not child.isLeaf() and child.id >= firstId and child.id not in visited:
+                    stack.append((child, False))
+        return result
+
+    # Add nodes exported by another manager, whose defining clauses are already in the proof.
+    # nodeMap maps ids to existing nodes and is extended with the new ones.
+    # A node with the same key as an existing one, or having a child that was mapped
+    # onto a different node, is mapped onto the node found or made with the mapped children,
+    # with a proof that the imported node implies it.
+    # Return (implications, clauseList).  Implications maps the id of each such node
+    # to the id of the clause asserting the implication.
+    # Clauses in clauseList, as well as the implications, should be deleted
+    # once the driver has converted any validations that mention the mapped nodes
+    def importNodes(self, exported, nodeMap):
+        implications = {}
+        clauseList = []
+        # Imported nodes that were mapped onto other nodes
+        mapped = {}
+        for (id, level, highId, lowId, definingClauseBase) in exported:
+            variable = self.variables[level-1]
+            (high, low) = (nodeMap[highId], nodeMap[lowId])
+            key = (level, high.id, low.id)
+            if highId not in mapped and lowId not in mapped and key not in self.uniqueTable:
+                node = VariableNode(id, variable, high, low, None, definingClauseBase)
+                self.uniqueTable[key] = node
+                nodeMap[id] = node
+                self.nodeCount += 1
+                continue
+            node = VariableNode(id, variable, mapped.get(highId, high), mapped.get(lowId, low), None, definingClauseBase)
+            newNode = self.findOrMake(variable, high, low)
+            (implyHigh, implyLow) = (implications.get(highId, resolver.tautologyId), implications.get(lowId, resolver.tautologyId))
+            (highImply, lowImply) = self.importImplication(node, newNode, implyHigh, implyLow)
+            clist = [node.idHU(), node.idLU(), node.idHD(), node.idLD(), highImply]
+            clauseList += [c for c in clist if c != resolver.tautologyId]
+            implications[id] = lowImply
+            mapped[id] = node
+            nodeMap[id] = newNode
+            self.nodesMapped += 1
+        self.maxLiveCount = max(self.maxLiveCount, len(self.uniqueTable))
+        return (implications, clauseList)
+
+    # Prove that imported node implies node with the same variable and mapped children,
+    # given clauses asserting that each child implies its mapped version.
+    # Return ids of clauses for case when variable is true, and for the full implication
+    def importImplication(self, node, newNode, implyHigh, implyLow):
+        var = node.variable
+        (high, low) = (node.high, node.low)
+        (newHigh, newLow) = (newNode.high, newNode.low)
+        # Case when variable is true
+        hints = [(node.idHD(), [-var.id, -node.id, high.id]),
+                 (implyHigh, [-high.id, newHigh.id]),
+                 (newNode.idHU(), [-var.id, -newHigh.id, newNode.id])]
+        target = [-var.id, -node.id, newNode.id]
+        comment = "Justification that imported %s ==> %s when %s is true" % (node.label(), newNode.label(), str(var))
+        highId = self.hintedProofStep(target, hints, comment)
+        # Case when variable is false
+        hints = [(highId, target),
+                 (node.idLD(), [var.id, -node.id, low.id]),
+                 (implyLow, [-low.id, newLow.id]),
+                 (newNode.idLU(), [var.id, -newLow.id, newNode.id])]
+        target = [-node.id, newNode.id]
+        lowId = self.hintedProofStep(target, hints, None)
+        return (highId, lowId)
+
+    # Mapping from id to node, for all nodes in unique table and the leaves
+    def nodeMap(self):
+        result = { node.id : node for node in self.uniqueTable.values() }
+        result[self.leaf0.id] = self.leaf0
+        result[self.leaf1.id] = self.leaf1
+        return result
+
+    # Is node still in unique table, i.e., not garbage collected?
+    def isLive(self, node):
+        entry = self.uniqueTable.get(self.uniqueKey(node))
+        if entry is None:
+            return False
+        return entry.id == node.id
+
+    # Key for node in unique table
+    def uniqueKey(self, node):
+        return (node.variable.level, node.high.id, node.low.id)
+
+    # Reference counting.
+    # New node starts with count 0 and holds references to its children
+    def newCounted(self, node):
+        self.refCounts[node.id] = 0
+        self.addRef(node.high)
+        self.addRef(node.low)
+        self.zeroNodes.append(node)
+
+    def addRef(self, node):
+        if self.refCounting and not node.isLeaf():
+            node = node.regular()
+            self.refCounts[node.id] += 1
+
+    def deref(self, node):
+        if self.refCounting and not node.isLeaf():
+            node = node.regular()
+            self.refCounts[node.id] -= 1
+            if self.refCounts[node.id] == 0:
+                self.zeroNodes.append(node)
+
+    # Free nodes having reference count 0, along with any descendants that become unreferenced.
+    # Return list of clauses that can be deleted
+    def freeZeroNodes(self):
+        clauseList = []
+        while len(self.zeroNodes) > 0:
+            node = self.zeroNodes.pop()
+            # Node may have already been freed or have regained references
+            if self.refCounts.get(node.id, None) != 0:
+                continue
+            del self.refCounts[node.id]
+            del self.uniqueTable[self.uniqueKey(node)]
+            clist = [node.idHU(), node.idLU(), node.idHD(), node.idLD()]
+            clauseList += [c for c in clist if c != resolver.tautologyId]
+            clauseList += self.purgeCacheUsers(node.id)
+            self.nodesRemoved += 1
+            self.nodesFreed += 1
+            self.deref(node.high)
+            self.deref(node.low)
+        return clauseList
+
+    # Remove cache entries that mention node.  Return their justifying clauses
+    def purgeCacheUsers(self, id):
+        clauseList = []
+        if id not in self.cacheUsers:
+            return clauseList
+        keys = self.cacheUsers[id]
+        del self.cacheUsers[id]
+        for key in keys:
+            cache = self.operationCache[key[0]]
+            # Entry may have been replaced or cleared without eviction
+            if key in cache:
+                (result, cid) = cache.get(key)
+                self.unregisterCacheUser(key, result)
+                clauseList += self.justificationClauses(cid)
+                self.cacheRemoved += 1
+                cache.remove(key)
+        return clauseList
   
     def literal(self, variable, phase):
         if phase == 1:
@@ -419,15 +724,18 @@ class Manager:
 
     # Build dictionary mapping nodes in DAG rooted by node to values
     # nodeFunction should be a function mapping a node to a value
+    # Uses explicit stack, so that depth of DAG is not limited by recursion depth
     def buildInformation(self, node, nodeFunction, sofarDict):
-        if node in sofarDict:
-            return sofarDict
-        sofarDict[node] = nodeFunction(node)
-        if node.isLeaf():
-            return sofarDict
-        else:
-            sofarDict = self.buildInformation(node.high, nodeFunction, sofarDict)
-            return self.buildInformation(node.low, nodeFunction, sofarDict)
+        stack = [node]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node in sofarDict:
+                continue
+            sofarDict[node] = nodeFunction(node)
+            if not node.isLeaf():
+                stack.append(node.low)
+                stack.append(node.high)
+        return sofarDict
         
     # Find support for function rooted by node.  Return as clause
     def getSupport(self, node):
@@ -451,6 +759,9 @@ class Manager:
 
     def getSize(self, node):
         oneDict = self.buildInformation(node, lambda n: 1, {})
+        if self.complementEdges:
+            # Node and its complement count only once
+            return len(set([abs(n.id) for n in oneDict.keys()]))
         return len(oneDict)
 
     def showLiteral(self, lit):
@@ -529,15 +840,71 @@ class Manager:
 
     # Retrieve item from cache.  Return None if not found
     def operationRetrieve(self, key):
-        if key in self.operationCache:
-            entry = self.operationCache[key]
+        entry = self.getCache(key[0]).lookup(key)
+        if entry is not None:
             return (entry[0], abs(entry[1]))
         return None
+
+    # Retrieve result node from cache.  Return None if not found
+    def operationRetrieveNode(self, key):
+        entry = self.getCache(key[0]).lookup(key)
+        if entry is not None:
+            return entry[0]
+        return None
+
+    # Add entry to cache
+    def operationStore(self, key, result, justification):
+        evicted = self.getCache(key[0]).insert(key, (result, justification))
+        for (okey, (oresult, cid)) in evicted:
+            if self.refCounting:
+                self.unregisterCacheUser(okey, oresult)
+            self.evictedClauses += self.justificationClauses(cid)
+            self.cacheRemoved += 1
+        if self.refCounting:
+            self.registerCacheUser(key, result)
+
+    # Ids of nonleaf nodes mentioned by cache entry
+    def cacheEntryIds(self, key, result):
+        ids = list(key[1:])
+        if isinstance(result, Node):
+            ids.append(result.id)
+        return [abs(id) for id in ids]
+
+    # Record cache entry with each of the nonleaf nodes it mentions
+    def registerCacheUser(self, key, result):
+        for id in self.cacheEntryIds(key, result):
+            if id not in self.refCounts:
+                continue
+            if id in self.cacheUsers:
+                self.cacheUsers[id].add(key)
+            else:
+                self.cacheUsers[id] = set([key])
+
+    # Forget cache entry that has been evicted or purged
+    def unregisterCacheUser(self, key, result):
+        for id in self.cacheEntryIds(key, result):
+            if id in self.cacheUsers:
+                self.cacheUsers[id].discard(key)
+
+    # Find cache for operation, creating it if needed
+    def getCache(self, opName):
+        if opName not in self.operationCache:
+            self.operationCache[opName] = opcache.makeCache(opName, self.cacheCapacity, self.cachePolicy)
+        return self.operationCache[opName]
+
+    # Clauses generated to justify cached result
+    def justificationClauses(self, cid):
+        if abs(cid) == resolver.tautologyId:
+            return []
+        return [cid] if cid > 0 else [-cid-1, -cid]
+
      
 
     # Return node + id of clause justifying that nodeA & NodeB ==> result
     # Justification is None if it would be tautology
     def applyAndJustify(self, nodeA, nodeB):
+        if self.iterative:
+            return self.runIterative(self.andOp, (nodeA, nodeB))
         self.applyCount += 1
         # Constant cases.
         # No justifications required, since all return one of the arguments
@@ -549,6 +916,8 @@ class Manager:
             return (nodeA, resolver.tautologyId)
         if nodeA == nodeB:
             return (nodeA, resolver.tautologyId)
+        if nodeA.id == -nodeB.id:
+            return (self.leaf0, resolver.tautologyId)
 
         if nodeA.id > nodeB.id:
             nodeA, nodeB = nodeB, nodeA
@@ -567,54 +936,59 @@ class Manager:
         lowB =  nodeB.branchLow(splitVar)
 
         if highA != lowA:
-            hints["UHD"] = (nodeA.idHD(), resolver.cleanClause([-splitVar.id, -nodeA.id, highA.id]))
-            hints["ULD"] = (nodeA.idLD(), resolver.cleanClause([ splitVar.id, -nodeA.id, lowA.id]))
+            hints["UHD"] = (nodeA.idHD(), resolver.cleanTriple(-splitVar.id, -nodeA.id, highA.id))
+            hints["ULD"] = (nodeA.idLD(), resolver.cleanTriple( splitVar.id, -nodeA.id, lowA.id))
         if highB != lowB:
-            hints["VHD"] = (nodeB.idHD(), resolver.cleanClause([-splitVar.id, -nodeB.id, highB.id]))
-            hints["VLD"] = (nodeB.idLD(), resolver.cleanClause([ splitVar.id, -nodeB.id, lowB.id]))
+            hints["VHD"] = (nodeB.idHD(), resolver.cleanTriple(-splitVar.id, -nodeB.id, highB.id))
+            hints["VLD"] = (nodeB.idLD(), resolver.cleanTriple( splitVar.id, -nodeB.id, lowB.id))
 
         (newHigh, andHigh) = self.applyAndJustify(highA, highB)
-        hints["OPH"] = (andHigh, resolver.cleanClause([-highA.id, -highB.id, newHigh.id]))
+        hints["OPH"] = (andHigh, resolver.cleanTriple(-highA.id, -highB.id, newHigh.id))
             
         (newLow, andLow) = self.applyAndJustify(lowA, lowB)
-        hints["OPL"] = (andLow, resolver.cleanClause([-lowA.id, -lowB.id, newLow.id]))
+        hints["OPL"] = (andLow, resolver.cleanTriple(-lowA.id, -lowB.id, newLow.id))
 
         if newHigh == newLow:
             newNode = newHigh
         else:
             newNode = self.findOrMake(splitVar, newHigh, newLow)
-            hints["WHU"] = (newNode.idHU(), resolver.cleanClause([-splitVar.id, newNode.id, -newHigh.id]))
-            hints["WLU"] = (newNode.idLU(), resolver.cleanClause([ splitVar.id, newNode.id, -newLow.id]))
+            hints["WHU"] = (newNode.idHU(), resolver.cleanTriple(-splitVar.id, newNode.id, -newHigh.id))
+            hints["WLU"] = (newNode.idLU(), resolver.cleanTriple( splitVar.id, newNode.id, -newLow.id))
 
-        targetClause = resolver.cleanClause([-nodeA.id, -nodeB.id, newNode.id])
+        targetClause = resolver.cleanTriple(-nodeA.id, -nodeB.id, newNode.id)
         if targetClause == resolver.tautologyId:
             justification = resolver.tautologyId
         else:
             comment = "Justification that %s & %s ==> %s" % (nodeA.label(), nodeB.label(), newNode.label())
             justification = self.vresolver.run(targetClause, splitVar.id, hints, comment)
-        self.operationCache[key] = (newNode, justification)
+        self.operationStore(key, newNode, justification)
         self.cacheJustifyAdded += 1
         return (newNode, abs(justification))
 
     def applyNot(self, node):
+        if self.complementEdges:
+            return node.negation()
         # Constant case
         if node == self.leaf1:
             return self.leaf0
         if node == self.leaf0:
             return self.leaf1
         key = ("not", node.id)
-        if key in self.operationCache:
-            return self.operationCache[key][0]
+        lookup = self.operationRetrieveNode(key)
+        if lookup is not None:
+            return lookup
         var = node.variable
         high = node.high
         low = node.low
         newHigh = self.applyNot(high)
         newLow = self.applyNot(low)
         newNode = self.findOrMake(var, newHigh, newLow)
-        self.operationCache[key] = (newNode, resolver.tautologyId)
+        self.operationStore(key, newNode, resolver.tautologyId)
         return (newNode, resolver.TautologyId)
 
     def justifyImply(self, nodeA, nodeB):
+        if self.iterative:
+            return self.runIterative(self.implyOp, (nodeA, nodeB))
         self.applyCount += 1
 
         # Special cases
@@ -644,29 +1018,29 @@ class Manager:
         lowB =  nodeB.branchLow(splitVar)
 
         if highA != lowA:
-            hints["UHD"] = (nodeA.idHD(), resolver.cleanClause([-splitVar.id, -nodeA.id, highA.id]))
-            hints["ULD"] = (nodeA.idLD(), resolver.cleanClause([ splitVar.id, -nodeA.id, lowA.id]))
+            hints["UHD"] = (nodeA.idHD(), resolver.cleanTriple(-splitVar.id, -nodeA.id, highA.id))
+            hints["ULD"] = (nodeA.idLD(), resolver.cleanTriple( splitVar.id, -nodeA.id, lowA.id))
         if highB != lowB:
-            hints["WHU"] = (nodeB.idHU(), resolver.cleanClause([-splitVar.id, nodeB.id, -highB.id]))
-            hints["WLU"] = (nodeB.idLU(), resolver.cleanClause([ splitVar.id, nodeB.id, -lowB.id]))
+            hints["WHU"] = (nodeB.idHU(), resolver.cleanTriple(-splitVar.id, nodeB.id, -highB.id))
+            hints["WLU"] = (nodeB.idLU(), resolver.cleanTriple( splitVar.id, nodeB.id, -lowB.id))
 
         (check, implyHigh) = self.justifyImply(highA, highB)
         if implyHigh != resolver.tautologyId:
-            hints["OPH"] = (implyHigh, resolver.cleanClause([-highA.id, highB.id]))
+            hints["OPH"] = (implyHigh, resolver.cleanPair(-highA.id, highB.id))
 
         if check:
             (check, implyLow) = self.justifyImply(lowA, lowB)
             if implyLow != resolver.tautologyId:
-                hints["OPL"] = (implyLow, resolver.cleanClause([-lowA.id, lowB.id]))
+                hints["OPL"] = (implyLow, resolver.cleanPair(-lowA.id, lowB.id))
 
         if check:
-            targetClause = resolver.cleanClause([-nodeA.id, nodeB.id])
+            targetClause = resolver.cleanPair(-nodeA.id, nodeB.id)
             comment = "Justification that %s ==> %s" % (nodeA.label(), nodeB.label())
             justification = self.vresolver.run(targetClause, splitVar.id, hints, comment)
         else:
             justification = resolver.tautologyId
 
-        self.operationCache[key] = (check, justification)
+        self.operationStore(key, check, justification)
         if justification != resolver.tautologyId:
             self.cacheJustifyAdded += 1
         else:
@@ -682,6 +1056,8 @@ class Manager:
     # that result implies nodeC.
     # Return check + proof step
     def applyAndJustifyImply(self, nodeA, nodeB, nodeC):
+        if self.iterative:
+            return self.runIterative(self.andImplyOp, (nodeA, nodeB, nodeC))
         self.applyCount += 1
         # Terminal cases.
         if nodeA == self.leaf0 or nodeB == self.leaf0:
@@ -718,26 +1094,26 @@ class Manager:
         lowC =  nodeC if nodeC == self.leaf0 else nodeC.branchLow(splitVar)
 
         if highA != lowA:
-            hints["UHD"] = (nodeA.idHD(), resolver.cleanClause([-splitVar.id, -nodeA.id, highA.id]))
-            hints["ULD"] = (nodeA.idLD(), resolver.cleanClause([ splitVar.id, -nodeA.id, lowA.id]))
+            hints["UHD"] = (nodeA.idHD(), resolver.cleanTriple(-splitVar.id, -nodeA.id, highA.id))
+            hints["ULD"] = (nodeA.idLD(), resolver.cleanTriple( splitVar.id, -nodeA.id, lowA.id))
         if highB != lowB:
-            hints["VHD"] = (nodeB.idHD(), resolver.cleanClause([-splitVar.id, -nodeB.id, highB.id]))
-            hints["VLD"] = (nodeB.idLD(), resolver.cleanClause([ splitVar.id, -nodeB.id, lowB.id]))
+            hints["VHD"] = (nodeB.idHD(), resolver.cleanTriple(-splitVar.id, -nodeB.id, highB.id))
+            hints["VLD"] = (nodeB.idLD(), resolver.cleanTriple( splitVar.id, -nodeB.id, lowB.id))
         if highC != lowC:
-            hints["WHU"] = (nodeC.idHU(), resolver.cleanClause([-splitVar.id, nodeC.id, -highC.id]))
-            hints["WLU"] = (nodeC.idLU(), resolver.cleanClause([ splitVar.id, nodeC.id, -lowC.id]))
+            hints["WHU"] = (nodeC.idHU(), resolver.cleanTriple(-splitVar.id, nodeC.id, -highC.id))
+            hints["WLU"] = (nodeC.idLU(), resolver.cleanTriple( splitVar.id, nodeC.id, -lowC.id))
 
         (check, implyHigh) = self.applyAndJustifyImply(highA, highB, highC)
         if implyHigh != resolver.tautologyId:
-            hints["OPH"] = (implyHigh, resolver.cleanClause([-highA.id, -highB.id, highC.id]))
+            hints["OPH"] = (implyHigh, resolver.cleanTriple(-highA.id, -highB.id, highC.id))
 
         if check:
             (check, implyLow) = self.applyAndJustifyImply(lowA, lowB, lowC)
             if implyLow != resolver.tautologyId:
-                hints["OPL"] = (implyLow, resolver.cleanClause([-lowA.id, -lowB.id, lowC.id]))
+                hints["OPL"] = (implyLow, resolver.cleanTriple(-lowA.id, -lowB.id, lowC.id))
 
         if check:
-            targetClause = resolver.cleanClause([-nodeA.id, -nodeB.id, nodeC.id])
+            targetClause = resolver.cleanTriple(-nodeA.id, -nodeB.id, nodeC.id)
             if targetClause == resolver.tautologyId:
                 justification = resolver.tautologyId
             else:
@@ -746,7 +1122,7 @@ class Manager:
         else:
             justification = resolver.tautologyId, []
 
-        self.operationCache[key] = (check, justification)
+        self.operationStore(key, check, justification)
         if justification != resolver.tautologyId:
             self.cacheJustifyAdded += 1
         else:
@@ -766,12 +1142,15 @@ class Manager:
             return nodeA
         if nodeA == nodeB:
             return nodeA
+        if nodeA.id == -nodeB.id:
+            return self.leaf0
 
         if nodeA.id > nodeB.id:
             nodeA, nodeB = nodeB, nodeA
         key = ("andnj", nodeA.id, nodeB.id)
-        if key in self.operationCache:
-            return self.operationCache[key][0]
+        lookup = self.operationRetrieveNode(key)
+        if lookup is not None:
+            return lookup
 
         # Mapping from variable names to variable numbers
         splitVar = min(nodeA.variable, nodeB.variable)
@@ -788,11 +1167,13 @@ class Manager:
         else:
             newNode = self.findOrMake(splitVar, newHigh, newLow)
 
-        self.operationCache[key] = (newNode,resolver.tautologyId)
+        self.operationStore(key, newNode, resolver.tautologyId)
         return newNode
 
 
     def applyOr(self, nodeA, nodeB):
+        if self.iterative:
+            return self.runIterative(self.orOp, (nodeA, nodeB))
         # Constant cases
         if nodeA == self.leaf1:
             return self.leaf1
@@ -804,11 +1185,14 @@ class Manager:
             return nodeA
         if nodeA == nodeB:
             return nodeA
+        if nodeA.id == -nodeB.id:
+            return self.leaf1
         if nodeA.id > nodeB.id:
             nodeA, nodeB = nodeB, nodeA
         key = ("or", nodeA.id, nodeB.id)
-        if key in self.operationCache:
-            return self.operationCache[key][0]
+        lookup = self.operationRetrieveNode(key)
+        if lookup is not None:
+            return lookup
 
         splitVar = min(nodeA.variable, nodeB.variable)  
         highA = nodeA.branchHigh(splitVar)
@@ -819,7 +1203,7 @@ class Manager:
         newHigh = self.applyOr(highA, highB)
         newLow = self.applyOr(lowA, lowB)
         newNode = newHigh if newHigh == newLow else self.findOrMake(splitVar, newHigh, newLow)
-        self.operationCache[key] = (newNode,resolver.tautologyId)
+        self.operationStore(key, newNode, resolver.tautologyId)
         self.cacheNoJustifyAdded += 1
         return newNode
 
@@ -831,6 +1215,176 @@ class Manager:
             fun = operator(fun, n)
         return fun
 
+    # Conjunction of list of nodes, using simultaneous Shannon expansion.
+    # Return node + id of clause justifying that conjunction of nodes ==> result
+    def applyAndListJustify(self, nodeList):
+        if self.iterative:
+            return self.runIterative(self.andListOp, (nodeList,))
+        value = self.andListTerminal(nodeList)
+        if value is not None:
+            return value
+        nodeList = self.andListArguments(nodeList)
+        if len(nodeList) == 2:
+            return self.applyAndJustify(nodeList[0], nodeList[1])
+        key = tuple(["andlist"] + [n.id for n in nodeList])
+        splitVar = min([n.variable for n in nodeList])
+        highList = [n.branchHigh(splitVar) for n in nodeList]
+        lowList = [n.branchLow(splitVar) for n in nodeList]
+        (newHigh, andHigh) = self.applyAndListJustify(highList)
+        (newLow, andLow) = self.applyAndListJustify(lowList)
+        newNode = newHigh if newHigh == newLow else self.findOrMake(splitVar, newHigh, newLow)
+        justification = self.andListJustification(nodeList, splitVar, highList, lowList,
+                                                   newHigh, andHigh, newLow, andLow, newNode)
+        self.operationStore(key, newNode, justification)
+        self.cacheJustifyAdded += 1
+        return (newNode, abs(justification))
+
+    # Put argument list into canonical form:
+    # No duplicates or constant 1, and sorted by id.
+    # Returns None when conjunction is trivially 0
+    def andListArguments(self, nodeList):
+        ids = set([])
+        nlist = []
+        for n in nodeList:
+            if n == self.leaf0 or -n.id in ids:
+                return None
+            if n == self.leaf1 or n.id in ids:
+                continue
+            ids.add(n.id)
+            nlist.append(n)
+        nlist.sort(key = lambda n: n.id)
+        return nlist
+
+    # Generate proof that conjunction of nodes implies newNode.
+    # Split into two steps, according to value of split variable, if single step fails
+    def andListJustification(self, nodeList, splitVar, highList, lowList, newHigh, andHigh, newLow, andLow, newNode):
+        targetClause = resolver.cleanClause([-n.id for n in nodeList] + [newNode.id])
+        if targetClause == resolver.tautologyId:
+            return resolver.tautologyId
+        highHints = [(n.idHD(), [-splitVar.id, -n.id, h.id]) for (n, h) in zip(nodeList, highList) if n != h]
+        highHints.append((andHigh, [-h.id for h in highList] + [newHigh.id]))
+        lowHints = [(n.idLD(), [splitVar.id, -n.id, l.id]) for (n, l) in zip(nodeList, lowList) if n != l]
+        lowHints.append((andLow, [-l.id for l in lowList] + [newLow.id]))
+        if newHigh != newLow:
+            highHints.append((newNode.idHU(), [-splitVar.id, newNode.id, -newHigh.id]))
+            lowHints.append((newNode.idLU(), [splitVar.id, newNode.id, -newLow.id]))
+        comment = "Justification that %s ==> %s" % (" & ".join([n.label() for n in nodeList]), newNode.label())
+        (idList, clauseList) = self.cleanHintList(highHints + lowHints)
+        antecedents = self.vresolver.RupCheck(targetClause, idList, clauseList)
+        if antecedents is not None:
+            return self.vresolver.generateProofStep(targetClause, antecedents, comment, alreadyClean = True)
+        highTarget = [-splitVar.id] + targetClause
+        (idList, clauseList) = self.cleanHintList(highHints)
+        antecedents = self.vresolver.RupCheck(highTarget, idList, clauseList)
+        if antecedents is None:
+            raise BddException("Couldn't prove positive target %s" % str(highTarget))
+        highId = self.vresolver.generateProofStep(highTarget, antecedents, comment)
+        (idList, clauseList) = self.cleanHintList([(highId, highTarget)] + lowHints)
+        antecedents = self.vresolver.RupCheck(targetClause, idList, clauseList)
+        if antecedents is None:
+            raise BddException("Couldn't prove final target %s" % str(targetClause))
+        # Negative value indicates two-step proof
+        return -self.vresolver.generateProofStep(targetClause, antecedents, None, alreadyClean = True)
+
+    # Convert list of (clause id, clause) hints into separate lists, omitting tautologies
+    def cleanHintList(self, hints):
+        idList = []
+        clauseList = []
+        for (id, clause) in hints:
+            clause = resolver.cleanClause(clause)
+            if id == resolver.tautologyId or clause == resolver.tautologyId:
+                continue
+            idList.append(id)
+            clauseList.append(clause)
+        return (idList, clauseList)
+
+    # Conjunction with existential quantification (relational product).
+    # Computes Exists V (nodeA & nodeB), where V is the set of variables in clause,
+    # without materializing the conjunction.
+    # Return node + id of clause justifying that nodeA & nodeB ==> result
+    def applyAndExistsJustify(self, nodeA, nodeB, clause, topLevel = True):
+        if topLevel:
+            nextc = clause
+            while not nextc.isLeaf():
+                self.quantifiedVariableSet.add(nextc.variable)
+                nextc = nextc.low
+            if self.iterative:
+                return self.runIterative(self.andExistsOp, (nodeA, nodeB, clause))
+        value = self.andExistsTerminal(nodeA, nodeB, clause)
+        if value is not None:
+            return value
+        (nodeA, nodeB, clause) = self.andExistsArguments(nodeA, nodeB, clause)
+        if clause.isLeaf():
+            # No more variables to quantify
+            return self.applyAndJustify(nodeA, nodeB)
+        if nodeB == self.leaf1 or nodeA == nodeB:
+            # Only quantification required.  (Leaf 1 has largest id)
+            newNode = self.equant(nodeA, clause, topLevel = False)
+            (check, justification) = self.justifyImply(nodeA, newNode)
+            return (newNode, justification)
+        key = ("andexists", nodeA.id, nodeB.id, clause.id)
+
+        # Mapping from rule names to pair (clause id, clause)
+        hints = {}
+        splitVar = min(nodeA.variable, nodeB.variable)
+        highA = nodeA.branchHigh(splitVar)
+        lowA =  nodeA.branchLow(splitVar)
+        highB = nodeB.branchHigh(splitVar) 
+        lowB =  nodeB.branchLow(splitVar)
+        quant = splitVar == clause.variable
+        nclause = clause.low if quant else clause
+
+        if highA != lowA:
+            hints["UHD"] = (nodeA.idHD(), resolver.cleanTriple(-splitVar.id, -nodeA.id, highA.id))
+            hints["ULD"] = (nodeA.idLD(), resolver.cleanTriple( splitVar.id, -nodeA.id, lowA.id))
+        if highB != lowB:
+            hints["VHD"] = (nodeB.idHD(), resolver.cleanTriple(-splitVar.id, -nodeB.id, highB.id))
+            hints["VLD"] = (nodeB.idLD(), resolver.cleanTriple( splitVar.id, -nodeB.id, lowB.id))
+
+        (newHigh, andHigh) = self.applyAndExistsJustify(highA, highB, nclause, topLevel = False)
+        hints["OPH"] = (andHigh, resolver.cleanTriple(-highA.id, -highB.id, newHigh.id))
+
+        if quant and newHigh == self.leaf1:
+            # Quantified result is tautology.  No need to evaluate low branch
+            newNode = self.leaf1
+        else:
+            (newLow, andLow) = self.applyAndExistsJustify(lowA, lowB, nclause, topLevel = False)
+            hints["OPL"] = (andLow, resolver.cleanTriple(-lowA.id, -lowB.id, newLow.id))
+            if newHigh == newLow:
+                newNode = newHigh
+            elif quant:
+                newNode = self.applyOr(newHigh, newLow)
+                (check, orHigh) = self.justifyImply(newHigh, newNode)
+                hints["WHU"] = (orHigh, resolver.cleanPair(-newHigh.id, newNode.id))
+                (check, orLow) = self.justifyImply(newLow, newNode)
+                hints["WLU"] = (orLow, resolver.cleanPair(-newLow.id, newNode.id))
+            else:
+                newNode = self.findOrMake(splitVar, newHigh, newLow)
+                hints["WHU"] = (newNode.idHU(), resolver.cleanTriple(-splitVar.id, newNode.id, -newHigh.id))
+                hints["WLU"] = (newNode.idLU(), resolver.cleanTriple( splitVar.id, newNode.id, -newLow.id))
+
+        justification = self.andExistsJustification(nodeA, nodeB, newNode, splitVar, hints)
+        self.operationStore(key, newNode, justification)
+        self.cacheJustifyAdded += 1
+        return (newNode, abs(justification))
+
+    # Put arguments to and-exists into canonical form.
+    # Skip over quantified variables above both arguments
+    def andExistsArguments(self, nodeA, nodeB, clause):
+        if nodeA.id > nodeB.id:
+            nodeA, nodeB = nodeB, nodeA
+        topVar = min(nodeA.variable, nodeB.variable)
+        while not clause.isLeaf() and clause.variable < topVar:
+            clause = clause.low
+        return (nodeA, nodeB, clause)
+
+    def andExistsJustification(self, nodeA, nodeB, newNode, splitVar, hints):
+        targetClause = resolver.cleanTriple(-nodeA.id, -nodeB.id, newNode.id)
+        if targetClause == resolver.tautologyId:
+            return resolver.tautologyId
+        comment = "Justification that %s & %s ==> Exists %s" % (nodeA.label(), nodeB.label(), newNode.label())
+        return self.vresolver.run(targetClause, splitVar.id, hints, comment)
+
     # Use clause to provide canonical list of nodes.  Should all be positive
     def equant(self, node, clause, topLevel = True):
         if topLevel:
@@ -838,6 +1392,8 @@ class Manager:
             while not nextc.isLeaf():
                 self.quantifiedVariableSet.add(nextc.variable)
                 nextc = nextc.low
+            if self.iterative:
+                return self.runIterative(self.equantOp, (node, clause))
         if node.isLeaf():
             return node
         while not clause.isLeaf() and node.variable > clause.variable:
@@ -846,8 +1402,9 @@ class Manager:
             return node
         key = ("equant", node.id, clause.id)
         
-        if key in self.operationCache:
-            return self.operationCache[key][0]
+        lookup = self.operationRetrieveNode(key)
+        if lookup is not None:
+            return lookup
 
         newHigh = self.equant(node.high, clause, topLevel = False)
         newLow = self.equant(node.low, clause, topLevel = False)
@@ -856,10 +1413,373 @@ class Manager:
         else:
             quant = node.variable == clause.variable
             newNode = self.applyOr(newHigh, newLow) if quant else self.findOrMake(node.variable, newHigh, newLow)
-        self.operationCache[key] = (newNode, resolver.tautologyId)
+        self.operationStore(key, newNode, resolver.tautologyId)
         self.cacheNoJustifyAdded += 1
         return newNode
+
+    # Iterative apply engine.
+    # Each operation is split into a terminal function, which handles the constant
+    # cases and cache lookups, returning None when further work is required,
+    # and a body, written as a generator.  Instead of recursing, a body yields
+    # a pair ((terminal, body), arguments) for each subproblem and receives the
+    # subproblem result in return.  runIterative keeps the suspended bodies on an
+    # explicit stack.  Subproblems are evaluated in the same order as with the
+    # recursive versions, and so the generated nodes and proof steps are identical,
+    # but the depth of the BDDs is no longer limited by the Python recursion limit.
+    def runIterative(self, op, args):
+        (terminal, body) = op
+        value = terminal(*args)
+        if value is not None:
+            return value
+        stack = [body(*args)]
+        push = stack.append
+        pop = stack.pop
+        value = None
+        while stack:
+            try:
+                ((terminal, body), args) = stack[-1].send(value)
+            except StopIteration as ex:
+                pop()
+                value = ex.value
+                continue
+            value = terminal(*args)
+            if value is None:
+                push(body(*args))
+        return value
+
+    def andTerminal(self, nodeA, nodeB):
+        self.applyCount += 1
+        if nodeA == self.leaf0 or nodeB == self.leaf0:
+            return (self.leaf0, resolver.tautologyId)
+        if nodeA == self.leaf1:
+            return (nodeB, resolver.tautologyId)
+        if nodeB == self.leaf1:
+            return (nodeA, resolver.tautologyId)
+        if nodeA == nodeB:
+            return (nodeA, resolver.tautologyId)
+        if nodeA.id == -nodeB.id:
+            return (self.leaf0, resolver.tautologyId)
+        if nodeA.id > nodeB.id:
+            nodeA, nodeB = nodeB, nodeA
+        return self.operationRetrieve(("and", nodeA.id, nodeB.id))
+
+    def andBody(self, nodeA, nodeB):
+        if nodeA.id > nodeB.id:
+            nodeA, nodeB = nodeB, nodeA
+        key = ("and", nodeA.id, nodeB.id)
+        hints = {}
+        splitVar = min(nodeA.variable, nodeB.variable)
+        highA = nodeA.branchHigh(splitVar)
+        lowA =  nodeA.branchLow(splitVar)
+        highB = nodeB.branchHigh(splitVar) 
+        lowB =  nodeB.branchLow(splitVar)
+
+        if highA != lowA:
+            hints["UHD"] = (nodeA.idHD(), resolver.cleanTriple(-splitVar.id, -nodeA.id, highA.id))
+            hints["ULD"] = (nodeA.idLD(), resolver.cleanTriple( splitVar.id, -nodeA.id, lowA.id))
+        if highB != lowB:
+            hints["VHD"] = (nodeB.idHD(), resolver.cleanTriple(-splitVar.id, -nodeB.id, highB.id))
+            hints["VLD"] = (nodeB.idLD(), resolver.cleanTriple( splitVar.id, -nodeB.id, lowB.id))
+
+        (newHigh, andHigh) = yield (self.andOp, (highA, highB))
+        hints["OPH"] = (andHigh, resolver.cleanTriple(-highA.id, -highB.id, newHigh.id))
             
+        (newLow, andLow) = yield (self.andOp, (lowA, lowB))
+        hints["OPL"] = (andLow, resolver.cleanTriple(-lowA.id, -lowB.id, newLow.id))
+
+        if newHigh == newLow:
+            newNode = newHigh
+        else:
+            newNode = self.findOrMake(splitVar, newHigh, newLow)
+            hints["WHU"] = (newNode.idHU(), resolver.cleanTriple(-splitVar.id, newNode.id, -newHigh.id))
+            hints["WLU"] = (newNode.idLU(), resolver.cleanTriple( splitVar.id, newNode.id, -newLow.id))
+
+        targetClause = resolver.cleanTriple(-nodeA.id, -nodeB.id, newNode.id)
+        if targetClause == resolver.tautologyId:
+            justification = resolver.tautologyId
+        else:
+            comment = "Justification that %s & %s ==> %s" % (nodeA.label(), nodeB.label(), newNode.label())
+            justification = self.vresolver.run(targetClause, splitVar.id, hints, comment)
+        self.operationStore(key, newNode, justification)
+        self.cacheJustifyAdded += 1
+        return (newNode, abs(justification))
+
+    def implyTerminal(self, nodeA, nodeB):
+        self.applyCount += 1
+        if nodeA == nodeB:
+            return (True, resolver.tautologyId)
+        if nodeA == self.leaf0:
+            return (True, resolver.tautologyId)
+        if nodeB == self.leaf1:
+            return (True, resolver.tautologyId)
+        if nodeA == self.leaf1:
+            return (False, resolver.tautologyId)
+        if nodeB == self.leaf0:
+            return (False, resolver.tautologyId)
+        return self.operationRetrieve(("imply", nodeA.id, nodeB.id))
+
+    def implyBody(self, nodeA, nodeB):
+        key = ("imply", nodeA.id, nodeB.id)
+        hints = {}
+        splitVar = min(nodeA.variable, nodeB.variable)  
+        highA = nodeA.branchHigh(splitVar)
+        lowA =  nodeA.branchLow(splitVar)
+        highB = nodeB.branchHigh(splitVar) 
+        lowB =  nodeB.branchLow(splitVar)
+
+        if highA != lowA:
+            hints["UHD"] = (nodeA.idHD(), resolver.cleanTriple(-splitVar.id, -nodeA.id, highA.id))
+            hints["ULD"] = (nodeA.idLD(), resolver.cleanTriple( splitVar.id, -nodeA.id, lowA.id))
+        if highB != lowB:
+            hints["WHU"] = (nodeB.idHU(), resolver.cleanTriple(-splitVar.id, nodeB.id, -highB.id))
+            hints["WLU"] = (nodeB.idLU(), resolver.cleanTriple( splitVar.id, nodeB.id, -lowB.id))
+
+        (check, implyHigh) = yield (self.implyOp, (highA, highB))
+        if implyHigh != resolver.tautologyId:
+            hints["OPH"] = (implyHigh, resolver.cleanPair(-highA.id, highB.id))
+
+        if check:
+            (check, implyLow) = yield (self.implyOp, (lowA, lowB))
+            if implyLow != resolver.tautologyId:
+                hints["OPL"] = (implyLow, resolver.cleanPair(-lowA.id, lowB.id))
+
+        if check:
+            targetClause = resolver.cleanPair(-nodeA.id, nodeB.id)
+            comment = "Justification that %s ==> %s" % (nodeA.label(), nodeB.label())
+            justification = self.vresolver.run(targetClause, splitVar.id, hints, comment)
+        else:
+            justification = resolver.tautologyId
+
+        self.operationStore(key, check, justification)
+        if justification != resolver.tautologyId:
+            self.cacheJustifyAdded += 1
+        else:
+            self.cacheNoJustifyAdded += 1
+        return (check, abs(justification))
+
+    # Cases that reduce to implication test are handled by the body
+    def andImplyTerminal(self, nodeA, nodeB, nodeC):
+        self.applyCount += 1
+        if nodeA == self.leaf0 or nodeB == self.leaf0:
+            return (True, resolver.tautologyId)
+        if nodeA == self.leaf1 or nodeB == self.leaf1 or nodeA == nodeB:
+            return None
+        if nodeC == self.leaf1:
+            return (True, resolver.tautologyId)
+        if nodeA.id > nodeB.id:
+            nodeA, nodeB = nodeB, nodeA
+        return self.operationRetrieve(("andimply", nodeA.id, nodeB.id, nodeC.id))
+
+    def andImplyBody(self, nodeA, nodeB, nodeC):
+        if nodeA == self.leaf1:
+            result = yield (self.implyOp, (nodeB, nodeC))
+            return result
+        if nodeB == self.leaf1 or nodeA == nodeB:
+            result = yield (self.implyOp, (nodeA, nodeC))
+            return result
+        if nodeA.id > nodeB.id:
+            nodeA, nodeB = nodeB, nodeA
+        key = ("andimply", nodeA.id, nodeB.id, nodeC.id)
+        hints = {}
+        splitVar = min(nodeA.variable, nodeB.variable)
+        if nodeC != self.leaf0:
+            splitVar = min(splitVar, nodeC.variable)
+        highA = nodeA.branchHigh(splitVar)
+        lowA =  nodeA.branchLow(splitVar)
+        highB = nodeB.branchHigh(splitVar) 
+        lowB =  nodeB.branchLow(splitVar)
+        highC = nodeC if nodeC == self.leaf0 else nodeC.branchHigh(splitVar)
+        lowC =  nodeC if nodeC == self.leaf0 else nodeC.branchLow(splitVar)
+
+        if highA != lowA:
+            hints["UHD"] = (nodeA.idHD(), resolver.cleanTriple(-splitVar.id, -nodeA.id, highA.id))
+            hints["ULD"] = (nodeA.idLD(), resolver.cleanTriple( splitVar.id, -nodeA.id, lowA.id))
+        if highB != lowB:
+            hints["VHD"] = (nodeB.idHD(), resolver.cleanTriple(-splitVar.id, -nodeB.id, highB.id))
+            hints["VLD"] = (nodeB.idLD(), resolver.cleanTriple( splitVar.id, -nodeB.id, lowB.id))
+        if highC != lowC:
+            hints["WHU"] = (nodeC.idHU(), resolver.cleanTriple(-splitVar.id, nodeC.id, -highC.id))
+            hints["WLU"] = (nodeC.idLU(), resolver.cleanTriple( splitVar.id, nodeC.id, -lowC.id))
+
+        (check, implyHigh) = yield (self.andImplyOp, (highA, highB, highC))
+        if implyHigh != resolver.tautologyId:
+            hints["OPH"] = (implyHigh, resolver.cleanTriple(-highA.id, -highB.id, highC.id))
+
+        if check:
+            (check, implyLow) = yield (self.andImplyOp, (lowA, lowB, lowC))
+            if implyLow != resolver.tautologyId:
+                hints["OPL"] = (implyLow, resolver.cleanTriple(-lowA.id, -lowB.id, lowC.id))
+
+        if check:
+            targetClause = resolver.cleanTriple(-nodeA.id, -nodeB.id, nodeC.id)
+            if targetClause == resolver.tautologyId:
+                justification = resolver.tautologyId
+            else:
+                comment = "Justification that %s & %s ==> %s" % (nodeA.label(), nodeB.label(), nodeC.label())
+                justification = self.vresolver.run(targetClause, splitVar.id, hints, comment)
+        else:
+            justification = resolver.tautologyId
+
+        self.operationStore(key, check, justification)
+        if justification != resolver.tautologyId:
+            self.cacheJustifyAdded += 1
+        else:
+            self.cacheNoJustifyAdded += 1
+        return (check, abs(justification))
+
+    def orTerminal(self, nodeA, nodeB):
+        if nodeA == self.leaf1:
+            return self.leaf1
+        if nodeB == self.leaf1:
+            return self.leaf1
+        if nodeA == self.leaf0:
+            return nodeB
+        if nodeB == self.leaf0:
+            return nodeA
+        if nodeA == nodeB:
+            return nodeA
+        if nodeA.id == -nodeB.id:
+            return self.leaf1
+        if nodeA.id > nodeB.id:
+            nodeA, nodeB = nodeB, nodeA
+        return self.operationRetrieveNode(("or", nodeA.id, nodeB.id))
+
+    def orBody(self, nodeA, nodeB):
+        if nodeA.id > nodeB.id:
+            nodeA, nodeB = nodeB, nodeA
+        key = ("or", nodeA.id, nodeB.id)
+        splitVar = min(nodeA.variable, nodeB.variable)  
+        highA = nodeA.branchHigh(splitVar)
+        lowA =  nodeA.branchLow(splitVar)
+        highB = nodeB.branchHigh(splitVar) 
+        lowB =  nodeB.branchLow(splitVar)
+
+        newHigh = yield (self.orOp, (highA, highB))
+        newLow = yield (self.orOp, (lowA, lowB))
+        newNode = newHigh if newHigh == newLow else self.findOrMake(splitVar, newHigh, newLow)
+        self.operationStore(key, newNode, resolver.tautologyId)
+        self.cacheNoJustifyAdded += 1
+        return newNode
+
+    def equantTerminal(self, node, clause):
+        if node.isLeaf():
+            return node
+        while not clause.isLeaf() and node.variable > clause.variable:
+            clause = clause.low
+        if clause.isLeaf():
+            return node
+        return self.operationRetrieveNode(("equant", node.id, clause.id))
+
+    def equantBody(self, node, clause):
+        while not clause.isLeaf() and node.variable > clause.variable:
+            clause = clause.low
+        key = ("equant", node.id, clause.id)
+        newHigh = yield (self.equantOp, (node.high, clause))
+        newLow = yield (self.equantOp, (node.low, clause))
+        if newHigh == newLow:
+            newNode = newHigh
+        elif node.variable == clause.variable:
+            newNode = yield (self.orOp, (newHigh, newLow))
+        else:
+            newNode = self.findOrMake(node.variable, newHigh, newLow)
+        self.operationStore(key, newNode, resolver.tautologyId)
+        self.cacheNoJustifyAdded += 1
+        return newNode
+
+    def andListTerminal(self, nodeList):
+        self.applyCount += 1
+        nodeList = self.andListArguments(nodeList)
+        if nodeList is None:
+            return (self.leaf0, resolver.tautologyId)
+        if len(nodeList) == 0:
+            return (self.leaf1, resolver.tautologyId)
+        if len(nodeList) == 1:
+            return (nodeList[0], resolver.tautologyId)
+        if len(nodeList) == 2:
+            return None
+        return self.operationRetrieve(tuple(["andlist"] + [n.id for n in nodeList]))
+
+    def andListBody(self, nodeList):
+        nodeList = self.andListArguments(nodeList)
+        if len(nodeList) == 2:
+            result = yield (self.andOp, (nodeList[0], nodeList[1]))
+            return result
+        key = tuple(["andlist"] + [n.id for n in nodeList])
+        splitVar = min([n.variable for n in nodeList])
+        highList = [n.branchHigh(splitVar) for n in nodeList]
+        lowList = [n.branchLow(splitVar) for n in nodeList]
+        (newHigh, andHigh) = yield (self.andListOp, (highList,))
+        (newLow, andLow) = yield (self.andListOp, (lowList,))
+        newNode = newHigh if newHigh == newLow else self.findOrMake(splitVar, newHigh, newLow)
+        justification = self.andListJustification(nodeList, splitVar, highList, lowList,
+                                                   newHigh, andHigh, newLow, andLow, newNode)
+        self.operationStore(key, newNode, justification)
+        self.cacheJustifyAdded += 1
+        return (newNode, abs(justification))
+
+    def andExistsTerminal(self, nodeA, nodeB, clause):
+        self.applyCount += 1
+        if nodeA == self.leaf0 or nodeB == self.leaf0:
+            return (self.leaf0, resolver.tautologyId)
+        if nodeA.id == -nodeB.id:
+            return (self.leaf0, resolver.tautologyId)
+        (nodeA, nodeB, clause) = self.andExistsArguments(nodeA, nodeB, clause)
+        if clause.isLeaf() or nodeB == self.leaf1 or nodeA == nodeB:
+            return None
+        return self.operationRetrieve(("andexists", nodeA.id, nodeB.id, clause.id))
+
+    def andExistsBody(self, nodeA, nodeB, clause):
+        (nodeA, nodeB, clause) = self.andExistsArguments(nodeA, nodeB, clause)
+        if clause.isLeaf():
+            result = yield (self.andOp, (nodeA, nodeB))
+            return result
+        if nodeB == self.leaf1 or nodeA == nodeB:
+            newNode = yield (self.equantOp, (nodeA, clause))
+            (check, justification) = yield (self.implyOp, (nodeA, newNode))
+            return (newNode, justification)
+        key = ("andexists", nodeA.id, nodeB.id, clause.id)
+        hints = {}
+        splitVar = min(nodeA.variable, nodeB.variable)
+        highA = nodeA.branchHigh(splitVar)
+        lowA =  nodeA.branchLow(splitVar)
+        highB = nodeB.branchHigh(splitVar) 
+        lowB =  nodeB.branchLow(splitVar)
+        quant = splitVar == clause.variable
+        nclause = clause.low if quant else clause
+
+        if highA != lowA:
+            hints["UHD"] = (nodeA.idHD(), resolver.cleanTriple(-splitVar.id, -nodeA.id, highA.id))
+            hints["ULD"] = (nodeA.idLD(), resolver.cleanTriple( splitVar.id, -nodeA.id, lowA.id))
+        if highB != lowB:
+            hints["VHD"] = (nodeB.idHD(), resolver.cleanTriple(-splitVar.id, -nodeB.id, highB.id))
+            hints["VLD"] = (nodeB.idLD(), resolver.cleanTriple( splitVar.id, -nodeB.id, lowB.id))
+
+        (newHigh, andHigh) = yield (self.andExistsOp, (highA, highB, nclause))
+        hints["OPH"] = (andHigh, resolver.cleanTriple(-highA.id, -highB.id, newHigh.id))
+
+        if quant and newHigh == self.leaf1:
+            newNode = self.leaf1
+        else:
+            (newLow, andLow) = yield (self.andExistsOp, (lowA, lowB, nclause))
+            hints["OPL"] = (andLow, resolver.cleanTriple(-lowA.id, -lowB.id, newLow.id))
+            if newHigh == newLow:
+                newNode = newHigh
+            elif quant:
+                newNode = yield (self.orOp, (newHigh, newLow))
+                (check, orHigh) = yield (self.implyOp, (newHigh, newNode))
+                hints["WHU"] = (orHigh, resolver.cleanPair(-newHigh.id, newNode.id))
+                (check, orLow) = yield (self.implyOp, (newLow, newNode))
+                hints["WLU"] = (orLow, resolver.cleanPair(-newLow.id, newNode.id))
+            else:
+                newNode = self.findOrMake(splitVar, newHigh, newLow)
+                hints["WHU"] = (newNode.idHU(), resolver.cleanTriple(-splitVar.id, newNode.id, -newHigh.id))
+                hints["WLU"] = (newNode.idLU(), resolver.cleanTriple( splitVar.id, newNode.id, -newLow.id))
+
+        justification = self.andExistsJustification(nodeA, nodeB, newNode, splitVar, hints)
+        self.operationStore(key, newNode, justification)
+        self.cacheJustifyAdded += 1
+        return (newNode, abs(justification))
+
     # Generate list of all nodes from root.
     # Order according to postorder traversal of graph
     def getNodeList(self, node, includeLeaves = True):
@@ -897,57 +1817,63 @@ class Manager:
 
 
     # Should a GC be triggered?
+    # Returns list of clauses that can be deleted,
+    # including ones justifying evicted cache entries
     def checkGC(self, newDeadCount):
+        clauseList = self.evictedClauses
+        self.evictedClauses = []
+        # With reference counting, dead nodes are freed incrementally
+        if self.refCounting:
+            return clauseList + self.freeZeroNodes()
         self.deadNodeCount += newDeadCount
         liveNodeCount = len(self.uniqueTable)
         df = float(self.deadNodeCount) / liveNodeCount
         if liveNodeCount >= self.gcMin and df >= self.gcFraction:
             # Turn off trigger for garbage collection
             self.deadNodeCount = 0
-            return self.collectGarbage()
-        return []
+            return clauseList + self.collectGarbage()
+        return clauseList
 
-    # Create set nodes that should not be collected
-    # Maintain frontier of marked nonleaf nodes
+    # Create set of ids for nodes that should not be collected
+    # Maintain stack of nonleaf nodes to visit.  Each node is pushed at most once
     def doMarking(self, frontier):
-        markedSet = set([])
-        while len(frontier) > 0:
-            node = frontier[0]
-            frontier = frontier[1:]
-            if node in markedSet:
-                continue
-            markedSet.add(node)
-            if not node.high.isLeaf():
-                frontier.append(node.high)
-            if not node.low.isLeaf():
-                frontier.append(node.low)
-        return markedSet
-
-    def cleanCache(self, markedSet):
+        markedIds = set([])
+        stack = []
+        for node in [r.regular() for r in frontier]:
+            if node.id not in markedIds:
+                markedIds.add(node.id)
+                stack.append(node)
+        while len(stack) > 0:
+            node = stack.pop()
+            for child in [node.high.regular(), node.low.regular()]:
+                if not child.isLeaf() and child.id not in markedIds:
+                    markedIds.add(child.id)
+                    stack.append(child)
+        return markedIds
+
+    def cleanCache(self, markedIds):
         clauseList = []
-        markedIds = set([node.id for node in markedSet])
-        klist = list(self.operationCache.keys())
-        for k in klist:
-            kill = self.operationCache[k][0] not in markedSet
-            # Skip over operation name
-            for id in k[1:]:
-                kill = kill or id not in markedIds
-            if kill:
-                cid = self.operationCache[k][1]
-                if abs(cid) != resolver.tautologyId:
-                    clist = [cid] if cid > 0 else [-cid-1, -cid]
-                    clauseList += clist
-                self.cacheRemoved += 1
-                del self.operationCache[k]
+        for cache in self.operationCache.values():
+            for k in cache.keys():
+                (result, cid) = cache.get(k)
+                # Entries holding implication checks, rather than nodes, are always removed
+                kill = not isinstance(result, Node) or abs(result.id) not in markedIds
+                # Skip over operation name
+                for id in k[1:]:
+                    kill = kill or abs(id) not in markedIds
+                if kill:
+                    clauseList += self.justificationClauses(cid)
+                    self.cacheRemoved += 1
+                    cache.remove(k)
         return clauseList
         
-    def cleanNodes(self, markedSet):
+    def cleanNodes(self, markedIds):
         clauseList = []
         klist = list(self.uniqueTable.keys())
         for k in klist:
             node = self.uniqueTable[k]
             # If node is marked, then its children will be, too
-            if node not in markedSet:
+            if node.id not in markedIds:
                 clist = [node.idHU(), node.idLU(), node.idHD(), node.idLD()]
                 clist = [c for c in clist if c != resolver.tautologyId]
                 clauseList += clist
@@ -959,21 +1885,202 @@ class Manager:
     # Start garbage collection.
     # Provided with partial list of accessible roots
     def collectGarbage(self):
+        startTime = time.perf_counter()
         oldCount = len(self.uniqueTable)
+        oldCacheRemoved = self.cacheRemoved
         frontier = []
         if self.rootGenerator is not None:
             frontier += self.rootGenerator()
         frontier = [r for r in frontier if (r is not None and not r.isLeaf())]
         # Marking phase
-        markedSet = self.doMarking(frontier)
-        clauseList = self.cleanCache(markedSet)
-        clauseList += self.cleanNodes(markedSet)
+        markedIds = self.doMarking(frontier)
+        clauseList = self.cleanCache(markedIds)
+        clauseList += self.cleanNodes(markedIds)
         self.gcCount += 1
         newCount = len(self.uniqueTable)
+        seconds = time.perf_counter() - startTime
+        self.recordGC(seconds, oldCount, newCount, len(clauseList), self.cacheRemoved - oldCacheRemoved)
         if self.verbLevel >= 3:
-            self.writer.write("GC #%d %d --> %d nodes\n" % (self.gcCount, oldCount, newCount))
+            self.writer.write("GC #%d %d --> %d nodes.  %d clauses deleted.  %.2f ms\n" %
+                              (self.gcCount, oldCount, newCount, len(clauseList), 1000.0 * seconds))
         return clauseList
 
+    # Pause histogram bucket: 0 for pauses under 1 ms, otherwise k for pauses in [2^(k-1), 2^k) ms
+    def pauseBucket(self, seconds):
+        ms = 1000.0 * seconds
+        bucket = 0
+        while ms >= 1.0:
+            bucket += 1
+            ms = ms / 2
+        return bucket
+
+    def recordGC(self, seconds, oldCount, newCount, clauseCount, cacheCount):
+        self.gcSeconds += seconds
+        self.gcMaxSeconds = max(self.gcMaxSeconds, seconds)
+        self.gcClausesDeleted += clauseCount
+        bucket = self.pauseBucket(seconds)
+        self.gcPauseHistogram[bucket] = self.gcPauseHistogram.get(bucket, 0) + 1
+        if self.gcTrace is not None:
+            self.gcTrace.append({ 'gc' : self.gcCount, 'seconds' : seconds,
+                                  'liveBefore' : oldCount, 'liveAfter' : newCount,
+                                  'nodesFreed' : oldCount - newCount, 'clausesDeleted' : clauseCount,
+                                  'cacheRemoved' : cacheCount, 'totalNodes' : self.nodeCount,
+                                  'gcFraction' : self.gcFraction, 'gcMin' : self.gcMin })
+
+    # Write record of all collections as JSON
+    def writeGcTrace(self, fname):
+        if self.gcTrace is None:
+            return
+        try:
+            outfile = open(fname, 'w')
+        except Exception as ex:
+            raise BddException("Couldn't open GC trace file '%s' (%s)" % (fname, str(ex)))
+        json.dump({ 'gcFraction' : self.gcFraction, 'gcMin' : self.gcMin, 'collections' : self.gcTrace },
+                  outfile, indent = 1)
+        outfile.write('\n')
+        outfile.close()
+
+    # Should variables be reordered?
+    def checkReorder(self):
+        return self.reorderNext is not None and len(self.uniqueTable) >= self.reorderNext
+
+    # Reorder variables by sifting.  Driver must supply all nodes that it holds.
+    # Nodes that have been garbage collected are ignored.
+    # Returns (mapping, clauseList).
+    # Mapping is from id of each node reachable from roots to pair (node, clause id),
+    # where the clause asserts that the old node implies the new one.
+    # Mapping is None if the ordering is unchanged.
+    # Clauses in clauseList should be deleted once the driver has updated its nodes
+    def reorderVariables(self, roots):
+        if self.refCounting or self.complementEdges:
+            raise BddException("Variable reordering not supported with reference counting or complement edges")
+        startTime = time.perf_counter()
+        roots = [r for r in roots if not r.isLeaf() and self.isLive(r)]
+        sifter = reorder.Sifter(self.variables, roots)
+        # Nodes reachable from roots.  Unique table also holds garbage
+        oldCount = sifter.size
+        order = sifter.sift()
+        mapping = None
+        clauseList = []
+        if [v.id for v in order] != [v.id for v in self.variables]:
+            mapping, clauseList = self.applyOrder(roots, order)
+        seconds = time.perf_counter() - startTime
+        self.reorderCount += 1
+        self.reorderSeconds += seconds
+        self.reorderNext = max(self.reorderNext, int(self.reorderGrowth * len(self.uniqueTable)))
+        if self.verbLevel >= 2:
+            self.writer.write("Reordering #%d %d --> %d nodes.  %d swaps.  %.2f seconds\n" %
+                              (self.reorderCount, oldCount, sifter.size, sifter.swapCount, seconds))
+        return (mapping, clauseList)
+
+    # Rebuild BDDs with variables in new order.
+    # Nodes whose subgraphs remain ordered are kept.  Others are rebuilt,
+    # with a proof that each old node implies its replacement
+    def applyOrder(self, roots, order):
+        clauseList = []
+        # List nodes, children first
+        nodeList = []
+        visited = set([])
+        for root in roots:
+            stack = [root]
+            while len(stack) > 0:
+                node = stack[-1]
+                if node.isLeaf() or node.id in visited:
+                    stack.pop()
+                    continue
+                pending = [c for c in [node.high, node.low] if not c.isLeaf() and c.id not in visited]
+                if len(pending) > 0:
+                    stack += pending
+                    continue
+                stack.pop()
+                visited.add(node.id)
+                nodeList.append(node)
+        # Cached results are in terms of old ordering
+        for cache in self.operationCache.values():
+            for k in cache.keys():
+                (result, cid) = cache.get(k)
+                clauseList += self.justificationClauses(cid)
+                self.cacheRemoved += 1
+                cache.remove(k)
+        # Change levels.  Variables are hashed by level
+        levelMap = { order[i].level : i+1 for i in range(len(order)) }
+        for i in range(len(order)):
+            order[i].level = i+1
+        self.variables = list(order)
+        self.quantifiedVariableSet = set(list(self.quantifiedVariableSet))
+        oldTable = self.uniqueTable
+        self.uniqueTable = {}
+        # Enter nodes that remain ordered before creating any new nodes
+        keepIds = set([])
+        for node in nodeList:
+            if all([child.isLeaf() or (child.id in keepIds and node.variable < child.variable) for child in [node.high, node.low]]):
+                keepIds.add(node.id)
+                self.uniqueTable[self.uniqueKey(node)] = node
+        mapping = {}
+        for node in nodeList:
+            if node.id in keepIds:
+                mapping[node.id] = (node, resolver.tautologyId)
+            else:
+                mapping[node.id] = self.reorderNode(node, mapping, clauseList)
+        # Remove old nodes, including ones that were not reachable from the roots
+        for k in oldTable.keys():
+            node = oldTable[k]
+            if node.id not in keepIds:
+                clist = [node.idHU(), node.idLU(), node.idHD(), node.idLD()]
+                clauseList += [c for c in clist if c != resolver.tautologyId]
+                self.nodesRemoved += 1
+        self.maxLiveCount = max(self.maxLiveCount, len(self.uniqueTable))
+        return (mapping, clauseList)
+
+    # Rebuild node under new ordering as (x & high') | (!x & low'),
+    # where high' and low' are the rebuilt children.
+    # Return (new node, id of clause asserting that node implies new node).
+    # Intermediate proof steps are added to clauseList for later deletion
+    def reorderNode(self, node, mapping, clauseList):
+        var = node.variable
+        (high, low) = (node.high, node.low)
+        (newHigh, implyHigh) = (high, resolver.tautologyId) if high.isLeaf() else mapping[high.id]
+        (newLow, implyLow) = (low, resolver.tautologyId) if low.isLeaf() else mapping[low.id]
+        posLit = self.literal(var, 1)
+        negLit = self.literal(var, 0)
+        (highAnd, andHigh) = self.applyAndJustify(posLit, newHigh)
+        (lowAnd, andLow) = self.applyAndJustify(negLit, newLow)
+        newNode = self.applyOr(highAnd, lowAnd)
+        (checkHigh, orHigh) = self.justifyImply(highAnd, newNode)
+        (checkLow, orLow) = self.justifyImply(lowAnd, newNode)
+        if not (checkHigh and checkLow):
+            raise BddException("Failed to rebuild node %s under new ordering" % node.label())
+        # Case when variable is true
+        hints = [(node.idHD(), [-var.id, -node.id, high.id]),
+                 (implyHigh, [-high.id, newHigh.id]),
+                 (posLit.idHU(), [-var.id, posLit.id]),
+                 (andHigh, [-posLit.id, -newHigh.id, highAnd.id]),
+                 (orHigh, [-highAnd.id, newNode.id])]
+        target = [-var.id, -node.id, newNode.id]
+        comment = "Justification that %s ==> %s when %s is true" % (node.label(), newNode.label(), str(var))
+        highId = self.hintedProofStep(target, hints, comment)
+        clauseList.append(highId)
+        # Case when variable is false
+        hints = [(highId, target),
+                 (node.idLD(), [var.id, -node.id, low.id]),
+                 (implyLow, [-low.id, newLow.id]),
+                 (negLit.idLU(), [var.id, negLit.id]),
+                 (andLow, [-negLit.id, -newLow.id, lowAnd.id]),
+                 (orLow, [-lowAnd.id, newNode.id])]
+        target = [-node.id, newNode.id]
+        comment = "Justification that %s ==> %s" % (node.label(), newNode.label())
+        lowId = self.hintedProofStep(target, hints, None)
+        clauseList.append(lowId)
+        return (newNode, lowId)
+
+    # Generate proof step from list of (clause id, clause) hints, in propagation order
+    def hintedProofStep(self, target, hints, comment):
+        (idList, clauseList) = self.cleanHintList(hints)
+        antecedents = self.vresolver.RupCheck(target, idList, clauseList)
+        if antecedents is None:
+            raise BddException("Couldn't justify proof step %s" % str(target))
+        return self.vresolver.generateProofStep(target, antecedents, comment)
+
     # Summarize activity
     def summarize(self):
         if self.verbLevel >= 1:
@@ -983,13 +2090,30 @@ class Manager:
             self.writer.write("Total nodes: %d\n" % self.nodeCount)
             if self.verbLevel >= 2:
                 self.writer.write("Total nodes removed by gc: %d\n" % self.nodesRemoved)
+                if self.refCounting:
+                    self.writer.write("Total nodes freed by reference counting: %d\n" % self.nodesFreed)
             self.writer.write("Maximum live nodes: %d\n" % self.maxLiveCount)
             self.writer.write("Total apply operations: %d\n" % self.applyCount)            
             if self.verbLevel >= 2:
                 self.writer.write("Total cached results not requiring proofs: %d\n" % self.cacheNoJustifyAdded)
                 self.writer.write("Total cached results requiring proofs: %d\n" % self.cacheJustifyAdded)
                 self.writer.write("Total cache entries removed: %d\n" % self.cacheRemoved)
+                for opName in sorted(self.operationCache.keys()):
+                    cache = self.operationCache[opName]
+                    lookups = cache.hits + cache.misses
+                    rate = 100.0 * cache.hits / lookups if lookups > 0 else 0.0
+                    self.writer.write("  Cache '%s': %d hits, %d misses (%.1f%% hit rate), %d evictions, %d entries\n" %
+                                      (opName, cache.hits, cache.misses, rate, cache.evictions, len(cache)))
             self.writer.write("Total GCs performed: %d\n" % self.gcCount)
+            if self.reorderCount > 0:
+                self.writer.write("Total variable reorderings: %d (%.2f seconds)\n" % (self.reorderCount, self.reorderSeconds))
+            if self.verbLevel >= 2 and self.gcCount > 0:
+                self.writer.write("Total GC time: %.3f seconds.  Maximum pause %.2f ms\n" % (self.gcSeconds, 1000.0 * self.gcMaxSeconds))
+                self.writer.write("Total clauses deleted by GC: %d\n" % self.gcClausesDeleted)
+                self.writer.write("GC pause histogram:\n")
+                for bucket in sorted(self.gcPauseHistogram.keys()):
+                    lower = "0" if bucket == 0 else "%d" % (2**(bucket-1))
+                    self.writer.write("  [%s, %d) ms: %d\n" % (lower, 2**bucket, self.gcPauseHistogram[bucket]))
         if self.verbLevel >= 2:
             self.writer.write("Results from resolver:\n")
             self.vresolver.summarize()
@@ -0,0 +1,348 @@
+#!/usr/local/bin/python3
+# Performance comparisons for alternate implementations within the solver
+
+#####################################################################################
+# Copyright (c) 2021 Marijn Heule, Randal E. Bryant, Carnegie Mellon University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or
+# substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT
+# NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT
+# OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+########################################################################################
+
+import sys
+import getopt
+import datetime
+import tracemalloc
+import tempfile
+import os
+import random
+
+import solver
+import stream
+import resolver
+import dimacs
+
+def usage(name):
+    sys.stderr.write("Usage: %s [-h] -c COMPARISON -i CNF [-p PERMUTE] [-s SCHEDULE] [-b] [-B BPERM]\n" % name)
+    sys.stderr.write("  -h            Print this message\n")
+    sys.stderr.write("  -c COMPARISON Which comparison to run:\n")
+    for cname in sorted(comparisons.keys()):
+        sys.stderr.write("                  %-8s %s\n" % (cname, comparisons[cname][1]))
+    sys.stderr.write("  -i CNF        Name of CNF input file\n")
+    sys.stderr.write("  -p PERMUTE    Name of file specifying mapping from CNF variable to BDD level\n")
+    sys.stderr.write("  -s SCHEDULE   Name of action schedule file\n")
+    sys.stderr.write("  -b            Process terms via bucket elimination ordered by variable levels\n")
+    sys.stderr.write("  -B BPERM      Process terms via bucket elimination ordered by permutation file BPERM\n")
+
+# Description of how to run solver on benchmark
+class Problem:
+    cnfName = None
+    permuter = None
+    scheduler = None
+    doBucket = False
+    bpermuter = None
+
+    def __init__(self, cnfName, permuter = None, scheduler = None, doBucket = False, bpermuter = None):
+        self.cnfName = cnfName
+        self.permuter = permuter
+        self.scheduler = scheduler
+        self.doBucket = doBucket
+        self.bpermuter = bpermuter
+
+# Outcome of single solver run
+class Measurement:
+    label = ""
+    status = None
+    seconds = 0.0
+    peakBytes = 0
+    nodeCount = 0
+    maxLiveCount = 0
+    clauseCount = 0
+
+    def __init__(self, label, status, seconds, peakBytes, nodeCount, maxLiveCount, clauseCount):
+        self.label = label
+        self.status = status
+        self.seconds = seconds
+        self.peakBytes = peakBytes
+        self.nodeCount = nodeCount
+        self.maxLiveCount = maxLiveCount
+        self.clauseCount = clauseCount
+
+    def show(self, writer):
+        rate = self.nodeCount / self.seconds if self.seconds > 0 else 0.0
+        writer.write("%-20s status=%-13s time=%8.2fs  peak memory=%10.2fMB  nodes=%9d (%10.0f nodes/s)  peak live=%9d  clauses=%9d\n" %
+                     (self.label, str(self.status), self.seconds, self.peakBytes / (1024.0 * 1024.0), self.nodeCount, rate,
+                      self.maxLiveCount, self.clauseCount))
+
+# Run solver with proof discarded.  Keyword options are passed to the solver
+def measure(label, problem, traceMemory = True, **options):
+    prover = solver.Prover("", verbLevel = 0, doLrat = True)
+    if traceMemory:
+        tracemalloc.start()
+    start = datetime.datetime.now()
+    s = solver.Solver(problem.cnfName, prover = prover, permuter = problem.permuter, verbLevel = 0, **options)
+    if problem.doBucket:
+        status = s.runBucketSchedule()
+    elif problem.bpermuter is not None:
+        status = s.runBucketSchedulePerm(problem.bpermuter)
+    elif problem.scheduler is not None:
+        status = s.runSchedule(problem.scheduler, solver.pseudoboolean.modulusAuto, None)
+    else:
+        status = s.runNoSchedule()
+    delta = datetime.datetime.now() - start
+    seconds = delta.seconds + 1e-6 * delta.microseconds
+    peakBytes = 0
+    if traceMemory:
+        current, peakBytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return Measurement(label, status, seconds, peakBytes, s.manager.nodeCount, s.manager.maxLiveCount, prover.clauseCount)
+
+# Rate at which prover writes clauses to proof file.
+# Input clauses of problem are replayed as proof steps, each with hints
+def measureProofRate(label, problem, doBinary, bufferSize, background = None, count = 200000):
+    reader = solver.CnfReader(problem.cnfName, verbLevel = 0)
+    clauses = reader.clauses
+    (fd, fname) = tempfile.mkstemp(suffix = ".lratb" if doBinary else ".lrat")
+    os.close(fd)
+    prover = solver.Prover(fname, verbLevel = 0, doLrat = True, doBinary = doBinary, bufferSize = bufferSize,
+                           background = background)
+    start = datetime.datetime.now()
+    for i in range(count):
+        clause = clauses[i % len(clauses)]
+        hints = list(range(max(1, prover.lastClauseId-8), prover.lastClauseId+1))
+        prover.createClause(clause, hints, alreadyClean = True)
+    prover.close()
+    delta = datetime.datetime.now() - start
+    seconds = delta.seconds + 1e-6 * delta.microseconds
+    byteCount = os.path.getsize(fname)
+    os.remove(fname)
+    rate = count / seconds if seconds > 0 else 0.0
+    return "%-20s time=%8.2fs  clauses=%9d (%10.0f clauses/s)  bytes=%10d\n" % (label, seconds, count, rate, byteCount)
+
+# Unbuffered vs. buffered vs. background proof output, in text and binary LRAT
+def compareProof(problem, writer):
+    for doBinary in [False, True]:
+        format = "binary" if doBinary else "text"
+        writer.write(measureProofRate("unbuffered %s" % format, problem, doBinary, 0))
+        writer.write(measureProofRate("buffered %s" % format, problem, doBinary, 1 << 20))
+        writer.write(measureProofRate("background %s" % format, problem, doBinary, 1 << 20, background = 64))
+
+# Encoding and decoding of binary LRAT integers.
+# Data consists of the literals of the CNF clauses, interspersed with clause Ids and hints.
+# Checks that each codec matches the one-at-a-time encoding and that decoding restores the data
+def compareVarint(problem, writer, count = 1000000):
+    reader = solver.CnfReader(problem.cnfName, verbLevel = 0)
+    literals = [lit for clause in reader.clauses for lit in clause + [0]]
+    data = []
+    cid = len(reader.clauses)
+    while len(data) < count:
+        for lit in literals:
+            data.append(lit)
+            if lit == 0:
+                cid += 1
+                data += [cid] + [random.randint(1, cid) for i in range(4)] + [0]
+    data = data[:count]
+    # One integer at a time, as done by CompressArray.append
+    start = datetime.datetime.now()
+    carray = stream.CompressArray()
+    for x in data:
+        carray.append(x)
+    reference = bytes(carray.bytes)
+    seconds = elapsedSeconds(start)
+    writer.write("%-20s encode %8.2fs (%10.0f ints/s)\n" % ("one at a time", seconds, count / seconds))
+    codecs = [("batch (Python)", stream.encodeIntegersPython, stream.decodeIntegersPython)]
+    if stream.numpy is not None:
+        codecs.append(("batch (NumPy)", stream.encodeIntegersNumpy, stream.decodeIntegersNumpy))
+    else:
+        writer.write("NumPy not available\n")
+    for (label, encode, decode) in codecs:
+        start = datetime.datetime.now()
+        encoded = encode(data)
+        encodeSeconds = elapsedSeconds(start)
+        start = datetime.datetime.now()
+        decoded = decode(encoded)
+        decodeSeconds = elapsedSeconds(start)
+        check = "round trip OK" if encoded == reference and decoded == data else "ROUND TRIP FAILED"
+        writer.write("%-20s encode %8.2fs (%10.0f ints/s)  decode %8.2fs (%10.0f ints/s)  %s\n" %
+                     (label, encodeSeconds, count / encodeSeconds, decodeSeconds, count / decodeSeconds, check))
+
+# Line-by-line vs. bulk reading of CNF file.  Checks that both give the same clauses
+def compareRead(problem, writer):
+    results = []
+    for (label, bulk) in [("line by line", False), ("bulk", True)]:
+        start = datetime.datetime.now()
+        reader = solver.CnfReader(problem.cnfName, verbLevel = 0, bulk = bulk)
+        seconds = elapsedSeconds(start)
+        results.append((reader.nvar, reader.clauses))
+        writer.write("%-20s %8.2fs (%10.0f clauses/s)\n" % (label, seconds, len(reader.clauses) / seconds))
+    if dimacs.numpy is None:
+        writer.write("NumPy not available.  Bulk reading falls back to line by line\n")
+    writer.write("Clauses %s\n" % ("match" if results[0] == results[1] else "DIFFER"))
+
+def elapsedSeconds(start):
+    delta = datetime.datetime.now() - start
+    return delta.seconds + 1e-6 * delta.microseconds
+
+# Recursive vs. iterative apply operations.
+# Memory tracing is disabled, since it distorts the cost of function calls
+def compareApply(problem, writer):
+    for m in [measure("recursive apply", problem, traceMemory = False, iterative = False),
+              measure("iterative apply", problem, traceMemory = False, iterative = True)]:
+        m.show(writer)
+
+# Plain BDDs vs. BDDs with complement edges
+def compareComplement(problem, writer):
+    for m in [measure("plain edges", problem, complementEdges = False),
+              measure("complement edges", problem, complementEdges = True)]:
+        m.show(writer)
+
+# Separate conjunction and quantification vs. combined and-exists operation
+def compareAndExists(problem, writer):
+    for m in [measure("and, then exists", problem, andExists = False),
+              measure("and-exists", problem, andExists = True)]:
+        m.show(writer)
+
+# Pairwise conjunction chains vs. n-ary conjunction of up to 4 and 8 terms
+def compareNary(problem, writer):
+    for m in [measure("pairwise and", problem, naryLimit = None),
+              measure("4-ary and", problem, naryLimit = 4),
+              measure("8-ary and", problem, naryLimit = 8)]:
+        m.show(writer)
+
+# Policies for choosing which terms to conjoin next
+def comparePairing(problem, writer):
+    for m in [measure("%s pairing" % policy, problem, pairing = policy) for policy in solver.pairingPolicies]:
+        m.show(writer)
+
+# Supplied ordering (if any) vs. identity and orderings generated from CNF structure.
+# Times include generating the ordering
+def compareOrdering(problem, writer):
+    plain = Problem(problem.cnfName, None, problem.scheduler, problem.doBucket, problem.bpermuter)
+    mlist = []
+    if problem.permuter is not None:
+        mlist.append(measure("given order", problem))
+    mlist.append(measure("identity order", plain))
+    for method in ['cm', 'force', 'minfill']:
+        mlist.append(measure("%s order" % method, plain, orderMethod = method))
+    for m in mlist:
+        m.show(writer)
+
+# Generic RUP check for every proof vs. decision table of proof plans, with and without checking each plan.
+# Settings are class attributes of VResolver, since solver creates resolver
+def compareRup(problem, writer):
+    for (label, usePlans, checkPlans) in [("generic RUP", False, False), ("decision table", True, False), ("checked table", True, True)]:
+        resolver.VResolver.usePlans = usePlans
+        resolver.VResolver.checkPlans = checkPlans
+        measure(label, problem, traceMemory = False).show(writer)
+    resolver.VResolver.usePlans = True
+    resolver.VResolver.checkPlans = False
+
+# Record arguments of all calls to clean clauses during solver run
+def recordCleanTrace(problem):
+    trace = []
+    saved = (resolver.cleanClause, resolver.cleanPair, resolver.cleanTriple)
+    def record(literalList):
+        if literalList == resolver.tautologyId:
+            return literalList
+        trace.append(list(literalList))
+        return resolver.cleanClauseSorted(literalList)
+    resolver.cleanClause = record
+    resolver.cleanPair = lambda a, b: record([a, b])
+    resolver.cleanTriple = lambda a, b, c: record([a, b, c])
+    try:
+        measure("record", problem, traceMemory = False)
+    finally:
+        (resolver.cleanClause, resolver.cleanPair, resolver.cleanTriple) = saved
+    return trace
+
+# Sorting vs. fixed-width normalization of clauses, replaying calls made during solver run.
+# Checks that all versions give the same results
+def compareClean(problem, writer, repeat = 5):
+    trace = recordCleanTrace(problem)
+    counts = {}
+    for clause in trace:
+        counts[len(clause)] = counts.get(len(clause), 0) + 1
+    writer.write("%d calls.  By length: %s\n" % (len(trace), ", ".join(["%d:%d" % (n, counts[n]) for n in sorted(counts.keys())])))
+    def fixedWidth(clause):
+        if len(clause) == 3:
+            return resolver.cleanTriple(clause[0], clause[1], clause[2])
+        if len(clause) == 2:
+            return resolver.cleanPair(clause[0], clause[1])
+        return resolver.cleanClause(clause)
+    reference = None
+    for (label, fun) in [("sorting", resolver.cleanClauseSorted), ("cleanClause", resolver.cleanClause), ("fixed width", fixedWidth)]:
+        start = datetime.datetime.now()
+        for r in range(repeat):
+            results = [fun(clause) for clause in trace]
+        seconds = elapsedSeconds(start)
+        if reference is None:
+            reference = results
+        check = "results OK" if results == reference else "RESULTS DIFFER"
+        rate = repeat * len(trace) / seconds if seconds > 0 else 0.0
+        writer.write("%-20s time=%8.2fs (%10.0f clauses/s)  %s\n" % (label, seconds, rate, check))
+
+# Mapping from comparison name to (function, description)
+comparisons = {
+    'andexists' : (compareAndExists, "Separate conjunction and quantification vs. combined and-exists"),
+    'apply' : (compareApply, "Runtime of recursive vs. iterative apply operations"),
+    'clean' : (compareClean, "Sorting vs. fixed-width normalization of clauses, over recorded calls"),
+    'complement' : (compareComplement, "Node counts with and without complement edges"),
+    'nary' : (compareNary, "Pairwise vs. n-ary conjunction of terms"),
+    'ordering' : (compareOrdering, "Given and identity variable orderings vs. orderings generated from CNF structure"),
+    'pairing' : (comparePairing, "Peak live nodes and runtime for each term pairing policy"),
+    'read' : (compareRead, "Line-by-line vs. bulk parsing of CNF file"),
+    'rup' : (compareRup, "Runtime with generic RUP check vs. decision table for antecedents"),
+    'proof' : (compareProof, "Clauses per second written to proof file, with and without buffering or writer thread"),
+    'varint' : (compareVarint, "Throughput of one-at-a-time vs. batch encoding of binary LRAT integers"),
+}
+
+def run(name, args):
+    comparison = None
+    cnfName = None
+    permuter = None
+    scheduler = None
+    doBucket = False
+    bpermuter = None
+    optlist, args = getopt.getopt(args, "hc:i:p:s:bB:")
+    for (opt, val) in optlist:
+        if opt == '-h':
+            usage(name)
+            return
+        elif opt == '-c':
+            comparison = val
+        elif opt == '-i':
+            cnfName = val
+        elif opt == '-p':
+            permuter = solver.readPermutation(val)
+            if permuter is None:
+                return
+        elif opt == '-s':
+            scheduler = solver.readScheduler(val)
+            if scheduler is None:
+                return
+        elif opt == '-b':
+            doBucket = True
+        elif opt == '-B':
+            bpermuter = solver.readPermutation(val)
+            if bpermuter is None:
+                return
+    if comparison not in comparisons or cnfName is None:
+        usage(name)
+        return
+    problem = Problem(cnfName, permuter, scheduler, doBucket, bpermuter)
+    fun = comparisons[comparison][0]
+    fun(problem, sys.stderr)
+
+if __name__ == "__main__":
+    run(sys.argv[0], sys.argv[1:])
@@ -0,0 +1,253 @@
+# Operation caches for BDD package
+# Each type of operation (and, imply, or, ...) has its own cache,
+# possibly bounded in size, with a choice of replacement policy
+
+#####################################################################################
+# Copyright (c) 2021 Marijn Heule, Randal E. Bryant, Carnegie Mellon University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or
+# substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT
+# NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT
+# OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+########################################################################################
+
+# Keys have the form (opName, operand1, ...), where the operands are integers.
+# Values are pairs (result, justification).
+# When an entry is evicted, its key and value are returned to the caller,
+# so that the clauses justifying the result can be deleted from the proof.
+
+import collections
+
+class CacheException(Exception):
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return "Cache Exception: " + str(self.value)
+
+# Cache without size bound.  Entries only removed by garbage collection
+class OperationCache:
+    name = ""
+    capacity = None
+    table = None
+    # Statistics
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def __init__(self, name, capacity = None):
+        self.name = name
+        self.capacity = capacity
+        self.table = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Return value, or None if not found
+    def lookup(self, key):
+        if key in self.table:
+            self.hits += 1
+            return self.table[key]
+        self.misses += 1
+        return None
+
+    # Add entry.  Return list of evicted (key, value) pairs
+    def insert(self, key, value):
+        self.table[key] = value
+        return []
+
+    def keys(self):
+        return list(self.table.keys())
+
+    def get(self, key):
+        return self.table[key]
+
+    def remove(self, key):
+        del self.table[key]
+
+    # Membership test.  Does not affect statistics or replacement
+    def __contains__(self, key):
+        return key in self.table
+
+    def __len__(self):
+        return len(self.table)
+
+# Least recently used replacement
+class LruCache(OperationCache):
+
+    def __init__(self, name, capacity):
+        OperationCache.__init__(self, name, capacity)
+        self.table = collections.OrderedDict()
+
+    def lookup(self, key):
+        if key in self.table:
+            self.hits += 1
+            self.table.move_to_end(key)
+            return self.table[key]
+        self.misses += 1
+        return None
+
+    def insert(self, key, value):
+        evicted = []
+        if key in self.table:
+            self.table.move_to_end(key)
+        elif len(self.table) >= self.capacity:
+            evicted.append(self.table.popitem(last = False))
+            self.evictions += 1
+        self.table[key] = value
+        return evicted
+
+# Clock (second chance) replacement.
+# Entries held in circular array of slots, each with a reference bit
+class ClockCache(OperationCache):
+    # Mapping from key to slot number
+    slotMap = None
+    slotKeys = None
+    slotValues = None
+    referenced = None
+    hand = 0
+    # Slots freed by removal
+    freeSlots = None
+
+    def __init__(self, name, capacity):
+        OperationCache.__init__(self, name, capacity)
+        self.slotMap = {}
+        self.slotKeys = []
+        self.slotValues = []
+        self.referenced = bytearray(capacity)
+        self.hand = 0
+        self.freeSlots = []
+
+    def lookup(self, key):
+        if key in self.slotMap:
+            self.hits += 1
+            slot = self.slotMap[key]
+            self.referenced[slot] = 1
+            return self.slotValues[slot]
+        self.misses += 1
+        return None
+
+    def insert(self, key, value):
+        evicted = []
+        if key in self.slotMap:
+            slot = self.slotMap[key]
+        elif len(self.freeSlots) > 0:
+            slot = self.freeSlots.pop()
+        elif len(self.slotKeys) < self.capacity:
+            slot = len(self.slotKeys)
+            self.slotKeys.append(None)
+            self.slotValues.append(None)
+        else:
+            # Advance hand, giving referenced entries a second chance
+            while self.referenced[self.hand] == 1:
+                self.referenced[self.hand] = 0
+                self.hand = (self.hand + 1) % self.capacity
+            slot = self.hand
+            self.hand = (self.hand + 1) % self.capacity
+            evicted.append((self.slotKeys[slot], self.slotValues[slot]))
+            del self.slotMap[self.slotKeys[slot]]
+            self.evictions += 1
+        self.slotMap[key] = slot
+        self.slotKeys[slot] = key
+        self.slotValues[slot] = value
+        self.referenced[slot] = 0
+        return evicted
+
+    def keys(self):
+        return list(self.slotMap.keys())
+
+    def get(self, key):
+        return self.slotValues[self.slotMap[key]]
+
+    def remove(self, key):
+        slot = self.slotMap[key]
+        del self.slotMap[key]
+        self.slotKeys[slot] = None
+        self.slotValues[slot] = None
+        self.referenced[slot] = 0
+        self.freeSlots.append(slot)
+
+    def __contains__(self, key):
+        return key in self.slotMap
+
+    def __len__(self):
+        return len(self.slotMap)
+
+# Direct-mapped cache.  Each key has exactly one possible slot,
+# determined by the hash of its operands.  New entry replaces any existing one
+class DirectCache(OperationCache):
+    slotKeys = None
+    slotValues = None
+    count = 0
+
+    def __init__(self, name, capacity):
+        OperationCache.__init__(self, name, capacity)
+        self.slotKeys = [None] * capacity
+        self.slotValues = [None] * capacity
+        self.count = 0
+
+    # Hash only the operands, since hashing of strings varies from run to run
+    def slot(self, key):
+        return hash(key[1:]) % self.capacity
+
+    def lookup(self, key):
+        slot = self.slot(key)
+        if self.slotKeys[slot] == key:
+            self.hits += 1
+            return self.slotValues[slot]
+        self.misses += 1
+        return None
+
+    def insert(self, key, value):
+        evicted = []
+        slot = self.slot(key)
+        okey = self.slotKeys[slot]
+        if okey is None:
+            self.count += 1
+        elif okey != key:
+            evicted.append((okey, self.slotValues[slot]))
+            self.evictions += 1
+        self.slotKeys[slot] = key
+        self.slotValues[slot] = value
+        return evicted
+
+    def keys(self):
+        return [key for key in self.slotKeys if key is not None]
+
+    def get(self, key):
+        return self.slotValues[self.slot(key)]
+
+    def remove(self, key):
+        slot = self.slot(key)
+        self.slotKeys[slot] = None
+        self.slotValues[slot] = None
+        self.count -= 1
+
+    def __contains__(self, key):
+        return self.slotKeys[self.slot(key)] == key
+
+    def __len__(self):
+        return self.count
+
+policies = { 'lru' : LruCache, 'clock' : ClockCache, 'direct' : DirectCache }
+
+# Create cache for operation.  Capacity of None indicates unbounded cache
+def makeCache(name, capacity = None, policy = 'lru'):
+    if capacity is None:
+        return OperationCache(name)
+    if policy not in policies:
+        raise CacheException("Unknown replacement policy '%s'" % policy)
+    if capacity <= 0:
+        raise CacheException("Invalid cache capacity %d" % capacity)
+    return policies[policy](name, capacity)
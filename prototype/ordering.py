@@ -0,0 +1,337 @@
+#!/usr/local/bin/python3
+# Generate variable orderings from the structure of a CNF formula
+# For BDD variable orderings, variables that occur in the same clauses should be close together:
+#   cm:      Cuthill-McKee breadth-first numbering of the primal graph,
+#            in which variables are adjacent when they occur in a common clause
+#   force:   FORCE hypergraph placement.  Starting from the Cuthill-McKee ordering,
+#            repeatedly move each variable to the average center of the clauses containing it
+# For bucket elimination, the buckets should be ordered to keep the intermediate terms small:
+#   minfill: Greedy elimination ordering of the primal graph, choosing the variable
+#            whose elimination adds the fewest edges between its neighbors
+# Orderings are lists of variables, first to last.  They can be used as BDD variable
+# orderings (-p) or bucket orderings (-B) by the solver, and can be written as files in the same format.
+
+#####################################################################################
+# Copyright (c) 2021 Marijn Heule, Randal E. Bryant, Carnegie Mellon University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or
+# substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT
+# NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT
+# OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+########################################################################################
+
+import sys
+import getopt
+import heapq
+import time
+
+# NumPy is optional.  With it, FORCE iterations are performed as array operations
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def usage(name):
+    sys.stderr.write("Usage: %s [-h] [-b] -m METHOD -i CNF [-o ORDER]\n" % name)
+    sys.stderr.write("  -h          Print this message\n")
+    sys.stderr.write("  -b          Ordering is for bucket elimination (affects choice of method auto)\n")
+    sys.stderr.write("  -m METHOD   Ordering method:\n")
+    for mname in methodNames:
+        sys.stderr.write("                %-8s %s\n" % (mname, methods[mname]))
+    sys.stderr.write("  -i CNF      Name of CNF input file\n")
+    sys.stderr.write("  -o ORDER    Name of file for ordering (default is standard output)\n")
+
+methodNames = ['cm', 'force', 'minfill', 'auto']
+methods = {
+    'cm' : "Cuthill-McKee ordering of primal graph",
+    'force' : "FORCE hypergraph placement, starting from Cuthill-McKee ordering",
+    'minfill' : "Min-fill elimination ordering (for bucket elimination)",
+    'auto' : "minfill for bucket elimination, and force otherwise",
+}
+
+class OrderingException(Exception):
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return "Ordering Exception: " + str(self.value)
+
+# Resolve method auto according to whether ordering is for bucket elimination
+def chooseMethod(method, bucket):
+    if method not in methods:
+        raise OrderingException("Unknown ordering method '%s'" % method)
+    if method == 'auto':
+        return 'minfill' if bucket else 'force'
+    return method
+
+# Adjacency sets of primal graph, indexed by variable
+def primalGraph(nvar, clauses):
+    adj = [set([]) for v in range(nvar+1)]
+    for clause in clauses:
+        vars = [abs(lit) for lit in clause]
+        for v in vars:
+            adj[v].update(vars)
+    for v in range(1, nvar+1):
+        adj[v].discard(v)
+    return adj
+
+# Sum over clauses of distance between first and last variable in ordering
+def clauseSpan(order, clauses):
+    position = {}
+    for i in range(len(order)):
+        position[order[i]] = i
+    span = 0
+    for clause in clauses:
+        plist = [position[abs(lit)] for lit in clause]
+        span += max(plist) - min(plist)
+    return span
+
+# Breadth-first search from start, visiting neighbors in order of increasing degree.
+# Visited variables are added to set visited.  Return list of levels, each a list of variables
+def bfsLevels(adj, start, visited):
+    levels = [[start]]
+    visited.add(start)
+    while True:
+        nextLevel = []
+        for v in levels[-1]:
+            for u in sorted([u for u in adj[v] if u not in visited], key = lambda u: (len(adj[u]), u)):
+                visited.add(u)
+                nextLevel.append(u)
+        if len(nextLevel) == 0:
+            return levels
+        levels.append(nextLevel)
+
+# Cuthill-McKee ordering.  Each connected component is numbered breadth first,
+# starting from a pseudo-peripheral variable found by repeated searches from variables of minimum degree
+def cuthillMcKee(nvar, clauses):
+    adj = primalGraph(nvar, clauses)
+    numbered = set([])
+    order = []
+    for v in sorted(range(1, nvar+1), key = lambda v: (len(adj[v]), v)):
+        if v in numbered:
+            continue
+        start = v
+        depth = 0
+        while True:
+            # Search stays within component, which has no numbered variables
+            levels = bfsLevels(adj, start, set([]))
+            if len(levels) <= depth:
+                break
+            depth = len(levels)
+            candidate = min(levels[-1], key = lambda u: (len(adj[u]), u))
+            if candidate == start:
+                break
+            start = candidate
+        for level in bfsLevels(adj, start, numbered):
+            order += level
+    return order
+
+# FORCE placement.  Each iteration computes the center of gravity of each clause,
+# places each variable at the average center of the clauses containing it, and sorts.
+# Stops when the clause span no longer decreases.  Return (ordering, span)
+def force(nvar, clauses, order, maxIterations = 50):
+    if numpy is not None and len(clauses) > 0 and min([len(clause) for clause in clauses]) > 0:
+        return forceArrays(nvar, clauses, order, maxIterations)
+    occurrences = [[] for v in range(nvar+1)]
+    for cid in range(len(clauses)):
+        for lit in clauses[cid]:
+            occurrences[abs(lit)].append(cid)
+    bestOrder = order
+    bestSpan = clauseSpan(order, clauses)
+    for iteration in range(maxIterations):
+        position = [0] * (nvar+1)
+        for i in range(len(order)):
+            position[order[i]] = i
+        centers = [float(sum([position[abs(lit)] for lit in clause])) / len(clause) for clause in clauses]
+        target = {}
+        for v in order:
+            cids = occurrences[v]
+            target[v] = sum([centers[cid] for cid in cids]) / len(cids) if len(cids) > 0 else position[v]
+        order = sorted(order, key = lambda v: (target[v], position[v]))
+        span = clauseSpan(order, clauses)
+        if span >= bestSpan:
+            break
+        bestOrder = order
+        bestSpan = span
+    return (bestOrder, bestSpan)
+
+# FORCE placement, using NumPy
+def forceArrays(nvar, clauses, order, maxIterations):
+    lengths = numpy.array([len(clause) for clause in clauses], dtype = numpy.int64)
+    starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1]))
+    vars = numpy.abs(numpy.array([lit for clause in clauses for lit in clause], dtype = numpy.int64))
+    counts = numpy.bincount(vars, minlength = nvar+1)
+    occurring = counts > 0
+    order = numpy.array(order, dtype = numpy.int64)
+    def positions(order):
+        position = numpy.zeros(nvar+1, dtype = numpy.int64)
+        position[order] = numpy.arange(len(order))
+        return position
+    def span(position):
+        p = position[vars]
+        return int((numpy.maximum.reduceat(p, starts) - numpy.minimum.reduceat(p, starts)).sum())
+    position = positions(order)
+    bestOrder = order
+    bestSpan = span(position)
+    for iteration in range(maxIterations):
+        centers = numpy.add.reduceat(position[vars], starts) / lengths
+        target = position.astype(numpy.float64)
+        sums = numpy.bincount(vars, weights = numpy.repeat(centers, lengths), minlength = nvar+1)
+        target[occurring] = sums[occurring] / counts[occurring]
+        # Sort by target, breaking ties by current position
+        order = order[numpy.lexsort((position[order], target[order]))]
+        position = positions(order)
+        newSpan = span(position)
+        if newSpan >= bestSpan:
+            break
+        bestOrder = order
+        bestSpan = newSpan
+    return (bestOrder.tolist(), bestSpan)
+
+# Number of edges that must be added to make neighbors of v a clique
+def fillCount(adj, v):
+    nbrs = adj[v]
+    d = len(nbrs)
+    present = sum([len(adj[u] & nbrs) for u in nbrs]) // 2
+    return d * (d-1) // 2 - present
+
+# Min-fill elimination ordering, with ties broken by degree and then by variable.
+# Return (ordering, induced width)
+def minFill(nvar, clauses):
+    adj = primalGraph(nvar, clauses)
+    fill = [0] * (nvar+1)
+    heap = []
+    for v in range(1, nvar+1):
+        fill[v] = fillCount(adj, v)
+        heap.append((fill[v], len(adj[v]), v))
+    heapq.heapify(heap)
+    eliminated = [False] * (nvar+1)
+    order = []
+    width = 0
+    while len(heap) > 0:
+        (f, d, v) = heapq.heappop(heap)
+        # Skip entries that are out of date
+        if eliminated[v] or f != fill[v] or d != len(adj[v]):
+            continue
+        eliminated[v] = True
+        order.append(v)
+        nbrs = adj[v]
+        width = max(width, len(nbrs))
+        # Fill counts change for neighbors of v,
+        # and for variables adjacent to both ends of an added edge
+        affected = set(nbrs)
+        for u in nbrs:
+            adj[u].discard(v)
+            added = nbrs - adj[u]
+            added.discard(u)
+            if len(added) > 0:
+                adj[u] |= added
+                affected |= adj[u]
+        adj[v] = set([])
+        for u in affected:
+            if not eliminated[u]:
+                fill[u] = fillCount(adj, u)
+                heapq.heappush(heap, (fill[u], len(adj[u]), u))
+    return (order, width)
+
+# Ordering generated by some method, with measures of its quality
+class Ordering:
+    method = None
+    order = []
+    seconds = 0.0
+    # Clause span of ordering and of identity ordering
+    span = 0
+    identitySpan = 0
+    # Induced width of elimination ordering (minfill only)
+    width = None
+
+    def __init__(self, method, nvar, clauses):
+        self.method = method
+        start = time.perf_counter()
+        self.width = None
+        if method == 'cm':
+            self.order = cuthillMcKee(nvar, clauses)
+            self.span = clauseSpan(self.order, clauses)
+        elif method == 'force':
+            (self.order, self.span) = force(nvar, clauses, cuthillMcKee(nvar, clauses))
+        elif method == 'minfill':
+            (self.order, self.width) = minFill(nvar, clauses)
+            self.span = clauseSpan(self.order, clauses)
+        else:
+            raise OrderingException("Unknown ordering method '%s'" % method)
+        self.seconds = time.perf_counter() - start
+        self.identitySpan = clauseSpan(list(range(1, nvar+1)), clauses)
+
+    def describe(self):
+        s = "Variable ordering %s: clause span %d (identity %d)" % (self.method, self.span, self.identitySpan)
+        if self.width is not None:
+            s += ", induced width %d" % self.width
+        return s + ".  %.2f seconds" % self.seconds
+
+    def record(self):
+        result = { 'method' : self.method, 'seconds' : self.seconds, 'span' : self.span, 'identitySpan' : self.identitySpan }
+        if self.width is not None:
+            result['width'] = self.width
+        return result
+
+    # Write in format of permutation files, 20 variables per line
+    def write(self, outfile):
+        outfile.write("# %s\n" % self.describe())
+        for i in range(0, len(self.order), 20):
+            outfile.write(" ".join([str(v) for v in self.order[i:i+20]]) + "\n")
+
+def run(name, args):
+    # Imported here, since solver imports this module
+    import solver
+    method = None
+    cnfName = None
+    orderName = None
+    bucket = False
+    optlist, args = getopt.getopt(args, "hbm:i:o:")
+    for (opt, val) in optlist:
+        if opt == '-h':
+            usage(name)
+            return
+        elif opt == '-b':
+            bucket = True
+        elif opt == '-m':
+            method = val
+        elif opt == '-i':
+            cnfName = val
+        elif opt == '-o':
+            orderName = val
+    if method is None or cnfName is None:
+        usage(name)
+        return
+    try:
+        method = chooseMethod(method, bucket)
+        reader = solver.CnfReader(cnfName, verbLevel = 0)
+    except Exception as ex:
+        sys.stderr.write("Aborted: %s\n" % str(ex))
+        return
+    ordering = Ordering(method, reader.nvar, reader.clauses)
+    sys.stderr.write(ordering.describe() + "\n")
+    if orderName is None:
+        ordering.write(sys.stdout)
+    else:
+        try:
+            outfile = open(orderName, 'w')
+        except Exception:
+            sys.stderr.write("Couldn't open order file '%s'\n" % orderName)
+            return
+        ordering.write(outfile)
+        outfile.close()
+
+if __name__ == "__main__":
+    run(sys.argv[0], sys.argv[1:])
@@ -0,0 +1,340 @@
+# Parallel bucket elimination
+# Terms in different subtrees of the bucket elimination tree have disjoint support
+# until their results reach a common ancestor.  Such subtrees are processed
+# by worker processes, forked once the input terms have been constructed.
+# Each worker writes its proof steps to a separate segment file.
+# The parent then merges the segments into its own proof, renumbering clause ids
+# and extension variables so that the ranges used by the workers don't overlap,
+# imports the BDDs of the workers' results, and processes the remaining buckets.
+
+#####################################################################################
+# Copyright (c) 2021 Marijn Heule, Randal E. Bryant, Carnegie Mellon University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or
+# substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT
+# NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT
+# OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+########################################################################################
+
+import os
+import shutil
+import tempfile
+import multiprocessing
+
+import resolver
+
+class ParallelException(Exception):
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return "Parallel Exception: " + str(self.value)
+
+# Compute elimination tree of buckets 1..maxBid.
+# supports maps each bucket to the set of buckets of the variables in the supports of its terms.
+# The result for a bucket goes to the first of these buckets following it.
+# Return mapping from bucket to parent bucket, or to None for the root of a tree
+def eliminationTree(supports, maxBid):
+    parents = {}
+    for bid in range(1, maxBid + 1):
+        support = supports[bid]
+        support.discard(bid)
+        if len(support) == 0:
+            parents[bid] = None
+        else:
+            parent = min(support)
+            parents[bid] = parent
+            supports[parent] |= support
+    return parents
+
+# Divide buckets among workers.
+# Repeatedly split the heaviest subtree into those of its children,
+# until no subtree is more than a 1/workerCount share of the total weight.
+# Subtrees are then assigned to workers, heaviest first, to balance weight.
+# Return list of bucket lists, one per worker
+def chooseSubtrees(parents, weights, workerCount):
+    children = { bid : [] for bid in parents.keys() }
+    for bid in parents.keys():
+        if parents[bid] is not None:
+            children[parents[bid]].append(bid)
+    # Total weight of subtree.  Children have lower bucket numbers than their parents
+    treeWeights = {}
+    for bid in sorted(parents.keys()):
+        treeWeights[bid] = weights[bid] + sum([treeWeights[c] for c in children[bid]])
+    candidates = [bid for bid in parents.keys() if parents[bid] is None]
+    total = sum([treeWeights[bid] for bid in candidates])
+    while len(candidates) > 0:
+        heaviest = max(candidates, key = lambda bid: treeWeights[bid])
+        if treeWeights[heaviest] * workerCount <= total:
+            break
+        # Splitting a chain of single-child buckets gains no parallelism.
+        # Splice through it to the first bucket with multiple children
+        split = heaviest
+        while len(children[split]) == 1:
+            split = children[split][0]
+        if len(children[split]) == 0:
+            break
+        candidates.remove(heaviest)
+        candidates += children[split]
+    candidates = sorted([bid for bid in candidates if treeWeights[bid] > 0], key = lambda bid: -treeWeights[bid])
+    loads = [0] * workerCount
+    assignments = [[] for w in range(workerCount)]
+    for root in candidates:
+        w = loads.index(min(loads))
+        loads[w] += treeWeights[root]
+        stack = [root]
+        while len(stack) > 0:
+            bid = stack.pop()
+            assignments[w].append(bid)
+            stack += children[bid]
+    return [sorted(bids) for bids in assignments if len(bids) > 0]
+
+# Run in worker process.  Process buckets, with proof going to segment file.
+# Report results, consisting of status, the terms destined for other buckets,
+# the nodes of these terms, and the ranges of clause ids and node ids used
+def runWorker(solver, buckets, bidList, bperm, segmentName, index, results):
+    try:
+        firstNodeId = solver.manager.nextNodeId
+        firstTermId = solver.termCount + 1
+        solver.becomeWorker(segmentName)
+        status = solver.processBucketsPerm(buckets, bidList, bperm)
+        bidSet = set(bidList)
+        terms = []
+        for bid in buckets.keys():
+            if bid not in bidSet:
+                for id in buckets[bid]:
+                    if id >= firstTermId:
+                        term = solver.activeIds[id]
+                        terms.append((term.root.id, term.validation))
+        nodes = solver.manager.exportNodes([solver.activeIds[id].root for id in solver.activeIds.keys() if id >= firstTermId], firstNodeId)
+        solver.prover.close()
+        results.put((index, status, terms, nodes, solver.prover.lastClauseId, solver.prover.clauseCount, solver.manager.nextNodeId))
+    except BaseException as ex:
+        results.put((index, "failed (%s)" % str(ex), [], [], 0, 0, 0))
+
+# Proof segment written by worker, with information required to merge it into parent proof
+class Segment:
+    index = 0
+    fname = None
+    status = None
+    # Pairs (root id, validation clause id) for terms produced by worker
+    terms = []
+    # Nodes of these terms, as exported by manager
+    nodes = []
+    # Ranges of ids used by worker
+    lastClauseId = 0
+    clauseCount = 0
+    nextNodeId = 0
+    # Amounts to add to clause ids and node ids created by worker
+    clauseShift = 0
+    nodeShift = 0
+
+    def __init__(self, index, fname, status, terms, nodes, lastClauseId, clauseCount, nextNodeId):
+        self.index = index
+        self.fname = fname
+        self.status = status
+        self.terms = terms
+        self.nodes = nodes
+        self.lastClauseId = lastClauseId
+        self.clauseCount = clauseCount
+        self.nextNodeId = nextNodeId
+        self.clauseShift = 0
+        self.nodeShift = 0
+
+class ParallelBuckets:
+    solver = None
+    bperm = None
+    workerCount = 1
+    verbLevel = 1
+    writer = None
+    tempDir = None
+    # Ids following those used by parent when workers were forked
+    firstClauseId = 0
+    firstNodeId = 0
+
+    def __init__(self, solver, bperm, workerCount):
+        self.solver = solver
+        self.bperm = bperm
+        self.workerCount = workerCount
+        self.verbLevel = solver.verbLevel
+        self.writer = solver.writer
+        self.tempDir = None
+
+    # Assign buckets to workers.  Return list of bucket lists, one per worker
+    def partition(self, buckets, maxBid):
+        supports = { bid : set([]) for bid in range(0, maxBid + 1) }
+        weights = { bid : len(buckets[bid]) for bid in range(1, maxBid + 1) }
+        for bid in range(1, maxBid + 1):
+            for id in buckets[bid]:
+                root = self.solver.activeIds[id].root
+                for vid in self.solver.manager.getSupportIds(root):
+                    supports[bid].add(self.bperm.reverse(vid))
+        parents = eliminationTree(supports, maxBid)
+        return chooseSubtrees(parents, weights, self.workerCount)
+
+    # Run bucket elimination.  Return "unsatisfiable" if hit unsat case and None otherwise
+    def run(self, buckets):
+        solver = self.solver
+        maxBid = len(solver.manager.variables)
+        assignments = self.partition(buckets, maxBid)
+        if len(assignments) < 2:
+            if self.verbLevel >= 1:
+                self.writer.write("Parallel buckets: fewer than 2 subtrees available.  Running sequentially\n")
+            return solver.processBucketsPerm(buckets, range(0, maxBid + 1), self.bperm)
+        if self.verbLevel >= 1:
+            inputCount = sum([len(buckets[bid]) for bid in range(1, maxBid + 1)])
+            workerCount = sum([len(buckets[bid]) for bids in assignments for bid in bids])
+            self.writer.write("Parallel buckets: %d workers handling %d of %d buckets, containing %d of %d input terms\n" %
+                              (len(assignments), sum([len(bids) for bids in assignments]), maxBid, workerCount, inputCount))
+        try:
+            self.tempDir = tempfile.mkdtemp(prefix = "buckets-")
+        except OSError as ex:
+            raise ParallelException("Couldn't create directory for proof segments (%s)" % str(ex))
+        try:
+            segments = self.runWorkers(buckets, assignments)
+            unsatSegments = [seg for seg in segments if seg.status == "unsatisfiable"]
+            if len(unsatSegments) > 0:
+                # Proof of first refutation is sufficient
+                self.merge(unsatSegments[:1])
+                return "unsatisfiable"
+            self.merge(segments)
+        finally:
+            shutil.rmtree(self.tempDir, ignore_errors = True)
+        self.importResults(segments, buckets, assignments)
+        assigned = set([bid for bids in assignments for bid in bids])
+        remaining = [bid for bid in range(0, maxBid + 1) if bid not in assigned]
+        return solver.processBucketsPerm(buckets, remaining, self.bperm)
+
+    # Fork workers and gather their results.
+    # Stop once any worker finds the formula unsatisfiable.
+    # Return list of segments, ordered by worker index
+    def runWorkers(self, buckets, assignments):
+        self.firstClauseId = self.solver.prover.lastClauseId + 1
+        self.firstNodeId = self.solver.manager.nextNodeId
+        # Workers must start with the state of the solver, and so they are forked
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = []
+        for index in range(len(assignments)):
+            fname = os.path.join(self.tempDir, "segment%d.lrat" % index)
+            p = context.Process(target = runWorker, daemon = True,
+                                args = (self.solver, buckets, assignments[index], self.bperm, fname, index, results))
+            p.start()
+            processes.append(p)
+        segments = [None] * len(processes)
+        try:
+            for count in range(len(processes)):
+                (index, status, terms, nodes, lastClauseId, clauseCount, nextNodeId) = results.get()
+                if status is not None and status != "unsatisfiable":
+                    raise ParallelException("Worker %d %s" % (index, status))
+                fname = os.path.join(self.tempDir, "segment%d.lrat" % index)
+                segments[index] = Segment(index, fname, status, terms, nodes, lastClauseId, clauseCount, nextNodeId)
+                if self.verbLevel >= 2:
+                    self.writer.write("Parallel buckets: worker %d finished.  %d clauses, %d nodes, %d terms produced\n" %
+                                      (index, lastClauseId - self.firstClauseId + 1, nextNodeId - self.firstNodeId, len(terms)))
+                if status == "unsatisfiable":
+                    break
+        finally:
+            for p in processes:
+                if p.is_alive():
+                    p.terminate()
+            for p in processes:
+                p.join()
+        return [seg for seg in segments if seg is not None]
+
+    # Append proof segments, giving each its own range of clause ids and extension variables
+    def merge(self, segments):
+        prover = self.solver.prover
+        manager = self.solver.manager
+        clauseShift = 0
+        nodeShift = 0
+        baseCount = prover.clauseCount
+        for seg in segments:
+            seg.clauseShift = clauseShift
+            seg.nodeShift = nodeShift
+            self.mergeSegment(seg)
+            clauseShift += seg.lastClauseId - self.firstClauseId + 1
+            nodeShift += seg.nextNodeId - self.firstNodeId
+            prover.clauseCount += seg.clauseCount - baseCount
+        prover.lastClauseId = self.firstClauseId - 1 + clauseShift
+        manager.nextNodeId = self.firstNodeId + nodeShift
+
+    def shiftClause(self, seg, cid):
+        if abs(cid) < self.firstClauseId or abs(cid) >= resolver.tautologyId:
+            return cid
+        return cid + seg.clauseShift if cid > 0 else cid - seg.clauseShift
+
+    def shiftNode(self, seg, id):
+        if abs(id) < self.firstNodeId or abs(id) >= resolver.tautologyId:
+            return id
+        return id + seg.nodeShift if id > 0 else id - seg.nodeShift
+
+    # Copy steps from segment into proof.
+    # Deletions of clauses created before the workers were forked are dropped,
+    # since other workers may still use those clauses
+    def mergeSegment(self, seg):
+        prover = self.solver.prover
+        try:
+            infile = open(seg.fname, 'r')
+        except Exception:
+            raise ParallelException("Couldn't open proof segment '%s'" % seg.fname)
+        for line in infile:
+            fields = line.split()
+            if len(fields) == 0 or fields[0] == 'c':
+                continue
+            cid = self.shiftClause(seg, int(fields[0]))
+            if fields[1] == 'd':
+                ids = [self.shiftClause(seg, int(f)) for f in fields[2:-1] if int(f) >= self.firstClauseId]
+                if len(ids) > 0:
+                    prover.writeDeletion(cid, ids)
+            else:
+                values = [int(f) for f in fields[1:]]
+                split = values.index(0)
+                result = [self.shiftNode(seg, lit) for lit in values[:split]]
+                hints = [self.shiftClause(seg, h) for h in values[split+1:-1]]
+                prover.writeStep(cid, result, hints)
+        infile.close()
+
+    # Create nodes and terms for results of workers and place them in buckets.
+    # Remove the terms that the workers consumed
+    def importResults(self, segments, buckets, assignments):
+        solver = self.solver
+        nodeMap = solver.manager.nodeMap()
+        newIds = []
+        for seg in segments:
+            exported = [(self.shiftNode(seg, id), level, self.shiftNode(seg, hid), self.shiftNode(seg, lid), base + seg.clauseShift)
+                        for (id, level, hid, lid, base) in seg.nodes]
+            (implications, clauseList) = solver.manager.importNodes(exported, nodeMap)
+            for (rootId, validation) in seg.terms:
+                rootId = self.shiftNode(seg, rootId)
+                root = nodeMap[rootId]
+                validation = self.shiftClause(seg, validation)
+                if rootId in implications:
+                    # Root was mapped onto equivalent node
+                    comment = "Validation of %s" % root.label()
+                    newValidation = solver.prover.createClause([root.id], [validation, implications[rootId]], comment)
+                    clauseList.append(validation)
+                    validation = newValidation
+                newIds.append(solver.addTerm(root, validation))
+            solver.prover.deleteClauses(clauseList + list(implications.values()))
+        if self.verbLevel >= 1 and solver.manager.nodesMapped > 0:
+            self.writer.write("Parallel buckets: %d imported nodes mapped onto equivalent nodes\n" % solver.manager.nodesMapped)
+        for bids in assignments:
+            for bid in bids:
+                ids = buckets[bid]
+                buckets[bid] = []
+                for id in ids:
+                    solver.removeTerm(id)
+        for id in newIds:
+            solver.placeInBucketPerm(buckets, id, self.bperm)
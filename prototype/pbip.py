@@ -188,11 +188,23 @@ class Pbip:
     litMap = {}
     varMap = {}
     levelMap = {}
+    # Combine final conjunction in each bucket with quantification
+    andExists = False
+    # Policy for choosing terms to conjoin within bucket
+    pairing = 'fifo'
+    # Size and support of bucket entries, indexed by root node Id.
+    # Reset for each bucket reduction
+    entrySizes = {}
+    entrySupports = {}
     
-    def __init__(self, cnfName, pbipName, lratName, verbLevel):
+    def __init__(self, cnfName, pbipName, lratName, verbLevel, andExists = False, pairing = 'fifo', cache = False):
         self.verbLevel = verbLevel
+        self.andExists = andExists
+        self.pairing = pairing
+        self.entrySizes = {}
+        self.entrySupports = {}
         self.valid = True
-        self.creader = solver.CnfReader(cnfName, verbLevel)
+        self.creader = solver.CnfReader(cnfName, verbLevel, cache = cache)
         self.preader = PbipReader(pbipName, verbLevel)
         self.cset = pseudoboolean.ConstraintSet()
         self.constraintList = []
@@ -265,6 +277,16 @@ class Pbip:
             validation = self.manager.prover.createClause([nroot.id], antecedents, comment)
         return nroot, validation
 
+    def conjunctQuantifyTerms(self, r1, v1, r2, v2, id):
+        vfun = self.litMap[id]
+        nroot, implication = self.manager.applyAndExistsJustify(r1, r2, vfun)
+        antecedents = [v1, v2]
+        if implication != resolver.tautologyId:
+            antecedents += [implication]
+        comment = "Validation of Exists %s (%s & %s) --> %s" % (str(vfun.variable), r1.label(), r2.label(), nroot.label())
+        validation = self.manager.prover.createClause([nroot.id], antecedents, comment)
+        return nroot, validation
+
     def quantifyRoot(self, root, validation, id):
         antecedents = [validation]
         vfun = self.litMap[id]
@@ -278,8 +300,23 @@ class Pbip:
         validation = self.manager.prover.createClause([nroot.id], antecedents, comment)
         return nroot, validation
 
+    # Size and support of bucket entry (root, validation)
+    def entrySize(self, entry):
+        root = entry[0]
+        if root.id not in self.entrySizes:
+            self.entrySizes[root.id] = self.manager.getSize(root)
+        return self.entrySizes[root.id]
+
+    def entrySupport(self, entry):
+        root = entry[0]
+        if root.id not in self.entrySupports:
+            self.entrySupports[root.id] = set(self.manager.getSupportIds(root))
+        return self.entrySupports[root.id]
+
     # Bucket reduction assumes all external variables come first in variable ordering
     def bucketReduce(self, buckets):
+        self.entrySizes = {}
+        self.entrySupports = {}
         ids = sorted(list(buckets.keys()))
         if ids[0] == 0:
             ids = ids[1:] + [0]
@@ -287,10 +324,13 @@ class Pbip:
             if self.verbLevel >= 4:
                 print("PBIP: Processing bucket #%d.  Size = %d" % (id, len(buckets[id])))
             while len(buckets[id]) > 1:
-                (r1,v1) = buckets[id][0]
-                (r2,v2) = buckets[id][1]
-                buckets[id] = buckets[id][2:]
-                nroot,validation = self.conjunctTerms(r1, v1, r2, v2)
+                (chosen, buckets[id]) = solver.choosePairing(buckets[id], 2, self.pairing, self.entrySize, self.entrySupport)
+                ((r1,v1), (r2,v2)) = chosen
+                if self.andExists and id != 0 and len(buckets[id]) == 0:
+                    # Final conjunction in bucket.  Quantify variable at same time
+                    nroot,validation = self.conjunctQuantifyTerms(r1, v1, r2, v2, id)
+                else:
+                    nroot,validation = self.conjunctTerms(r1, v1, r2, v2)
                 self.placeInBucket(buckets, nroot, validation)
             if len(buckets[id]) == 1:
                 root, validation = buckets[id][0]
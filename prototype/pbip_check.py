@@ -5,10 +5,14 @@ import datetime
 import getopt
 
 import pbip
+import solver
 
 def usage(name):
-    print("Usage %s: [-h] [-v VERB] -i FILE.cnf -p FILE.pbip [-o FILE.lrat]")
+    print("Usage %s: [-h] [-Q] [-P PAIRING] [-K] [-v VERB] -i FILE.cnf -p FILE.pbip [-o FILE.lrat]")
     print("  -h           Print this message")
+    print("  -Q           Combine final conjunction in each bucket with quantification (and-exists)")
+    print("  -P PAIRING   Choice of terms to conjoin in each bucket: fifo (default), size, support")
+    print("  -K           Load clauses from binary cache FILE.cnf.cache, creating or updating it when missing or out of date")
     print("  -v VERB      Set verbosity level")
     print("  -i FILE.cnf  Input CNF file")
     print("  -p FILE.pbip Input proof file")
@@ -20,12 +24,24 @@ def run(name, argList):
     cnfName = ""
     pbipName = ""
     lratName = ""
+    andExists = False
+    pairing = 'fifo'
+    cache = False
 
-    optlist, args = getopt.getopt(argList, "hv:i:p:o:")
+    optlist, args = getopt.getopt(argList, "hQP:Kv:i:p:o:")
     for (opt, val) in optlist:
         if opt == '-h':
             usage(name)
             return
+        elif opt == '-Q':
+            andExists = True
+        elif opt == '-P':
+            pairing = val
+            if pairing not in solver.pairingPolicies:
+                print("Unknown pairing policy '%s'" % pairing)
+                return
+        elif opt == '-K':
+            cache = True
         elif opt == '-v':
             verbLevel = int(val)
         elif opt == '-i':
@@ -47,7 +63,7 @@ def run(name, argList):
         usage(name)
         return
     start = datetime.datetime.now()
-    pb = pbip.Pbip(cnfName, pbipName, lratName, verbLevel)
+    pb = pbip.Pbip(cnfName, pbipName, lratName, verbLevel, andExists, pairing, cache)
     pb.run()
     delta = datetime.datetime.now() - start
     seconds = delta.seconds + 1e-6 * delta.microseconds
@@ -0,0 +1,212 @@
+# Portfolio of solver runs using different variable orderings
+# Each configuration runs in its own worker process, with its own proof and log files
+# in a temporary directory.  The first worker to finish with a definite result wins.
+# The others are terminated, and only the proof of the winner is kept.
+
+#####################################################################################
+# Copyright (c) 2021 Marijn Heule, Randal E. Bryant, Carnegie Mellon University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or
+# substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT
+# NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT
+# OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+########################################################################################
+
+import sys
+import os
+import random
+import shutil
+import tempfile
+import datetime
+import queue
+import multiprocessing
+
+class PortfolioException(Exception):
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return "Portfolio Exception: " + str(self.value)
+
+# Results that end the portfolio
+definiteResults = ['unsatisfiable', 'unsolvable', 'satisfiable']
+
+# Configuration to be run by one worker
+class Configuration:
+    label = ""
+    # Name of permutation file, or None for identity ordering
+    permName = None
+    # Method for generating ordering from CNF, used when there is no permutation file
+    orderMethod = None
+
+    def __init__(self, label, permName, orderMethod = None):
+        self.label = label
+        self.permName = permName
+        self.orderMethod = orderMethod
+
+    def args(self):
+        if self.permName is not None:
+            return ['-p', self.permName]
+        if self.orderMethod is not None:
+            return ['-O', self.orderMethod]
+        return []
+
+# Write random ordering of variables, in format of benchmarks/randomizer.py
+def writeShuffle(fname, nvar):
+    perm = list(range(1, nvar+1))
+    random.shuffle(perm)
+    outfile = open(fname, 'w')
+    outfile.write(" ".join([str(p) for p in perm]))
+    outfile.write("\n")
+    outfile.close()
+
+# Generate count configurations: the given ordering, then supplied orderings,
+# then the generated ordering, then the identity ordering, and then random shuffles
+def configurations(count, permName, orderNames, nvar, tempDir, orderMethod = None):
+    clist = []
+    if permName is not None:
+        clist.append(Configuration("given order", permName))
+    elif orderMethod is not None:
+        clist.append(Configuration("%s order" % orderMethod, None, orderMethod))
+    else:
+        clist.append(Configuration("identity order", None))
+    for oname in orderNames:
+        clist.append(Configuration("order %s" % oname, oname))
+    if permName is not None and orderMethod is not None:
+        clist.append(Configuration("%s order" % orderMethod, None, orderMethod))
+    if permName is not None or orderMethod is not None:
+        clist.append(Configuration("identity order", None))
+    shuffleCount = 0
+    while len(clist) < count:
+        shuffleCount += 1
+        sname = os.path.join(tempDir, "shuffle%d.order" % shuffleCount)
+        writeShuffle(sname, nvar)
+        clist.append(Configuration("random order #%d" % shuffleCount, sname))
+    return clist[:count]
+
+# Run solver in worker process, with output directed to log file.
+# Report status back to parent, including when the run fails
+def runWorker(runFunction, name, args, index, logName, results):
+    status = None
+    try:
+        log = open(logName, 'w')
+        sys.stdout = log
+        sys.stderr = log
+        status = runFunction(name, args)
+    except BaseException as ex:
+        status = "failed (%s)" % str(ex)
+    finally:
+        sys.stdout.flush()
+        results.put((index, status))
+
+class Portfolio:
+    configurations = []
+    # Solver run function and arguments common to all workers
+    runFunction = None
+    name = ""
+    args = []
+    proofName = None
+    writer = None
+    verbLevel = 1
+    tempDir = None
+
+    def __init__(self, runFunction, name, args, proofName, writer, verbLevel = 1):
+        self.runFunction = runFunction
+        self.name = name
+        self.args = args
+        self.proofName = proofName
+        self.writer = writer
+        self.verbLevel = verbLevel
+        self.configurations = []
+        # Place temporary files alongside proof, so that winning proof can be renamed
+        try:
+            self.tempDir = tempfile.mkdtemp(prefix = "portfolio-", dir = os.path.dirname(os.path.abspath(proofName)))
+        except OSError as ex:
+            raise PortfolioException("Couldn't create directory for worker files (%s)" % str(ex))
+
+    def workerProof(self, index):
+        return os.path.join(self.tempDir, "worker%d-%s" % (index, os.path.basename(self.proofName)))
+
+    def workerLog(self, index):
+        return os.path.join(self.tempDir, "worker%d.log" % index)
+
+    # Launch workers and wait for first definite result.  Return status
+    def run(self, count, permName, orderNames, nvar, orderMethod = None):
+        start = datetime.datetime.now()
+        try:
+            self.configurations = configurations(count, permName, orderNames, nvar, self.tempDir, orderMethod)
+            results = multiprocessing.Queue()
+            processes = []
+            for index in range(len(self.configurations)):
+                config = self.configurations[index]
+                args = self.args + config.args() + ['-o', self.workerProof(index)]
+                if self.verbLevel >= 2:
+                    self.writer.write("Portfolio: worker %d runs %s\n" % (index, config.label))
+                p = multiprocessing.Process(target = runWorker, daemon = True,
+                                            args = (self.runFunction, self.name, args, index, self.workerLog(index), results))
+                p.start()
+                processes.append(p)
+            (winner, status) = self.waitForResult(processes, results)
+            for p in processes:
+                if p.is_alive():
+                    p.terminate()
+            for p in processes:
+                p.join()
+            delta = datetime.datetime.now() - start
+            seconds = delta.seconds + 1e-6 * delta.microseconds
+            if winner is None:
+                self.writer.write("Portfolio: no worker obtained a result after %.2f seconds\n" % seconds)
+                return status
+            # Show output of winning worker
+            logFile = open(self.workerLog(winner), 'r')
+            self.writer.write(logFile.read())
+            logFile.close()
+            os.replace(self.workerProof(winner), self.proofName)
+            if self.verbLevel >= 1:
+                self.writer.write("Portfolio: worker %d (%s) won with status %s after %.2f seconds\n" %
+                                  (winner, self.configurations[winner].label, status.upper(), seconds))
+            return status
+        finally:
+            shutil.rmtree(self.tempDir, ignore_errors = True)
+
+    # Wait for definite result from some worker, or for all to finish.
+    # Return (index of winner or None, status)
+    def waitForResult(self, processes, results):
+        finished = set([])
+        # Number of polls since worker exited without reporting
+        silentPolls = {}
+        status = None
+        while len(finished) < len(processes):
+            try:
+                (index, status) = results.get(timeout = 0.1)
+            except queue.Empty:
+                # Give up on workers that died without reporting status
+                for index in range(len(processes)):
+                    if index not in finished and processes[index].exitcode is not None:
+                        silentPolls[index] = silentPolls.get(index, 0) + 1
+                        if silentPolls[index] >= 10:
+                            finished.add(index)
+                            status = "failed (exit code %d)" % processes[index].exitcode
+                            self.reportFinish(index, status)
+                continue
+            finished.add(index)
+            self.reportFinish(index, status)
+            if status in definiteResults:
+                return (index, status)
+        return (None, status)
+
+    def reportFinish(self, index, status):
+        if self.verbLevel >= 2:
+            self.writer.write("Portfolio: worker %d (%s) finished with status %s\n" %
+                              (index, self.configurations[index].label, str(status)))
@@ -0,0 +1,224 @@
+# Variable reordering for BDD package
+# Finds improved variable ordering by sifting.
+# Sifting is performed on a shadow copy of the BDD, in which nodes
+# can be modified in place, since no proof is required.
+# The manager then rebuilds the actual BDD under the chosen ordering,
+# generating the proof steps relating old nodes to new ones.
+
+#####################################################################################
+# Copyright (c) 2021 Marijn Heule, Randal E. Bryant, Carnegie Mellon University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or
+# substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT
+# NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT
+# OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+########################################################################################
+
+# Shadow BDD.  Nodes are indices into parallel arrays.
+# Index 0 is leaf 0 and index 1 is leaf 1.
+# Levels are numbered from 1 to N, with the leaves at level N+1
+class Sifter:
+    # Variable at each level (entry 0 unused)
+    variables = []
+    leafLevel = 0
+    # Parallel arrays, indexed by node
+    levels = []
+    highs = []
+    lows = []
+    refs = []
+    # Unique table for each level.  Maps (high, low) to node
+    tables = []
+    # Indices of nodes that have been freed
+    freeList = []
+    size = 0
+    # Give up moving variable in one direction when size grows by this factor
+    maxGrowth = 1.2
+    # Statistics
+    swapCount = 0
+
+    # Build shadow of DAG rooted by nodes in root list.
+    # variables lists the manager variables in level order
+    def __init__(self, variables, roots, maxGrowth = 1.2):
+        self.variables = [None] + list(variables)
+        self.leafLevel = len(variables) + 1
+        self.levels = [self.leafLevel, self.leafLevel]
+        self.highs = [0, 1]
+        self.lows = [0, 1]
+        self.refs = [0, 0]
+        self.tables = [{} for level in range(self.leafLevel + 1)]
+        self.freeList = []
+        self.size = 0
+        self.maxGrowth = maxGrowth
+        self.swapCount = 0
+        # Mapping from node id to index
+        indexDict = {}
+        for root in roots:
+            self.addRef(self.importNode(root, indexDict))
+
+    # Import DAG, children first, using explicit stack
+    def importNode(self, root, indexDict):
+        stack = [root]
+        while len(stack) > 0:
+            node = stack[-1]
+            if node.isLeaf() or node.id in indexDict:
+                stack.pop()
+                continue
+            high = node.high
+            low = node.low
+            pending = [c for c in [high, low] if not c.isLeaf() and c.id not in indexDict]
+            if len(pending) > 0:
+                stack += pending
+                continue
+            stack.pop()
+            n = self.makeNode(node.variable.level, self.index(high, indexDict), self.index(low, indexDict))
+            # References will be added by parents
+            self.refs[n] -= 1
+            indexDict[node.id] = n
+        return self.index(root, indexDict)
+
+    def index(self, node, indexDict):
+        if node.isLeaf():
+            return node.value
+        return indexDict[node.id]
+
+    def addRef(self, n):
+        if n > 1:
+            self.refs[n] += 1
+
+    # Remove reference.  Nodes left unreferenced are freed, along with their unreferenced descendants
+    def deref(self, n):
+        stack = [n]
+        while len(stack) > 0:
+            n = stack.pop()
+            if n <= 1:
+                continue
+            self.refs[n] -= 1
+            if self.refs[n] == 0:
+                del self.tables[self.levels[n]][(self.highs[n], self.lows[n])]
+                stack.append(self.highs[n])
+                stack.append(self.lows[n])
+                self.freeList.append(n)
+                self.size -= 1
+
+    # Find or create node.  Returns node with its reference count incremented
+    def makeNode(self, level, high, low):
+        if high == low:
+            self.addRef(high)
+            return high
+        key = (high, low)
+        table = self.tables[level]
+        if key in table:
+            n = table[key]
+            self.refs[n] += 1
+            return n
+        if len(self.freeList) > 0:
+            n = self.freeList.pop()
+            self.levels[n] = level
+            self.highs[n] = high
+            self.lows[n] = low
+            self.refs[n] = 1
+        else:
+            n = len(self.levels)
+            self.levels.append(level)
+            self.highs.append(high)
+            self.lows.append(low)
+            self.refs.append(1)
+        self.addRef(high)
+        self.addRef(low)
+        table[key] = n
+        self.size += 1
+        return n
+
+    # Exchange variables at levels and level+1
+    def swap(self, level):
+        self.swapCount += 1
+        upper = self.tables[level]
+        lower = self.tables[level+1]
+        self.tables[level] = {}
+        self.tables[level+1] = {}
+        # Nodes for upper variable that don't depend on lower variable simply move down
+        dependent = []
+        for (key, n) in upper.items():
+            (high, low) = key
+            if self.levels[high] == level+1 or self.levels[low] == level+1:
+                dependent.append(n)
+            else:
+                self.levels[n] = level+1
+                self.tables[level+1][key] = n
+        # Nodes for lower variable move up
+        for (key, n) in lower.items():
+            self.levels[n] = level
+            self.tables[level][key] = n
+        # Rewrite remaining nodes in place, so that references to them remain valid
+        for n in dependent:
+            high = self.highs[n]
+            low = self.lows[n]
+            (high1, high0) = self.cofactors(high, level)
+            (low1, low0) = self.cofactors(low, level)
+            newHigh = self.makeNode(level+1, high1, low1)
+            newLow = self.makeNode(level+1, high0, low0)
+            self.highs[n] = newHigh
+            self.lows[n] = newLow
+            self.tables[level][(newHigh, newLow)] = n
+            self.deref(high)
+            self.deref(low)
+        self.variables[level], self.variables[level+1] = self.variables[level+1], self.variables[level]
+
+    # Cofactors of node with respect to variable that has just moved to level
+    def cofactors(self, n, level):
+        if self.levels[n] == level:
+            return (self.highs[n], self.lows[n])
+        return (n, n)
+
+    # Move variable from one level to another via adjacent swaps.  Return level having minimum size
+    def moveVariable(self, fromLevel, toLevel, bestSize, bestLevel, limit):
+        level = fromLevel
+        while level != toLevel:
+            if level < toLevel:
+                self.swap(level)
+                level += 1
+            else:
+                self.swap(level-1)
+                level -= 1
+            if self.size < bestSize:
+                bestSize = self.size
+                bestLevel = level
+            elif self.size > limit:
+                break
+        return (level, bestSize, bestLevel)
+
+    # Sift single variable to the position that minimizes the size
+    def siftVariable(self, var):
+        level = [i for i in range(1, self.leafLevel) if self.variables[i] is var][0]
+        bestSize = self.size
+        bestLevel = level
+        limit = self.maxGrowth * self.size
+        # Move toward nearer end first
+        if level - 1 < self.leafLevel - 1 - level:
+            ends = [1, self.leafLevel-1]
+        else:
+            ends = [self.leafLevel-1, 1]
+        for end in ends:
+            (level, bestSize, bestLevel) = self.moveVariable(level, end, bestSize, bestLevel, limit)
+        self.moveVariable(level, bestLevel, bestSize, bestLevel, self.size * self.leafLevel)
+
+    # Sift variables, starting with those having the most nodes.
+    # Return variables in new level order
+    def sift(self, maxVariables = None):
+        counts = [(-len(self.tables[level]), level) for level in range(1, self.leafLevel)]
+        vlist = [self.variables[level] for (count, level) in sorted(counts) if count < 0]
+        if maxVariables is not None:
+            vlist = vlist[:maxVariables]
+        for var in vlist:
+            self.siftVariable(var)
+        return self.variables[1:]
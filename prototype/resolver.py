@@ -30,9 +30,21 @@ tautologyId = 1000 * 1000 * 1000
 # Detect when tautology
 # Make sure that literal with highest-numbered variable stays at front
 # (by sorting in reverse order of literal number)
+# Clauses with up to three literals handled without sorting
 def cleanClause(literalList):
     if literalList == tautologyId:
         return literalList
+    n = len(literalList)
+    if n == 3:
+        return cleanTriple(literalList[0], literalList[1], literalList[2])
+    if n == 2:
+        return cleanPair(literalList[0], literalList[1])
+    if n == 1:
+        return cleanSingle(literalList[0])
+    return cleanClauseSorted(literalList)
+
+# General case
+def cleanClauseSorted(literalList):
     slist = sorted(literalList, key = lambda v: -abs(v))
     while len(slist) > 0:
         # Tautology and Null will be in front
@@ -55,6 +67,64 @@ def cleanClause(literalList):
             nlist.append(slist[i])
         return nlist
 
+def cleanSingle(a):
+    if a == tautologyId:
+        return tautologyId
+    if a == -tautologyId:
+        return []
+    return [a]
+
+# Sorting is stable, so literals with same variable keep their order
+def cleanPair(a, b):
+    aa = abs(a)
+    ab = abs(b)
+    if ab > aa:
+        a, b = b, a
+        aa, ab = ab, aa
+    if aa == tautologyId:
+        if a == tautologyId or b == tautologyId:
+            return tautologyId
+        return cleanSingle(b)
+    if a == b:
+        return [a]
+    if a == -b:
+        return tautologyId
+    return [a, b]
+
+# Clean clause given as three separate literals.
+# Call sites building three-literal clauses can use this directly
+def cleanTriple(a, b, c):
+    aa = abs(a)
+    ab = abs(b)
+    ac = abs(c)
+    # Insertion sort into decreasing order of variable
+    if ab > aa:
+        a, b = b, a
+        aa, ab = ab, aa
+    if ac > ab:
+        b, c = c, b
+        ab, ac = ac, ab
+        if ab > aa:
+            a, b = b, a
+            aa, ab = ab, aa
+    if aa == tautologyId:
+        if a == tautologyId or b == tautologyId or c == tautologyId:
+            return tautologyId
+        return cleanPair(b, c)
+    if a == b:
+        if b == c:
+            return [a]
+        if b == -c:
+            return tautologyId
+        return [a, c]
+    if a == -b:
+        return tautologyId
+    if b == c:
+        return [a, b]
+    if b == -c:
+        return tautologyId
+    return [a, b, c]
+
 def testClauseEquality(clause1, clause2):
     if clause1 is None or clause2 is None:
         return False
@@ -94,17 +164,31 @@ class VResolver:
     prover = None
     clauseHighNames = ["WHU", "UHD", "VHD", "OPH"]
     clauseLowNames = ["WLU", "ULD", "VLD", "OPL"]
+    clauseNames = clauseHighNames + clauseLowNames
     clauseHighKey = "OPH"
     clauseLowKey = "OPL"
     antecedentCount = 0
     clauseCount = 0
     runCount = 0
+    # Decision table.  Maps hints present and their lengths to plan for proof.
+    # Lengths reflect hints simplified by leaf or repeated nodes.
+    # Plan is tuple of antecedent names for single step proof,
+    # or pair of tuples for two step proof, with None designating the first step
+    plans = None
+    usePlans = True
+    # Compare each plan from table with result of generic RUP check
+    checkPlans = False
+    planHits = 0
+    planMisses = 0
 
     def __init__(self, prover):
         self.prover = prover
         self.antecedentCount = 0
         self.clauseCount = 0
         self.runCount = 0
+        self.plans = {}
+        self.planHits = 0
+        self.planMisses = 0
 
     def cleanHints(self, hints):
         for k in list(hints.keys()):
@@ -115,84 +199,115 @@ class VResolver:
     def run(self, targetClause, splitVariable, hints, comment):
         self.cleanHints(hints)
         self.runCount += 1
+        if not self.usePlans:
+            plan = self.findPlan(targetClause, splitVariable, hints)
+            return self.runPlan(plan, targetClause, splitVariable, hints, comment)
+        names = tuple([name for name in self.clauseNames if name in hints])
+        key = (names, len(targetClause)) + tuple([len(hints[name][1]) for name in names])
+        plan = self.plans.get(key)
+        if plan is not None and self.validPlan(plan, targetClause, splitVariable, hints):
+            self.planHits += 1
+            if self.checkPlans:
+                self.checkPlan(plan, targetClause, splitVariable, hints)
+        else:
+            # Fall back to generic RUP check
+            self.planMisses += 1
+            plan = self.findPlan(targetClause, splitVariable, hints)
+            self.plans[key] = plan
+        return self.runPlan(plan, targetClause, splitVariable, hints, comment)
+
+    # Target clause has already been cleaned by caller
+    def runPlan(self, plan, targetClause, splitVariable, hints, comment):
+        if len(plan) == 1:
+            return self.generateProofStep(targetClause, [hints[name][0] for name in plan[0]], comment, alreadyClean = True)
+        targ = [-splitVariable] + targetClause
+        id1 = self.generateProofStep(targ, [hints[name][0] for name in plan[0]], comment)
+        alist = [id1 if name is None else hints[name][0] for name in plan[1]]
+        id = self.generateProofStep(targetClause, alist, None, alreadyClean = True)
+        return -id
+
+    # Check that plan yields valid proof steps for these hints
+    def validPlan(self, plan, targetClause, splitVariable, hints):
+        if len(plan) == 1:
+            return self.chainCheck(targetClause, [hints[name][1] for name in plan[0]])
+        targ = [-splitVariable] + targetClause
+        return (self.chainCheck(targ, [hints[name][1] for name in plan[0]]) and
+                self.chainCheck(targetClause, [targ if name is None else hints[name][1] for name in plan[1]]))
+
+    # Check that each clause in list becomes unit by propagation, and final one yields conflict
+    def chainCheck(self, targetClause, clauseList):
+        units = set([-lit for lit in targetClause])
+        for clause in clauseList:
+            free = 0
+            for lit in clause:
+                if -lit not in units:
+                    if free != 0:
+                        return False
+                    free = lit
+            if free == 0:
+                return clause is clauseList[-1]
+            if free in units:
+                return False
+            units.add(free)
+        return False
+
+    # Make sure plan from decision table matches generic RUP check
+    def checkPlan(self, plan, targetClause, splitVariable, hints):
+        copy = { name : (id, list(clause)) for (name, (id, clause)) in hints.items() }
+        expected = self.findPlan(targetClause, splitVariable, copy)
+        if expected != plan:
+            raise ResolveException("Plan %s for target %s doesn't match RUP check result %s" % (str(plan), str(targetClause), str(expected)))
+
+    # Use generic RUP check to find antecedents.
+    # Returns plan, giving hint names for antecedents
+    def findPlan(self, targetClause, splitVariable, hints):
         if self.clauseHighKey not in hints:
             # Try for single line proof
-            targ =  targetClause
-            idList = []
-            clauseList = []
-            for id in self.clauseHighNames:
-                if id in hints:
-                    (cid, clause) = hints[id]
-                    idList.append(cid)
-                    clauseList.append(clause)
-            for id in self.clauseLowNames:
-                if id in hints:
-                    (cid, clause) = hints[id]
-                    idList.append(cid)
-                    clauseList.append(clause)
-            alist = self.RupCheck(targ, idList, clauseList)
+            nameList = [id for id in self.clauseHighNames + self.clauseLowNames if id in hints]
+            alist = self.RupCheck(targetClause, nameList, [hints[id][1] for id in nameList])
             if alist is not None:
-                id = self.generateProofStep(targ, alist, comment)
-                return id
+                return (tuple(alist),)
 
         if self.clauseLowKey not in hints:
             # Try for single line proof
-            targ =  targetClause
-            idList = []
-            clauseList = []
-            for id in self.clauseLowNames:
-                if id in hints:
-                    (cid, clause) = hints[id]
-                    idList.append(cid)
-                    clauseList.append(clause)
-            for id in self.clauseHighNames:
-                if id in hints:
-                    (cid, clause) = hints[id]
-                    idList.append(cid)
-                    clauseList.append(clause)
-            alist = self.RupCheck(targ, idList, clauseList)
+            nameList = [id for id in self.clauseLowNames + self.clauseHighNames if id in hints]
+            alist = self.RupCheck(targetClause, nameList, [hints[id][1] for id in nameList])
             if alist is not None:
-                id = self.generateProofStep(targ, alist, comment)
-                return id
-            
-        if True:
-            # Must split into two-line proof
-            targ =  [-splitVariable] + targetClause
-            idList = []
-            clauseList = []
-            for id in self.clauseHighNames:
-                if id in hints:
-                    (cid, clause) = hints[id]
-                    idList.append(cid)
-                    clauseList.append(clause)
-            alist = self.RupCheck(targ, idList, clauseList)
-            if alist is None:
-                clist = [str(key) for key in idList]
-                raise ResolveException("Couldn't prove positive target: %s using candidates %s" % (str(targ), str(clist)))
-            else:
-                id1 = self.generateProofStep(targ, alist, comment)
-            idList = [id1]
-            clauseList = [targ]
-            targ = targetClause
-
-            for id in self.clauseLowNames:
-                if id in hints:
-                    (cid, clause) = hints[id]
-                    idList.append(cid)
-                    clauseList.append(clause)
-            alist = self.RupCheck(targ, idList, clauseList)
-            if alist is None:
-                clist = [key + ":" + str(hints[key][0]) for key in idList]
-                raise ResolveException("Couldn't prove final target: %s using candidates %s" % (str(targ), str(clist)))
-            else:
-                id = self.generateProofStep(targ, alist, None)
-                return -id
+                return (tuple(alist),)
+
+        # Must split into two-line proof
+        targ =  [-splitVariable] + targetClause
+        nameList = [id for id in self.clauseHighNames if id in hints]
+        alist1 = self.RupCheck(targ, nameList, [hints[id][1] for id in nameList])
+        if alist1 is None:
+            clist = self.describeCandidates([hints[id][0] for id in nameList], [hints[id][1] for id in nameList])
+            raise ResolveException("Couldn't prove positive target: %s using candidates %s" % (str(targ), str(clist)))
+        nameList = [None] + [id for id in self.clauseLowNames if id in hints]
+        clauseList = [targ] + [hints[id][1] for id in nameList[1:]]
+        alist2 = self.RupCheck(targetClause, nameList, clauseList)
+        if alist2 is None:
+            clist = self.describeCandidates([self.prover.lastClauseId + 1] + [hints[id][0] for id in nameList[1:]], clauseList)
+            raise ResolveException("Couldn't prove final target: %s using candidates %s" % (str(targetClause), str(clist)))
+        return (tuple(alist1), tuple(alist2))
     
-    def generateProofStep(self, target, antecedents, comment):
+    # Describe candidate clauses for error message.
+    # Show literals recorded by prover when they differ from those supplied as hints
+    def describeCandidates(self, idList, clauseList):
+        clist = []
+        for (cid, clause) in zip(idList, clauseList):
+            stored = self.prover.getClause(cid)
+            s = "%d:%s" % (cid, str(clause))
+            if stored is not None and sorted(stored) != sorted(clause):
+                s += " (stored %s)" % str(stored)
+            clist.append(s)
+        return clist
+
+    # Set alreadyClean when target has been normalized by cleanClause
+    def generateProofStep(self, target, antecedents, comment, alreadyClean = False):
         self.prover.proofCount += 1
         self.antecedentCount += len(antecedents)
         self.clauseCount += 1
-        return self.prover.createClause(target, antecedents, comment, isInput = False)
+        return self.prover.createClause(target, antecedents, comment, isInput = False, alreadyClean = alreadyClean)
 
 
     def summarize(self):
@@ -200,6 +315,8 @@ class VResolver:
             antecedentAvg = float(self.antecedentCount) / float(self.runCount)
             clauseAvg = float(self.clauseCount) / float(self.runCount)
             self.prover.writer.write("  Avg antecedents / proof = %.2f.  Avg clauses / proof = %.2f.\n" % (antecedentAvg, clauseAvg))
+            if self.prover.verbLevel >= 2:
+                self.prover.writer.write("  Proof plans: %d table entries, %d hits, %d generic RUP checks\n" % (len(self.plans), self.planHits, self.planMisses))
 
     # Given list of possible antecedent IDs, see if can justify target clause
     # If so, return modified version of clause Ids containing those involved in propagation
@@ -0,0 +1,183 @@
+# Profiling support for SAT solver
+# Times and counts the phases of a run (reading CNF, constructing clause BDDs,
+# buckets or schedule lines, GC, resolution, proof output, and equation/constraint solving),
+# and writes them as a JSON report.
+
+#####################################################################################
+# Copyright (c) 2021 Marijn Heule, Randal E. Bryant, Carnegie Mellon University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or
+# substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT
+# NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT
+# OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+########################################################################################
+
+# Phase times are inclusive: time spent writing proof steps during resolution
+# counts toward both phases.
+# Allocations are measured as the net change in the number of memory blocks
+# allocated by the interpreter.  Measuring them costs several microseconds,
+# and so it is only done for phases that are entered infrequently.
+
+import sys
+import time
+import json
+
+class ReportException(Exception):
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return "Report Exception: " + str(self.value)
+
+class Phase:
+    name = ""
+    count = 0
+    seconds = 0.0
+    # Net change in allocated blocks.  None if not tracked
+    blocks = None
+    # Nesting depth.  Only outermost activation is timed
+    depth = 0
+    startTime = 0.0
+    startBlocks = 0
+
+    def __init__(self, name, trackAllocations = True):
+        self.name = name
+        self.count = 0
+        self.seconds = 0.0
+        self.blocks = 0 if trackAllocations else None
+        self.depth = 0
+        self.startTime = 0.0
+        self.startBlocks = 0
+
+    def start(self):
+        self.count += 1
+        self.depth += 1
+        if self.depth > 1:
+            return
+        if self.blocks is not None:
+            self.startBlocks = sys.getallocatedblocks()
+        self.startTime = time.perf_counter()
+
+    def stop(self):
+        self.depth -= 1
+        if self.depth > 0:
+            return
+        self.seconds += time.perf_counter() - self.startTime
+        if self.blocks is not None:
+            self.blocks += sys.getallocatedblocks() - self.startBlocks
+
+    def record(self):
+        result = { 'name' : self.name, 'count' : self.count, 'seconds' : self.seconds }
+        if self.blocks is not None:
+            result['allocatedBlocks'] = self.blocks
+        return result
+
+class RunReport:
+    # Phases, in order of first use
+    phases = {}
+    # Per-bucket or per-schedule-line records
+    items = []
+    # Currently open item: (record, start time, start blocks)
+    openItem = None
+    # Function returning number of live BDD nodes
+    liveFunction = None
+    startTime = 0.0
+    # Summary information supplied by solver
+    info = {}
+
+    def __init__(self):
+        self.phases = {}
+        self.items = []
+        self.openItem = None
+        self.liveFunction = None
+        self.startTime = time.perf_counter()
+        self.info = {}
+
+    def getPhase(self, name, trackAllocations = True):
+        if name not in self.phases:
+            self.phases[name] = Phase(name, trackAllocations)
+        return self.phases[name]
+
+    def start(self, name):
+        self.getPhase(name).start()
+
+    def stop(self, name):
+        self.phases[name].stop()
+
+    # Replace method of object with one that is timed as part of phase.
+    # Only affects this object, and so other instances of the class pay no overhead
+    def timeMethod(self, obj, methodName, name, trackAllocations = False):
+        if not hasattr(obj, methodName):
+            return
+        method = getattr(obj, methodName)
+        phase = self.getPhase(name, trackAllocations)
+        def timed(*args, **kwargs):
+            phase.start()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                phase.stop()
+        setattr(obj, methodName, timed)
+
+    # Start record for new bucket or schedule line, completing any open one
+    def nextItem(self, kind, label):
+        self.endItem()
+        record = { 'kind' : kind, 'label' : label }
+        self.openItem = (record, time.perf_counter(), sys.getallocatedblocks())
+
+    def endItem(self):
+        if self.openItem is None:
+            return
+        (record, startTime, startBlocks) = self.openItem
+        self.openItem = None
+        record['seconds'] = time.perf_counter() - startTime
+        record['allocatedBlocks'] = sys.getallocatedblocks() - startBlocks
+        if self.liveFunction is not None:
+            record['liveNodes'] = self.liveFunction()
+        self.items.append(record)
+
+    # Gather statistics from BDD manager, resolver, and prover
+    def collect(self, manager, prover):
+        self.endItem()
+        self.info['totalSeconds'] = time.perf_counter() - self.startTime
+        self.info['peakLiveNodes'] = manager.maxLiveCount
+        self.info['liveNodes'] = len(manager.uniqueTable)
+        self.info['applyCount'] = manager.applyCount
+        self.info['gcCount'] = manager.gcCount
+        self.info['gcSeconds'] = manager.gcSeconds
+        caches = []
+        for name in sorted(manager.operationCache.keys()):
+            cache = manager.operationCache[name]
+            lookups = cache.hits + cache.misses
+            rate = float(cache.hits) / lookups if lookups > 0 else 0.0
+            caches.append({ 'name' : name, 'hits' : cache.hits, 'misses' : cache.misses,
+                            'evictions' : cache.evictions, 'entries' : len(cache), 'hitRate' : rate })
+        self.info['caches'] = caches
+        vresolver = manager.vresolver
+        self.info['resolver'] = { 'runs' : vresolver.runCount, 'clauses' : vresolver.clauseCount,
+                                  'antecedents' : vresolver.antecedentCount,
+                                  'planHits' : vresolver.planHits, 'planMisses' : vresolver.planMisses }
+        self.info['proof'] = { 'totalClauses' : prover.clauseCount, 'inputClauses' : prover.inputClauseCount }
+
+    def write(self, fname):
+        try:
+            outfile = open(fname, 'w')
+        except Exception as ex:
+            raise ReportException("Couldn't open report file '%s' (%s)" % (fname, str(ex)))
+        report = dict(self.info)
+        report['phases'] = [phase.record() for phase in self.phases.values()]
+        report['items'] = self.items
+        json.dump(report, outfile, indent = 1)
+        outfile.write('\n')
+        outfile.close()
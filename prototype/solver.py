@@ -25,24 +25,55 @@ import getopt
 import datetime
 import random
 import signal
+import heapq
+import array
 
 import bdd
 import resolver
 import stream
 import pseudoboolean
+import opcache
+import runreport
+import dimacs
+import portfolio
+import parallel
+import ordering
 
 # Increase maximum recursion depth
+# (Only needed when using the recursive apply operations)
 sys.setrecursionlimit(10 * sys.getrecursionlimit())
 
 def usage(name):
-    sys.stderr.write("Usage: %s [-h] [-b] [-B BPERM] [-v LEVEL] [-r SEED] [-i CNF] [-o file.{proof,lrat,lratb}] [-M t|b|p] [-p PERMUTE] [-s SCHEDULE] [-m MODULUS] [-L logfile] [-t TLIM] [-Z NZLIM]\n" % name)
+    sys.stderr.write("Usage: %s [-h] [-I] [-C SIZE[:POLICY]] [-R] [-G GCTRACE] [-D NODES] [-E] [-Q] [-N ARITY] [-P PAIRING] [-W DEPTH] [-z LEVEL] [-T] [-l] [-J REPORT] [-K] [-X WORKERS[:ORDER,...]] [-j WORKERS] [-O METHOD] [-b] [-B BPERM] [-v LEVEL] [-r SEED] [-i CNF] [-o file.{proof,lrat,lratb}[.gz|.xz|.bz2]] [-M t|b|p] [-p PERMUTE] [-s SCHEDULE] [-m MODULUS] [-L logfile] [-t TLIM] [-Z NZLIM]\n" % name)
     sys.stderr.write("  -h          Print this message\n")
+    sys.stderr.write("  -I          Use iterative apply operations (not limited by recursion depth)\n")
+    sys.stderr.write("  -C SIZE[:POLICY] Limit each operation cache to SIZE entries.  POLICY = lru (default), clock, or direct\n")
+    sys.stderr.write("  -R          Free nodes incrementally by reference counting, rather than by mark & sweep GC\n")
+    sys.stderr.write("  -G GCTRACE  Write JSON record of garbage collections to file GCTRACE\n")
+    sys.stderr.write("  -D NODES    Reorder variables dynamically by sifting, starting once there are NODES nodes\n")
+    sys.stderr.write("  -E          Use complement edges to represent negation in BDDs\n")
+    sys.stderr.write("  -Q          Combine final conjunction with quantification (and-exists) in buckets and schedules\n")
+    sys.stderr.write("  -N ARITY    Combine up to ARITY terms with single n-ary conjunction in buckets and schedules\n")
+    sys.stderr.write("  -P PAIRING  Choice of terms to conjoin in buckets and schedules: fifo (default), size, support\n")
+    sys.stderr.write("  -W DEPTH    Write proof in background thread, with queue of DEPTH batches\n")
+    sys.stderr.write("  -z LEVEL    Compression level for proof files ending in .gz, .xz, or .bz2\n")
+    sys.stderr.write("  -T          Trim LRAT proof: hold steps in memory and write only those needed for refutation\n")
+    sys.stderr.write("  -l          Defer justification: solve without proof, then generate proof only for operations leading to refutation\n")
+    sys.stderr.write("  -J REPORT   Profile phases of run and write JSON report to file REPORT\n")
+    sys.stderr.write("  -K          Load clauses from binary cache CNF.cache, creating or updating it when missing or out of date\n")
+    sys.stderr.write("  -X WORKERS[:ORDER,...] Run portfolio of WORKERS processes with different variable orderings:\n")
+    sys.stderr.write("              given order, order files ORDER, identity, and random shuffles.  First to finish wins\n")
+    sys.stderr.write("  -j WORKERS  Process independent subtrees of buckets with up to WORKERS processes (requires -b or -B and LRAT proof)\n")
+    sys.stderr.write("  -O METHOD   When no PERMUTE file is given, generate variable ordering from CNF structure:\n")
+    sys.stderr.write("              cm (Cuthill-McKee), force (FORCE placement), minfill (min-fill elimination order), or auto\n")
+    sys.stderr.write("              (minfill with -b, force otherwise)\n")
     sys.stderr.write("  -b          Process terms via bucket elimination ordered by variable levels\n")
     sys.stderr.write("  -B BPERM    Process terms via bucket elimination ordered by permutation file BPERM\n")
     sys.stderr.write("  -v LEVEL    Set verbosity level\n")
     sys.stderr.write("  -r SEED     Set random seed (for breaking ties during pivot selection)\n")
     sys.stderr.write("  -i CNF      Name of CNF input file\n")
     sys.stderr.write("  -o pfile    Name of proof output file (.drat = DRAT text, .lrat = LRAT text, .lratb = LRAT binary)\n")
+    sys.stderr.write("              Suffix .gz, .xz, or .bz2 causes proof to be compressed\n")
     sys.stderr.write("  -M (t|b|p)  Pipe proof to stdout (p = tracecheck, t = LRAT text, b = LRAT binary)\n")
     sys.stderr.write("  -p PERMUTE  Name of file specifying mapping from CNF variable to BDD level\n")
     sys.stderr.write("  -s SCHEDULE Name of action schedule file\n")
@@ -74,16 +105,41 @@ class CnfException(Exception):
 
 # Read CNF file.
 # Save list of clauses, each is a list of literals (zero at end removed)
-# Also saves comment lines
+# Also saves comment lines.
+# Files are parsed in bulk when possible, falling back to reading line by line
+# for standard input and for files that fail the bulk validation checks.
+# Optionally, clauses are loaded from and saved to a binary cache next to the file
 class CnfReader():
     file = None
     commentLines = []
     clauses = []
     nvar = 0
     verbLevel = 1
+    # Outcome of using cache: None (not used), 'loaded', 'saved', or message describing failure
+    cacheStatus = None
     
-    def __init__(self, fname = None, verbLevel = 1):
+    def __init__(self, fname = None, verbLevel = 1, bulk = True, cache = False):
         self.verbLevel = verbLevel
+        self.cacheStatus = None
+        if fname is None:
+            cache = False
+        if cache:
+            carray = dimacs.loadCache(fname)
+            if carray is not None:
+                self.nvar = carray.nvar
+                self.clauses = carray.clauseLists()
+                self.commentLines = []
+                self.cacheStatus = 'loaded'
+                return
+        if fname is not None and bulk:
+            carray = dimacs.readClauses(fname, keepComments = verbLevel > 1)
+            if carray is not None:
+                self.nvar = carray.nvar
+                self.clauses = carray.clauseLists()
+                self.commentLines = carray.commentLines
+                if cache:
+                    self.saveCache(fname, carray)
+                return
         if fname is None:
             opened = False
             self.file = sys.stdin
@@ -101,6 +157,15 @@ class CnfReader():
             if opened:
                 self.file.close()
             raise ex
+        if cache:
+            self.saveCache(fname, dimacs.fromLists(self.nvar, self.clauses))
+
+    def saveCache(self, fname, carray):
+        try:
+            dimacs.saveCache(fname, carray)
+            self.cacheStatus = 'saved'
+        except OSError as ex:
+            self.cacheStatus = "couldn't save cache (%s)" % str(ex)
         
     def readCnf(self):
         lineNumber = 0
@@ -168,6 +233,7 @@ class Term:
 #        self.support = self.manager.getSupport(root)
         self.size = self.manager.getSize(root)
         self.validation = validation
+        self.manager.addRef(root)
 
     # Generate conjunction of two terms
     def combine(self, other):
@@ -189,6 +255,40 @@ class Term:
             validation = self.manager.prover.createClause([newRoot.id], antecedents, comment)
         return Term(self.manager, newRoot, validation)
 
+    # Generate conjunction of this term with list of others, using n-ary conjunction
+    def combineList(self, others):
+        terms = [self] + others
+        antecedents = [t.validation for t in terms]
+        newRoot, implication = self.manager.applyAndListJustify([t.root for t in terms])
+        if newRoot == self.manager.leaf0:
+            comment = "Validation of Empty clause"
+        else:
+            comment = "Validation of %s" % newRoot.label()
+        validation = None
+        if implication == resolver.tautologyId:
+            for t in terms:
+                if newRoot == t.root:
+                    validation = t.validation
+                    break
+        else:
+            antecedents += [implication]
+        if validation is None:
+            validation = self.manager.prover.createClause([newRoot.id], antecedents, comment)
+        return Term(self.manager, newRoot, validation)
+
+    # Generate conjunction of two terms, with variables in literals quantified
+    def combineQuantify(self, other, literals):
+        antecedents = [self.validation, other.validation]
+        newRoot, implication = self.manager.applyAndExistsJustify(self.root, other.root, literals)
+        if implication != resolver.tautologyId:
+            antecedents += [implication]
+        if newRoot == self.manager.leaf0:
+            comment = "Validation of Empty clause"
+        else:
+            comment = "Validation of %s" % newRoot.label()
+        validation = self.manager.prover.createClause([newRoot.id], antecedents, comment)
+        return Term(self.manager, newRoot, validation)
+
     def quantify(self, literals, prover):
         antecedents = [self.validation]
         newRoot = self.manager.equant(self.root, literals)
@@ -200,6 +300,22 @@ class Term:
         validation = self.manager.prover.createClause([newRoot.id], antecedents, "Validation of %s" % newRoot.label())
         return Term(self.manager, newRoot, validation)
 
+    # Operations without justification, for deferred proof generation.
+    # Resulting terms have no validation
+    def combineDeferred(self, others):
+        newRoot = self.root
+        for t in others:
+            newRoot = self.manager.applyAnd(newRoot, t.root)
+        return Term(self.manager, newRoot, None)
+
+    def combineQuantifyDeferred(self, other, literals):
+        newRoot = self.manager.equant(self.manager.applyAnd(self.root, other.root), literals)
+        return Term(self.manager, newRoot, None)
+
+    def quantifyDeferred(self, literals):
+        newRoot = self.manager.equant(self.root, literals)
+        return Term(self.manager, newRoot, None)
+
     def equalityTest(self, other):
         root1 = self.root
         root2 = other.root
@@ -301,6 +417,144 @@ class NullWriter:
         pass
 
 
+# Compact storage of clause literals, indexed by clause Id.
+# Literals of all clauses are held in a single flat array.
+# Each clause occupies a slot holding its length followed by its literals,
+# with a dictionary giving the slot position for each live clause.
+# Space of deleted clauses is reused by later clauses of the same length,
+# and the array is compacted when too much of it is unused
+class ClauseArena:
+    literals = None
+    # Mapping from clause Id to start of its slot
+    slots = {}
+    # Mapping from length to list of starting positions of free slots
+    freeSlots = {}
+    wastedCount = 0
+
+    def __init__(self):
+        self.literals = array.array('i')
+        self.slots = {}
+        self.freeSlots = {}
+        self.wastedCount = 0
+
+    def add(self, cid, clause):
+        length = len(clause)
+        free = self.freeSlots.get(length)
+        if free:
+            start = free.pop()
+            self.literals[start+1:start+1+length] = array.array('i', clause)
+            self.wastedCount -= length + 1
+        else:
+            start = len(self.literals)
+            self.literals.append(length)
+            self.literals.extend(clause)
+        self.slots[cid] = start
+
+    def __contains__(self, cid):
+        return cid in self.slots
+
+    def get(self, cid):
+        start = self.slots[cid]
+        return self.literals[start+1:start+1+self.literals[start]].tolist()
+
+    def remove(self, cid):
+        start = self.slots.pop(cid)
+        length = self.literals[start]
+        if length in self.freeSlots:
+            self.freeSlots[length].append(start)
+        else:
+            self.freeSlots[length] = [start]
+        self.wastedCount += length + 1
+        if self.wastedCount > 1024 and self.wastedCount > len(self.literals) // 2:
+            self.compact()
+
+    # Copy live clauses into new array, discarding free slots.
+    # Dictionary is also rebuilt, since it does not shrink when clauses are removed
+    def compact(self):
+        literals = array.array('i')
+        slots = {}
+        for cid in self.slots.keys():
+            start = self.slots[cid]
+            slots[cid] = len(literals)
+            literals.extend(self.literals[start:start+1+self.literals[start]])
+        self.literals = literals
+        self.slots = slots
+        self.freeSlots = {}
+        self.wastedCount = 0
+
+    def byteCount(self):
+        return self.literals.itemsize * len(self.literals) + sys.getsizeof(self.slots)
+
+    def __len__(self):
+        return len(self.slots)
+
+# Record of added proof steps, held in flat arrays, for use in trimming.
+# Steps are numbered from 0 in order of addition
+class ProofTrace:
+    # Original clause Id of each step
+    ids = None
+    literals = None
+    literalStarts = None
+    hints = None
+    hintStarts = None
+    # Mapping from clause Id (offset by first Id) to step number
+    firstId = 0
+    steps = None
+
+    def __init__(self, firstId):
+        self.ids = array.array('q')
+        self.literals = array.array('i')
+        self.literalStarts = array.array('q', [0])
+        self.hints = array.array('q')
+        self.hintStarts = array.array('q', [0])
+        self.firstId = firstId
+        self.steps = array.array('q')
+
+    def add(self, cid, result, antecedent):
+        step = len(self.ids)
+        self.ids.append(cid)
+        self.literals.extend(result)
+        self.literalStarts.append(len(self.literals))
+        self.hints.extend(antecedent)
+        self.hintStarts.append(len(self.hints))
+        offset = cid - self.firstId
+        if offset >= len(self.steps):
+            self.steps.extend([-1] * (offset + 1 - len(self.steps)))
+        self.steps[offset] = step
+
+    def stepCount(self):
+        return len(self.ids)
+
+    def stepOf(self, cid):
+        return self.steps[cid - self.firstId] if cid >= self.firstId else -1
+
+    def clause(self, step):
+        return self.literals[self.literalStarts[step]:self.literalStarts[step+1]].tolist()
+
+    def antecedents(self, step):
+        return self.hints[self.hintStarts[step]:self.hintStarts[step+1]].tolist()
+
+    # Find steps needed to derive the last empty clause, via backward traversal of hints.
+    # Hints for RAT steps are negated clause Ids.
+    # Returns bytearray with nonzero entries for needed steps, or None if there is no empty clause
+    def neededSteps(self):
+        count = self.stepCount()
+        final = count-1
+        while final >= 0 and self.literalStarts[final] != self.literalStarts[final+1]:
+            final -= 1
+        if final < 0:
+            return None
+        needed = bytearray(count)
+        needed[final] = 1
+        for step in range(final, -1, -1):
+            if not needed[step]:
+                continue
+            for pos in range(self.hintStarts[step], self.hintStarts[step+1]):
+                hstep = self.stepOf(abs(self.hints[pos]))
+                if hstep >= 0:
+                    needed[hstep] = 1
+        return needed
+
 class Prover:
 
     inputClauseCount = 0
@@ -313,9 +567,20 @@ class Prover:
     verbLevel = 1
     doLrat = False
     doBinary = False
-    clauseDict = None
-
-    def __init__(self, fname = None, writer = None, verbLevel = 1, doLrat = False, doBinary = False):
+    # Literals of clauses, needed for DRAT deletions
+    clauseStore = None
+    # Buffered output to file
+    sink = None
+    closed = False
+    # Hold added steps in memory, and write only those needed for the refutation
+    trim = False
+    trace = None
+    # File and sink inherited by worker process.  Held so that they are never flushed or closed
+    inherited = None
+
+    # Background writer thread, when enabled, with queue of specified depth
+    def __init__(self, fname = None, writer = None, verbLevel = 1, doLrat = False, doBinary = False, bufferSize = 1 << 20,
+                 background = None, compressLevel = None, trim = False):
         self.verbLevel = verbLevel
         if fname is None:
             self.opened = False
@@ -325,9 +590,14 @@ class Prover:
         else:
             self.opened = True
             try:
-                self.file = open(fname, 'wb' if doBinary else 'w')
-            except Exception:
-                raise ProverException("Could not open file '%s'" % fname)
+                self.file = stream.openOutput(fname, compressLevel)
+            except Exception as ex:
+                raise ProverException("Could not open file '%s' (%s)" % (fname, str(ex)))
+        if background is None:
+            self.sink = stream.ProofSink(self.file, bufferSize)
+        else:
+            self.sink = stream.BackgroundSink(self.file, bufferSize, depth = background)
+        self.closed = False
         self.writer = sys.stderr if writer is None else writer
         self.doLrat = doLrat
         self.doBinary = doBinary
@@ -335,17 +605,36 @@ class Prover:
         self.lastClauseId = 0
         self.proofCount = 0
         if not doLrat:
-            self.clauseDict = {}
+            self.clauseStore = ClauseArena()
+        if trim and not doLrat:
+            raise ProverException("Proof trimming requires LRAT output")
+        self.trim = trim
+        self.trace = None
+
+    # Write subsequent steps to new file as text LRAT.
+    # Used by worker process, which must not write to the file it inherited from its parent
+    def redirect(self, fname):
+        self.inherited = (self.file, self.sink)
+        try:
+            self.file = open(fname, 'wb')
+        except Exception:
+            raise ProverException("Could not open file '%s'" % fname)
+        self.opened = True
+        self.closed = False
+        self.doBinary = False
+        self.sink = stream.ProofSink(self.file)
 
     def inputDone(self):
         self.inputClauseCount = self.clauseCount
+        if self.trim:
+            self.trace = ProofTrace(self.lastClauseId + 1)
 
     def fileOutput(self):
         return self.opened
 
     def comment(self, comment):
-        if self.verbLevel > 1 and comment is not None and not self.doBinary:
-            self.file.write("c " + comment + '\n')
+        if self.verbLevel > 1 and comment is not None and not self.doBinary and self.trace is None:
+            self.sink.writeText("c " + comment + '\n')
 
     def createClause(self, result, antecedent, comment = None, isInput = False, alreadyClean = False):
         if not alreadyClean:
@@ -356,6 +645,9 @@ class Prover:
             return result
         cid = self.lastClauseId
         self.clauseCount += 1
+        if self.trace is not None:
+            self.trace.add(cid, result, antecedent)
+            return cid
         self.comment(comment)
         if self.doLrat:
             first = [cid]
@@ -368,48 +660,124 @@ class Prover:
         ilist = first + middle + rest
         if self.doBinary:
             if not isInput:
-                bytes = stream.CompressArray(ilist).bytes
-                self.file.write(bytes)
+                self.sink.writeCompressed(ilist)
+        elif isInput:
+            if self.verbLevel > 1:
+                self.comment(" ".join([str(i) for i in ilist]))
         else:
-            slist = [str(i) for i in ilist]
-            istring = " ".join(slist)
-            if isInput:
-                self.comment(istring)
-            else:
-                self.file.write(istring + '\n')
+            self.sink.writeLine(ilist)
         if not self.doLrat:
-            self.clauseDict[cid] = result
+            self.clauseStore.add(cid, result)
         return cid
 
+    # Write LRAT step
+    def writeStep(self, cid, result, antecedent):
+        middle = [ord('a')] if self.doBinary else []
+        ilist = [cid] + middle + result + [0] + antecedent + [0]
+        if self.doBinary:
+            self.sink.writeCompressed(ilist)
+        else:
+            self.sink.writeLine(ilist)
+
+    # Write LRAT deletion, labeled with Id of most recent step
+    def writeDeletion(self, cid, clauseList):
+        middle = [ord('d')] if self.doBinary else ['d']
+        ilist = [cid] + middle + clauseList + [0]
+        if self.doBinary:
+            self.sink.writeCompressed(ilist)
+        else:
+            self.sink.writeLine(ilist)
+
+    # Write steps recorded in trace that are needed to derive the empty clause.
+    # Steps are renumbered consecutively following the input clauses.
+    # Each clause is deleted following its last use, with deletions gathered into batches
+    def writeTrimmed(self, deleteBatch = 1000):
+        trace = self.trace
+        self.trace = None
+        count = trace.stepCount()
+        needed = trace.neededSteps()
+        if needed is None:
+            # No refutation.  Keep everything
+            needed = bytearray([1]) * count
+        # Last step using each clause, indexed by original Id
+        lastUse = array.array('q', [-1]) * (self.lastClauseId + 1)
+        for step in range(count):
+            if needed[step]:
+                for pos in range(trace.hintStarts[step], trace.hintStarts[step+1]):
+                    lastUse[abs(trace.hints[pos])] = step
+        # Clauses to delete following each step
+        deletions = {}
+        for cid in range(len(lastUse)):
+            step = lastUse[cid]
+            if step >= 0:
+                if step in deletions:
+                    deletions[step].append(cid)
+                else:
+                    deletions[step] = [cid]
+        # Mapping from original Id (offset by first Id) to new Id
+        newIds = array.array('q', [0]) * len(trace.steps)
+        def renumber(h):
+            if abs(h) < trace.firstId:
+                return h
+            nid = newIds[abs(h) - trace.firstId]
+            return nid if h > 0 else -nid
+        nextId = trace.firstId
+        keptCount = 0
+        dlist = []
+        for step in range(count):
+            if not needed[step]:
+                continue
+            cid = nextId
+            nextId += 1
+            keptCount += 1
+            newIds[trace.ids[step] - trace.firstId] = cid
+            hints = [renumber(h) for h in trace.antecedents(step)]
+            self.writeStep(cid, trace.clause(step), hints)
+            if step in deletions:
+                dlist += [renumber(h) for h in deletions[step]]
+                if len(dlist) >= deleteBatch:
+                    self.writeDeletion(cid, dlist)
+                    dlist = []
+        if self.verbLevel >= 1:
+            self.writer.write("Proof trimming: kept %d of %d added clauses\n" % (keptCount, count))
+
     def deleteClauses(self, clauseList):
+        if self.trace is not None:
+            # Deletions determined when trimmed proof is written
+            return
         if self.doLrat:
-            middle = [ord('d')] if self.doBinary else ['d']
-            rest = clauseList + [0]
-            ilist = [self.clauseCount] + middle + rest
-            if self.doBinary:
-                bytes = stream.CompressArray(ilist).bytes
-                self.file.write(bytes)
-            else:
-                slist = [str(i) for i in ilist]
-                istring = " ".join(slist)
-                self.file.write(istring + '\n')
+            self.writeDeletion(self.clauseCount, clauseList)
         else:
             for cid in clauseList:
-                clause = self.clauseDict[cid]
+                clause = self.clauseStore.get(cid)
+                self.clauseStore.remove(cid)
                 middle = [ord('d')] if self.doBinary else ['d']
                 rest = clause + [0]
                 ilist = middle + rest
                 if self.doBinary:
-                    bytes = stream.CompressArray(ilist).bytes
-                    self.file.write(bytes)
+                    self.sink.writeCompressed(ilist)
                 else:
-                    slist = [str(i) for i in ilist]
-                    istring = " ".join(slist)
-                    self.file.write(istring + '\n')
-                
-                
+                    self.sink.writeLine(ilist)
 
+    # Literals in clause, or None if not available
+    def getClause(self, cid):
+        if self.clauseStore is None or cid not in self.clauseStore:
+            return None
+        return self.clauseStore.get(cid)
 
+    # Write out any buffered proof steps and close file
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # Prover may be incomplete if its file could not be opened
+        if self.sink is None:
+            return
+        if self.trace is not None:
+            self.writeTrimmed()
+        self.sink.close()
+        if self.opened:
+            self.file.close()
 
     def summarize(self):
         if self.verbLevel >= 1:
@@ -419,12 +787,43 @@ class Prover:
                 acount = self.clauseCount - self.inputClauseCount - self.proofCount
                 self.writer.write("Added clauses without antecedents: %d\n" % acount)
                 self.writer.write("Added clauses requiring proofs: %d\n" % (self.proofCount))
+                if isinstance(self.sink, stream.BackgroundSink):
+                    self.writer.write("Proof writer: %d batches queued, %d stalls on full queue\n" % (self.sink.batchCount, self.sink.stallCount))
+                if self.clauseStore is not None:
+                    self.writer.write("Clause store: %d live clauses, %d bytes\n" % (len(self.clauseStore), self.clauseStore.byteCount()))
 
     def __del__(self):
-        if self.opened:
-            self.file.close()
-
-
+        self.close()
+
+
+
+# Policies for choosing which terms to conjoin next:
+#   fifo:    Terms in order of insertion
+#   size:    Smallest terms first (Huffman style)
+#   support: Smallest term, together with those minimizing union of supports
+pairingPolicies = ['fifo', 'size', 'support']
+
+# Choose arity entries from list to combine next.  Return (chosen, remaining).
+# sizeFun and supportFun give the size and set of support ids of an entry
+def choosePairing(entries, arity, policy, sizeFun, supportFun):
+    if policy == 'fifo':
+        return (entries[:arity], entries[arity:])
+    if policy == 'size':
+        indices = heapq.nsmallest(arity, range(len(entries)), key = lambda i : sizeFun(entries[i]))
+    elif policy == 'support':
+        first = min(range(len(entries)), key = lambda i : sizeFun(entries[i]))
+        indices = [first]
+        support = set(supportFun(entries[first]))
+        while len(indices) < arity:
+            candidates = [i for i in range(len(entries)) if i not in indices]
+            best = min(candidates, key = lambda i : (len(support | supportFun(entries[i])), sizeFun(entries[i])))
+            indices.append(best)
+            support |= supportFun(entries[best])
+    else:
+        raise SolverException("Unknown pairing policy '%s'" % policy)
+    chosen = [entries[i] for i in indices]
+    remaining = [entries[i] for i in range(len(entries)) if i not in indices]
+    return (chosen, remaining)
 
 class SolverException(Exception):
 
@@ -462,19 +861,55 @@ class Solver:
     equationSystem = None
     # Support for constraints
     constraintSystem = None
-
-
-    def __init__(self, fname = None, prover = None, permuter = None, verbLevel = 1):
+    # Combine final conjunction and quantification into single and-exists operation
+    andExists = False
+    # Maximum number of terms combined by single n-ary conjunction (None = pairwise only)
+    naryLimit = None
+    # Policy for choosing terms to conjoin within bucket or schedule conjunction
+    pairing = 'fifo'
+    # Support sets of terms, computed on demand
+    supportSets = {}
+    # Deferred justification: record term operations without generating proofs.
+    # Each step is (term id, operation, operand ids, variables, alias),
+    # where alias is the id of an operand having the same BDD as the result, or None
+    deferred = False
+    deferredSteps = []
+    # Id of term that is leaf 0
+    finalId = None
+    # Profiling of run phases (None when disabled)
+    report = None
+
+
+    def __init__(self, fname = None, prover = None, permuter = None, verbLevel = 1, iterative = False,
+                 cacheCapacity = None, cachePolicy = 'lru', refCounting = False,
+                 traceGC = False, reorderMin = None, complementEdges = False, andExists = False, naryLimit = None,
+                 pairing = 'fifo', deferred = False, report = None, cache = False, orderMethod = None):
         self.verbLevel = verbLevel
+        self.report = report
+        self.andExists = andExists
+        self.deferred = deferred
+        self.deferredSteps = []
+        self.finalId = None
+        self.naryLimit = naryLimit
+        if pairing not in pairingPolicies:
+            raise SolverException("Unknown pairing policy '%s'" % pairing)
+        self.pairing = pairing
+        self.supportSets = {}
         if prover is None:
             prover = Prover(verbLevel = verbLevel)
         self.prover = prover
         self.writer = prover.writer
+        if report is not None:
+            report.start('read CNF')
         try:
-            reader = CnfReader(fname, verbLevel = verbLevel)
+            reader = CnfReader(fname, verbLevel = verbLevel, cache = cache)
         except Exception as ex:
             self.writer.write("Aborted: %s\n" % str(ex))
             raise ex
+        if reader.cacheStatus is not None and verbLevel >= 2:
+            self.writer.write("CNF cache: %s\n" % reader.cacheStatus)
+        if report is not None:
+            report.stop('read CNF')
         clauseCount = 0
         # Print input clauses
         for clause in reader.clauses:
@@ -487,8 +922,27 @@ class Solver:
 
         self.prover.inputDone()
 
+        # Generate variable ordering from structure of clauses
+        if permuter is None and orderMethod is not None:
+            if report is not None:
+                report.start('ordering')
+            order = ordering.Ordering(orderMethod, reader.nvar, reader.clauses)
+            if report is not None:
+                report.stop('ordering')
+                report.info['ordering'] = order.record()
+            if verbLevel >= 1:
+                self.writer.write(order.describe() + "\n")
+            permuter = Permuter(list(range(1, reader.nvar+1)), order.order)
+
         self.manager = bdd.Manager(prover = self.prover, rootGenerator = self.rootGenerator,
-                                   nextNodeId = reader.nvar+1, verbLevel = verbLevel)
+                                   nextNodeId = reader.nvar+1, verbLevel = verbLevel,
+                                   iterative = iterative,
+                                   cacheCapacity = cacheCapacity, cachePolicy = cachePolicy,
+                                   refCounting = refCounting, traceGC = traceGC, reorderMin = reorderMin,
+                                   complementEdges = complementEdges)
+        if report is not None:
+            self.instrument(report)
+            report.start('clause BDDs')
         # Generate BDD representations of literals
         if permuter is None:
             # Default is identity permutation
@@ -500,8 +954,10 @@ class Solver:
             inputId = self.permuter.forward(level)
             var = self.manager.newVariable(name = "V%d" % inputId, id = inputId)
             t = self.manager.literal(var, 1)
+            self.manager.addRef(t)
             self.litMap[ inputId] = t
             e = self.manager.literal(var, 0)
+            self.manager.addRef(e)
             self.litMap[-inputId] = e
         # Generate BDD representations of clauses
         self.termCount = 0
@@ -514,8 +970,22 @@ class Solver:
             term = Term(self.manager, root, validation)
             self.inputIds[self.termCount] = term
             self.activeIds[self.termCount] = term
+        if report is not None:
+            report.stop('clause BDDs')
         self.unsat = False
 
+    # Time activities of BDD manager, resolver, and prover that occur throughout the run
+    def instrument(self, report):
+        report.liveFunction = lambda : len(self.manager.uniqueTable)
+        report.timeMethod(self.manager, 'collectGarbage', 'GC', trackAllocations = True)
+        report.timeMethod(self.manager, 'freeZeroNodes', 'GC')
+        report.timeMethod(self.manager, 'reorderVariables', 'reorder', trackAllocations = True)
+        vresolver = self.manager.vresolver
+        for methodName in ['run', 'RupCheck', 'generateProofStep']:
+            report.timeMethod(vresolver, methodName, 'resolver')
+        for methodName in ['writeText', 'writeLine', 'writeCompressed', 'flush', 'close']:
+            report.timeMethod(self.prover.sink, methodName, 'proof output')
+
     # Simplistic version of scheduling
     def choosePair(self):
         ids = sorted(self.activeIds.keys())
@@ -537,8 +1007,11 @@ class Solver:
         if id in self.activeIds:
             term = self.activeIds[id]
             del self.activeIds[id]
+        if id in self.supportSets:
+            del self.supportSets[id]
         if id not in self.inputIds:
             if term is not None:
+                self.manager.deref(term.root)
                 term.root = None
             clauseList = self.manager.checkGC(term.size)
             if len(clauseList) > 0:
@@ -547,8 +1020,12 @@ class Solver:
     def combineTerms(self, id1, id2):
         termA = self.getTerm(id1)
         termB = self.getTerm(id2)
-        newTerm = termA.combine(termB)
+        if self.deferred:
+            newTerm = termA.combineDeferred([termB])
+        else:
+            newTerm = termA.combine(termB)
         self.termCount += 1
+        self.recordStep('a', [id1, id2], newTerm)
         comment = "T%d (Node %s) & T%d (Node %s)--> T%s (Node %s)" % (id1, termA.root.label(), id2, termB.root.label(),
                                                                       self.termCount, newTerm.root.label())
         self.prover.comment(comment)
@@ -557,27 +1034,195 @@ class Solver:
         self.activeIds[self.termCount] = newTerm
         self.removeTerm(id1)
         self.removeTerm(id2)
+        self.checkReorder()
+        if newTerm.root == self.manager.leaf0:
+            if self.prover.fileOutput() and self.verbLevel >= 1:
+                self.writer.write("UNSAT\n")
+            self.unsat = True
+            self.finalId = self.termCount
+            self.manager.summarize()
+            return -1
+        return self.termCount
+
+    # Conjunction of list of terms with single n-ary operation
+    def combineTermList(self, idList):
+        if len(idList) == 2:
+            return self.combineTerms(idList[0], idList[1])
+        terms = [self.getTerm(id) for id in idList]
+        if self.deferred:
+            newTerm = terms[0].combineDeferred(terms[1:])
+        else:
+            newTerm = terms[0].combineList(terms[1:])
+        self.termCount += 1
+        self.recordStep('a', idList, newTerm)
+        tstring = " & ".join(["T%d (Node %s)" % (id, t.root.label()) for (id, t) in zip(idList, terms)])
+        comment = "%s --> T%d (Node %s)" % (tstring, self.termCount, newTerm.root.label())
+        self.prover.comment(comment)
+        if self.prover.fileOutput() and self.verbLevel >= 3:
+            self.writer.write("Combine: %s\n" % (comment))
+        self.activeIds[self.termCount] = newTerm
+        for id in idList:
+            self.removeTerm(id)
+        self.checkReorder()
+        if newTerm.root == self.manager.leaf0:
+            if self.prover.fileOutput() and self.verbLevel >= 1:
+                self.writer.write("UNSAT\n")
+            self.unsat = True
+            self.finalId = self.termCount
+            self.manager.summarize()
+            return -1
+        return self.termCount
+
+    # Choose terms to conjoin next according to pairing policy.  Return (chosen, remaining)
+    def chooseTerms(self, idList, arity):
+        return choosePairing(idList, arity, self.pairing, self.termSize, self.termSupport)
+
+    def termSize(self, id):
+        return self.activeIds[id].size
+
+    def termSupport(self, id):
+        if id not in self.supportSets:
+            self.supportSets[id] = set(self.manager.getSupportIds(self.activeIds[id].root))
+        return self.supportSets[id]
+
+    # Summarize conjunctions performed in bucket
+    def reportBucket(self, label, termCount, maxSize):
+        if self.verbLevel >= 2 and termCount > 1:
+            self.writer.write("Bucket %s: %d terms conjoined with '%s' pairing.  Largest intermediate term has %d nodes\n" %
+                              (label, termCount, self.pairing, maxSize))
+
+    # Number of terms to combine in next conjunction, given number available
+    def conjunctionArity(self, available):
+        if self.naryLimit is None:
+            return min(2, available)
+        return min(self.naryLimit, available)
+
+    # Conjunction of two terms, followed by quantification
+    def combineQuantifyTerms(self, id1, id2, varList):
+        termA = self.getTerm(id1)
+        termB = self.getTerm(id2)
+        litList = [self.litMap[v] for v in varList]
+        clause = self.manager.buildClause(litList)
+        if self.deferred:
+            newTerm = termA.combineQuantifyDeferred(termB, clause)
+        else:
+            newTerm = termA.combineQuantify(termB, clause)
+        self.termCount += 1
+        self.recordStep('aq', [id1, id2], newTerm, varList)
+        vstring = " ".join(sorted([str(v) for v in varList]))
+        comment = "T%d (Node %s) & T%d (Node %s) EQuant(%s) --> T%d (Node %s)" % (id1, termA.root.label(), id2, termB.root.label(),
+                                                                                 vstring, self.termCount, newTerm.root.label())
+        self.prover.comment(comment)
+        if self.prover.fileOutput() and self.verbLevel >= 3:
+            self.writer.write("Combine and quantify: %s\n" % (comment))
+        self.activeIds[self.termCount] = newTerm
+        self.removeTerm(id1)
+        self.removeTerm(id2)
         if newTerm.root == self.manager.leaf0:
             if self.prover.fileOutput() and self.verbLevel >= 1:
                 self.writer.write("UNSAT\n")
             self.unsat = True
+            self.finalId = self.termCount
             self.manager.summarize()
             return -1
+        self.checkReorder()
         return self.termCount
 
     def quantifyTerm(self, id, varList):
         term = self.getTerm(id)
         litList = [self.litMap[v] for v in varList]
         clause = self.manager.buildClause(litList)
-        newTerm = term.quantify(clause, self.prover)
+        if self.deferred:
+            newTerm = term.quantifyDeferred(clause)
+        else:
+            newTerm = term.quantify(clause, self.prover)
         self.termCount += 1
+        self.recordStep('q', [id], newTerm, varList)
         vstring = " ".join(sorted([str(v) for v in varList]))
         comment = "T%d (Node %s) EQuant(%s) --> T%d (Node %s)" % (id, term.root.label(), vstring, self.termCount, newTerm.root.label())
         self.prover.comment(comment)
         self.activeIds[self.termCount] = newTerm
         self.removeTerm(id)
+        self.checkReorder()
         return self.termCount
 
+    # Record operation generating latest term, when justification deferred
+    def recordStep(self, operation, idList, newTerm, varList = None):
+        if not self.deferred:
+            return
+        alias = None
+        for id in idList:
+            if self.getTerm(id).root == newTerm.root:
+                alias = id
+                break
+        self.deferredSteps.append((self.termCount, operation, list(idList), varList, alias))
+
+    # Generate proof for steps recorded by another solver in deferred mode, starting from same input clauses.
+    # Only the operations leading to the term with id finalId are performed.
+    # A step whose result matches one of its operands requires only that operand, and no proof
+    def justifyDeferred(self, steps, finalId):
+        needed = set([finalId])
+        for (tid, operation, idList, varList, alias) in reversed(steps):
+            if tid in needed:
+                if alias is None:
+                    needed.update(idList)
+                else:
+                    needed.add(alias)
+        # Mapping from recorded term ids to ids in this solver
+        idMap = { id : id for id in self.inputIds.keys() }
+        # Input terms that aren't needed can be dropped
+        for id in list(self.activeIds.keys()):
+            if id not in needed:
+                self.removeTerm(id)
+        count = 0
+        for (tid, operation, idList, varList, alias) in steps:
+            if tid not in needed:
+                continue
+            if alias is not None:
+                idMap[tid] = idMap[alias]
+                continue
+            count += 1
+            ids = [idMap[id] for id in idList]
+            if operation == 'a':
+                nid = self.combineTermList(ids)
+            elif operation == 'aq':
+                nid = self.combineQuantifyTerms(ids[0], ids[1], varList)
+            else:
+                nid = self.quantifyTerm(ids[0], varList)
+            if nid < 0:
+                break
+            idMap[tid] = nid
+        if self.verbLevel >= 1:
+            self.writer.write("Deferred justification: performed %d of %d term operations\n" % (count, len(steps)))
+        return "unsatisfiable" if self.unsat else "failed"
+
+    # Reorder variables if triggered.  All nodes held by the solver must be in terms or the literal map
+    def checkReorder(self):
+        if not self.manager.checkReorder():
+            return
+        # Equation and constraint systems hold nodes that can't be remapped
+        if self.equationSystem is not None or self.constraintSystem is not None:
+            return
+        # Input terms that have been consumed, as well as literals, may have been collected.
+        # Manager ignores such nodes
+        terms = list(self.activeIds.values())
+        mapping, clauseList = self.manager.reorderVariables(self.rootGenerator() + list(self.litMap.values()))
+        if mapping is None:
+            return
+        for t in terms:
+            if t.root.isLeaf():
+                continue
+            (newRoot, implication) = mapping[t.root.id]
+            if newRoot != t.root:
+                comment = "Validation of %s after reordering" % newRoot.label()
+                t.validation = self.prover.createClause([newRoot.id], [t.validation, implication], comment)
+                t.root = newRoot
+                t.size = self.manager.getSize(newRoot)
+        for lit in self.litMap.keys():
+            if self.litMap[lit].id in mapping:
+                self.litMap[lit] = mapping[self.litMap[lit].id][0]
+        self.prover.deleteClauses(clauseList)
+
     def runNoSchedule(self):
         nid = 0
         while (len(self.activeIds) > 1):
@@ -595,13 +1240,17 @@ class Solver:
         self.modulus = modulus
         idStack = []
         lineCount = 0
-        for line in scheduler:
-            line = trim(line)
+        # Set when quantification has been performed by preceding conjunction
+        skipQuantify = False
+        for lineIndex in range(len(scheduler)):
+            line = trim(scheduler[lineIndex])
             lineCount += 1
             fields = line.split()
             if len(fields) == 0:
                 continue
             cmd = fields[0]
+            if self.report is not None:
+                self.report.nextItem('schedule', "#%d: %s" % (lineCount, line))
             if self.verbLevel >= 3:
                 self.writer.write("Processing schedule command #%d: %s\n" % (lineCount, line))
             if cmd == '#':
@@ -621,6 +1270,12 @@ class Solver:
                     else:
                         self.writer.write("Node %d.  Size = %d.%s\n" % (root.id, size, cstring))
                 continue
+            if (cmd[0] == '=' or cmd == '>=') and self.manager.refCounting:
+                raise SolverException("Line #%d.  Equations and constraints not supported with reference counting" % lineCount)
+            if (cmd[0] == '=' or cmd == '>=') and self.manager.reorderNext is not None:
+                raise SolverException("Line #%d.  Equations and constraints not supported with variable reordering" % lineCount)
+            if (cmd[0] == '=' or cmd == '>=') and self.deferred:
+                raise SolverException("Line #%d.  Equations and constraints not supported with deferred justification" % lineCount)
             if cmd[0] != '=' and cmd != '>=':
                 try:
                     values = [int(v) for v in fields[1:]]
@@ -633,17 +1288,34 @@ class Solver:
                 if count+1 > len(idStack):
                     raise SolverException("Line #%d.  Invalid conjunction count %d.  Only have %d on stack" %
                                           (lineCount, count, len(idStack)))
-                for i in range(count):
-                    id1 = idStack[-1]
-                    id2 = idStack[-2]
-                    idStack = idStack[:-2]
-                    nid = self.combineTerms(id1, id2)
+                operands = idStack[len(idStack)-count-1:]
+                idStack = idStack[:len(idStack)-count-1]
+                while len(operands) > 1:
+                    arity = self.conjunctionArity(len(operands))
+                    if self.pairing == 'fifo':
+                        # Combine topmost terms on stack
+                        idList = list(reversed(operands[-arity:]))
+                        operands = operands[:-arity]
+                    else:
+                        (idList, operands) = self.chooseTerms(operands, arity)
+                    varList = None
+                    if self.andExists and len(operands) == 0 and arity == 2:
+                        varList = self.followingQuantification(scheduler, lineIndex+1)
+                    if varList is None:
+                        nid = self.combineTermList(idList)
+                    else:
+                        nid = self.combineQuantifyTerms(idList[0], idList[1], varList)
+                        skipQuantify = True
                     if nid < 0:
                         # Hit unsat case
                         return "unsatisfiable"
                     else:
-                        idStack.append(nid)
+                        operands.append(nid)
+                idStack += operands
             elif cmd == 'q':
+                if skipQuantify:
+                    skipQuantify = False
+                    continue
                 if len(idStack) < 1:
                     raise SolverException("Line #%d.  Stack is empty" % (lineCount))
                 id = idStack[-1]
@@ -725,8 +1397,14 @@ class Solver:
                 raise SolverException("Line %d.  Unknown scheduler action '%s'" % (lineCount, cmd))
 
         # Reach end of scheduler
+        if self.report is not None:
+            self.report.endItem()
         if self.equationSystem is not None:
+            if self.report is not None:
+                self.report.start('PB solve')
             status = self.equationSystem.solve(nzLimit)
+            if self.report is not None:
+                self.report.stop('PB solve')
             if status == 'failed':
                 self.writer.write("FAILED.  Equation system could not be solved\n")
             elif status == 'unsolvable':
@@ -738,7 +1416,11 @@ class Solver:
                 self.writer.write("UNRESOLVED.  Equation solver indicates the formula may be SAT\n")
             return status
         elif self.constraintSystem is not None:
+            if self.report is not None:
+                self.report.start('PB solve')
             status = self.constraintSystem.solve(nzLimit)
+            if self.report is not None:
+                self.report.stop('PB solve')
             if status == 'failed':
                 self.writer.write("FAILED.  Constraint system could not be solved\n")
             elif status == 'unsolvable':
@@ -751,6 +1433,22 @@ class Solver:
                 self.constraintSystem.show()
             return status
         
+    # Find variables for quantification command immediately following position in schedule.
+    # Return None if there is no such command
+    def followingQuantification(self, scheduler, index):
+        while index < len(scheduler):
+            fields = scheduler[index].split()
+            index += 1
+            if len(fields) == 0 or fields[0] == '#':
+                continue
+            if fields[0] != 'q':
+                return None
+            try:
+                return [int(v) for v in fields[1:]]
+            except:
+                return None
+        return None
+
     def placeInBucket(self, buckets, id):
         term = self.activeIds[id]
         level = term.root.variable.level
@@ -768,18 +1466,28 @@ class Solver:
         for id in ids:
             self.placeInBucket(buckets, id)
         for blevel in range(0, maxLevel + 1):
+            if self.report is not None:
+                self.report.nextItem('bucket', "level %d" % blevel)
             if self.verbLevel >= 3:
                 self.writer.write("Working on bucket for level %d.  %d items\n" % (blevel, len(buckets[blevel])))
             # Conjunct all terms in bucket
+            termCount = len(buckets[blevel])
+            maxSize = 0
             while len(buckets[blevel]) > 1:
-                id1 = buckets[blevel][0]
-                id2 = buckets[blevel][1]
-                buckets[blevel] = buckets[blevel][2:]
-                newId = self.combineTerms(id1, id2)
+                arity = self.conjunctionArity(len(buckets[blevel]))
+                (idList, buckets[blevel]) = self.chooseTerms(buckets[blevel], arity)
+                if self.andExists and blevel > 0 and len(buckets[blevel]) == 0 and arity == 2:
+                    # Final conjunction in bucket.  Quantify top variable at same time
+                    vid = self.manager.variables[blevel-1].id
+                    newId = self.combineQuantifyTerms(idList[0], idList[1], [vid])
+                else:
+                    newId = self.combineTermList(idList)
                 if newId < 0:
                     # Hit unsat case
                     return "unsatisfiable"
+                maxSize = max(maxSize, self.termSize(newId))
                 self.placeInBucket(buckets, newId)
+            self.reportBucket("for level %d" % blevel, termCount, maxSize)
             # Quantify top variable for this bucket
             if blevel > 0 and len(buckets[blevel]) > 0:
                 id = buckets[blevel][0]
@@ -817,30 +1525,81 @@ class Solver:
         ids = sorted(self.activeIds.keys())
         for id in ids:
             self.placeInBucketPerm(buckets, id, bperm)
-        for bid in range(0, maxBid + 1):
+        if self.processBucketsPerm(buckets, range(0, maxBid + 1), bperm) is not None:
+            return "unsatisfiable"
+        if self.verbLevel >= 0:
+            self.writer.write("SAT\n")
+        return "satisfiable"
+
+    # Process listed buckets in order.  Results are placed in buckets according to bperm,
+    # and so those destined for other buckets are left there.
+    # Return "unsatisfiable" if hit unsat case, and None otherwise
+    def processBucketsPerm(self, buckets, bidList, bperm):
+        for bid in bidList:
             vid = 0 if bid == 0 else bperm.forward(bid)
+            if self.report is not None:
+                self.report.nextItem('bucket', "%d (variable Id %d)" % (bid, vid))
             if self.verbLevel >= 3:
                 self.writer.write("Working on bucket %d (variable Id %d).  %d items\n" % (bid, vid, len(buckets[bid])))
             # Conjunct all terms in bucket
+            termCount = len(buckets[bid])
+            maxSize = 0
             while len(buckets[bid]) > 1:
-                id1 = buckets[bid][0]
-                id2 = buckets[bid][1]
-                buckets[bid] = buckets[bid][2:]
-                newId = self.combineTerms(id1, id2)
+                arity = self.conjunctionArity(len(buckets[bid]))
+                (idList, buckets[bid]) = self.chooseTerms(buckets[bid], arity)
+                if self.andExists and bid > 0 and len(buckets[bid]) == 0 and arity == 2:
+                    # Final conjunction in bucket.  Quantify variable at same time
+                    newId = self.combineQuantifyTerms(idList[0], idList[1], [vid])
+                else:
+                    newId = self.combineTermList(idList)
                 if newId < 0:
                     # Hit unsat case
                     return "unsatisfiable"
+                maxSize = max(maxSize, self.termSize(newId))
                 self.placeInBucketPerm(buckets, newId, bperm)
+            self.reportBucket("%d (variable Id %d)" % (bid, vid), termCount, maxSize)
             # Quantify variable for this bucket
             if bid > 0 and len(buckets[bid]) > 0:
                 id = buckets[bid][0]
                 buckets[bid] = []
                 newId = self.quantifyTerm(id, [vid])
                 self.placeInBucketPerm(buckets, newId, bperm)
+        return None
+
+    # Bucket elimination, with independent subtrees of buckets processed by worker processes
+    def runBucketScheduleParallel(self, bperm, workerCount):
+        maxBid = len(self.manager.variables)
+        buckets = { bid : [] for bid in range(0, maxBid + 1) }
+        ids = sorted(self.activeIds.keys())
+        for id in ids:
+            self.placeInBucketPerm(buckets, id, bperm)
+        runner = parallel.ParallelBuckets(self, bperm, workerCount)
+        if runner.run(buckets) is not None:
+            if not self.unsat:
+                # Refutation found by worker
+                if self.prover.fileOutput() and self.verbLevel >= 1:
+                    self.writer.write("UNSAT\n")
+                self.unsat = True
+                self.manager.summarize()
+            return "unsatisfiable"
         if self.verbLevel >= 0:
             self.writer.write("SAT\n")
         return "satisfiable"
 
+    # Add term with root and validation generated elsewhere.  Return its id
+    def addTerm(self, root, validation):
+        self.termCount += 1
+        self.activeIds[self.termCount] = Term(self.manager, root, validation)
+        return self.termCount
+
+    # Set up forked worker process.  Proof steps go to segment file, and all other output is discarded
+    def becomeWorker(self, segmentName):
+        self.prover.redirect(segmentName)
+        self.writer = NullWriter()
+        self.prover.writer = self.writer
+        self.manager.writer = self.writer
+        self.report = None
+
     # Provide roots of active nodes to garbage collector
     def rootGenerator(self):
         ilist = sorted(self.activeIds.keys())
@@ -909,11 +1668,25 @@ def readScheduler(fname, writer = None):
         actionList.append(line)
     return actionList
 
+# Run solver according to choice of scheduling.  Return status
+def runSolver(solver, doBucket, bpermuter, scheduler, modulus, nzLimit, workerCount = None):
+    if workerCount is not None:
+        return solver.runBucketScheduleParallel(solver.permuter if doBucket else bpermuter, workerCount)
+    elif doBucket:
+        return solver.runBucketSchedule()
+    elif bpermuter is not None:
+        return solver.runBucketSchedulePerm(bpermuter)
+    elif scheduler is not None:
+        return solver.runSchedule(scheduler, modulus, nzLimit)
+    else:
+        return solver.runNoSchedule()
+
 # Time limit must be global variable.  0 = no limit
 timelimit = 0
 
 def ahandler(signum, frame):
     print("Program timed out after %d seconds" % timelimit)
+    stream.abortSinks()
     sys.exit(1)
 
 def setlimit(tlim):
@@ -936,13 +1709,123 @@ def run(name, args):
     logName = None
     modulus = pseudoboolean.modulusAuto
     nzLimit = None
-
-    optlist, args = getopt.getopt(args, "hbB:v:r:i:o:M:p:s:m:L:t:Z:")
+    iterative = False
+    cacheCapacity = None
+    cachePolicy = 'lru'
+    refCounting = False
+    gcTraceName = None
+    reorderMin = None
+    complementEdges = False
+    andExists = False
+    naryLimit = None
+    pairing = 'fifo'
+    background = None
+    compressLevel = None
+    trim = False
+    deferred = False
+    reportName = None
+    cache = False
+    permName = None
+    portfolioCount = None
+    orderNames = []
+    workerCount = None
+    orderMethod = None
+
+    optlist, args = getopt.getopt(args, "hIC:RG:D:EQN:P:W:z:TlJ:KX:j:O:bB:v:r:i:o:M:p:s:m:L:t:Z:")
     for (opt, val) in optlist:
         if opt == '-h':
             usage(name)
             return
-        if opt == '-b':
+        if opt == '-I':
+            iterative = True
+        elif opt == '-C':
+            fields = val.split(':')
+            try:
+                cacheCapacity = int(fields[0])
+            except:
+                sys.stderr.write("Invalid cache size '%s'\n" % fields[0])
+                return
+            if cacheCapacity < 1:
+                sys.stderr.write("Invalid cache size %d\n" % cacheCapacity)
+                return
+            if len(fields) > 1:
+                cachePolicy = fields[1]
+            if cachePolicy not in opcache.policies:
+                sys.stderr.write("Unknown cache policy '%s'\n" % cachePolicy)
+                return
+        elif opt == '-R':
+            refCounting = True
+        elif opt == '-G':
+            gcTraceName = val
+        elif opt == '-D':
+            reorderMin = int(val)
+        elif opt == '-E':
+            complementEdges = True
+        elif opt == '-Q':
+            andExists = True
+        elif opt == '-N':
+            naryLimit = int(val)
+            if naryLimit < 2:
+                sys.stderr.write("Invalid n-ary conjunction arity %d\n" % naryLimit)
+                return
+        elif opt == '-P':
+            pairing = val
+            if pairing not in pairingPolicies:
+                sys.stderr.write("Unknown pairing policy '%s'\n" % pairing)
+                return
+        elif opt == '-W':
+            try:
+                background = int(val)
+            except:
+                sys.stderr.write("Invalid writer queue depth '%s'\n" % val)
+                return
+            if background < 1:
+                sys.stderr.write("Invalid writer queue depth %d\n" % background)
+                return
+        elif opt == '-z':
+            try:
+                compressLevel = int(val)
+            except:
+                sys.stderr.write("Invalid compression level '%s'\n" % val)
+                return
+        elif opt == '-T':
+            trim = True
+        elif opt == '-l':
+            deferred = True
+        elif opt == '-J':
+            reportName = val
+        elif opt == '-K':
+            cache = True
+        elif opt == '-X':
+            fields = val.split(':')
+            try:
+                portfolioCount = int(fields[0])
+            except:
+                sys.stderr.write("Invalid number of portfolio workers '%s'\n" % fields[0])
+                return
+            if portfolioCount < 1:
+                sys.stderr.write("Invalid number of portfolio workers %d\n" % portfolioCount)
+                return
+            if len(fields) > 1:
+                orderNames = fields[1].split(',')
+            for oname in orderNames:
+                if readPermutation(oname) is None:
+                    return
+        elif opt == '-j':
+            try:
+                workerCount = int(val)
+            except:
+                sys.stderr.write("Invalid number of bucket workers '%s'\n" % val)
+                return
+            if workerCount < 1:
+                sys.stderr.write("Invalid number of bucket workers %d\n" % workerCount)
+                return
+        elif opt == '-O':
+            orderMethod = val
+            if orderMethod not in ordering.methods:
+                sys.stderr.write("Unknown ordering method '%s'\n" % orderMethod)
+                return
+        elif opt == '-b':
             doBucket = True
         elif opt == '-B':
             bpermuter = readPermutation(val)
@@ -958,7 +1841,7 @@ def run(name, args):
             setlimit(int(val))
         elif opt == '-o':
             proofName = val
-            extension = proofName.split('.')[-1]
+            extension = stream.splitCompression(proofName)[0].split('.')[-1]
             if extension == 'lrat' or extension == 'lratb':
                 doLrat = True
                 doBinary = extension[-1] == 'b'
@@ -970,6 +1853,7 @@ def run(name, args):
             elif val == 't':
                 doLrat = True
         elif opt == '-p':
+            permName = val
             permuter = readPermutation(val)
             if permuter is None:
                 return
@@ -995,36 +1879,118 @@ def run(name, args):
 
     writer = stream.Logger(logName)
 
+    if compressLevel is not None:
+        suffix = None if proofName is None else stream.splitCompression(proofName)[1]
+        if suffix is None:
+            writer.write("Compression level requires proof file ending in .gz, .xz, or .bz2\n")
+            return
+        (minLevel, maxLevel) = stream.compressionLevels[suffix]
+        if compressLevel < minLevel or compressLevel > maxLevel:
+            writer.write("Invalid compression level %d for .%s file.  Must be between %d and %d\n" % (compressLevel, suffix, minLevel, maxLevel))
+            return
+
     if (doBucket or bpermuter is not None) and scheduler is not None:
         writer.write("Cannot have both bucket scheduling and defined scheduler\n")
         return
     if (doBucket and bpermuter is not None):
         writer.write("Cannot do bucket scheduling on levels and with defined permutation\n")
         return
+    if reorderMin is not None and (doBucket or refCounting or complementEdges):
+        writer.write("Cannot combine variable reordering with bucket scheduling on levels, reference counting, or complement edges\n")
+        return
+    if reorderMin is not None and deferred:
+        writer.write("Cannot combine variable reordering with deferred justification\n")
+        return
+
+    if orderMethod is not None:
+        orderMethod = ordering.chooseMethod(orderMethod, doBucket)
+
+    if workerCount is not None:
+        if not doBucket and bpermuter is None:
+            writer.write("Parallel buckets require bucket scheduling (-b or -B)\n")
+            return
+        if not doLrat:
+            writer.write("Parallel buckets require LRAT proof\n")
+            return
+        if refCounting or complementEdges or reorderMin is not None or trim or deferred or portfolioCount is not None:
+            writer.write("Cannot combine parallel buckets with -R, -E, -D, -T, -l, or -X\n")
+            return
+
+    if portfolioCount is not None:
+        if cnfName is None or proofName is None:
+            writer.write("Portfolio requires CNF file (-i) and proof file (-o)\n")
+            return
+        if reportName is not None or gcTraceName is not None:
+            writer.write("Cannot combine portfolio with run report or GC trace\n")
+            return
+        # Workers get the same options, except for those set by the portfolio
+        workerArgs = []
+        for (opt, val) in optlist:
+            if opt not in ['-X', '-p', '-O', '-o', '-L']:
+                workerArgs += [opt] if val == '' else [opt, val]
+        try:
+            nvar = CnfReader(cnfName, verbLevel = 0, cache = cache).nvar
+            pf = portfolio.Portfolio(run, name, workerArgs, proofName, writer, verbLevel)
+        except Exception as ex:
+            writer.write("Aborted: %s\n" % str(ex))
+            return
+        status = pf.run(portfolioCount, permName, orderNames, nvar, orderMethod)
+        writer.close()
+        return status
 
     try:
-        prover = Prover(proofName, writer = writer, verbLevel = verbLevel, doLrat = doLrat, doBinary = doBinary)
+        prover = Prover(proofName, writer = writer, verbLevel = verbLevel, doLrat = doLrat, doBinary = doBinary,
+                        background = background, compressLevel = compressLevel, trim = trim)
     except Exception as ex:
         writer.write("Couldn't create prover (%s)\n" % str(ex))
         return
 
+    report = None if reportName is None else runreport.RunReport()
     start = datetime.datetime.now()
-    solver = Solver(cnfName, prover = prover, permuter = permuter, verbLevel = verbLevel)
-    if doBucket:
-        status = solver.runBucketSchedule()
-    elif bpermuter is not None:
-        status = solver.runBucketSchedulePerm(bpermuter)
-    elif scheduler is not None:
-        status = solver.runSchedule(scheduler, modulus, nzLimit)
+    options = { 'permuter' : permuter, 'verbLevel' : verbLevel,
+                'iterative' : iterative,
+                'cacheCapacity' : cacheCapacity, 'cachePolicy' : cachePolicy,
+                'refCounting' : refCounting, 'traceGC' : gcTraceName is not None,
+                'reorderMin' : reorderMin, 'complementEdges' : complementEdges, 'andExists' : andExists,
+                'naryLimit' : naryLimit, 'pairing' : pairing, 'report' : report, 'cache' : cache,
+                'orderMethod' : orderMethod }
+    if deferred:
+        # First pass generates no proof
+        recorder = Solver(cnfName, prover = Prover("", writer = writer, verbLevel = verbLevel, doLrat = True), deferred = True, **options)
+        status = runSolver(recorder, doBucket, bpermuter, scheduler, modulus, nzLimit)
+        # Justification must use the same ordering
+        options['permuter'] = recorder.permuter
+        solver = Solver(cnfName, prover = prover, **options)
+        if recorder.unsat:
+            if report is not None:
+                report.nextItem('justify', "%d recorded operations" % len(recorder.deferredSteps))
+            status = solver.justifyDeferred(recorder.deferredSteps, recorder.finalId)
     else:
-        status = solver.runNoSchedule()
+        solver = Solver(cnfName, prover = prover, **options)
+        status = runSolver(solver, doBucket, bpermuter, scheduler, modulus, nzLimit, workerCount)
 
     delta = datetime.datetime.now() - start
     seconds = delta.seconds + 1e-6 * delta.microseconds
     if verbLevel > 0:
         writer.write("Elapsed time for SAT: %.2f seconds (status = %s)\n" % (seconds, str(status).upper()))
+    if gcTraceName is not None:
+        try:
+            solver.manager.writeGcTrace(gcTraceName)
+        except Exception as ex:
+            writer.write("Couldn't write GC trace: %s\n" % str(ex))
+    prover.close()
+    if report is not None:
+        report.collect(solver.manager, prover)
+        report.info['status'] = str(status)
+        try:
+            report.write(reportName)
+        except Exception as ex:
+            writer.write("Couldn't write run report: %s\n" % str(ex))
     if writer != sys.stderr:
         writer.close()
+    if status is None and solver.unsat:
+        status = "unsatisfiable"
+    return status
     
 if __name__ == "__main__":
     run(sys.argv[0], sys.argv[1:])
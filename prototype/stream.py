@@ -23,6 +23,18 @@
 
 import binascii
 import sys
+import threading
+import queue
+import gzip
+import lzma
+import bz2
+import array
+
+# NumPy is optional.  Used for batch encoding and decoding when available
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class Logger:
     outFile = None
@@ -46,13 +58,95 @@ class Logger:
             self.outFile.close()
 
 
+# Batch encoding and decoding of integer arrays, using format of pcaas/encoding.txt:
+# Integer x mapped to unsigned u = 2x (x >= 0) or -2x+1 (x < 0),
+# and then u represented by 7-bit words, least significant first,
+# with the MSB of each byte set for all but the last
+
+# Encode list or array of integers.  Return bytes
+def encodeIntegers(ilist):
+    if numpy is not None and len(ilist) >= 64:
+        return encodeIntegersNumpy(ilist)
+    return encodeIntegersPython(ilist)
+
+# Encode into single bytearray, one integer at a time.
+# Faster than looking up encodings in tables and joining them
+def encodeIntegersPython(ilist):
+    result = bytearray()
+    append = result.append
+    for x in ilist:
+        u = 2*x if x >= 0 else 2*(-x) + 1
+        while u >= 128:
+            append((u & 0x7F) + 128)
+            u = u >> 7
+        append(u)
+    return bytes(result)
+
+def encodeIntegersNumpy(ilist):
+    x = numpy.asarray(ilist, dtype = numpy.int64)
+    # Mapping to unsigned must not overflow
+    if numpy.abs(x).max() >= 1 << 62:
+        return encodeIntegersPython(ilist)
+    u = numpy.where(x >= 0, 2*x, -2*x + 1).astype(numpy.uint64)
+    # Number of bytes for each value
+    counts = numpy.ones(len(u), dtype = numpy.int64)
+    shifted = u >> numpy.uint64(7)
+    while shifted.any():
+        counts += shifted > 0
+        shifted = shifted >> numpy.uint64(7)
+    ends = numpy.cumsum(counts)
+    starts = ends - counts
+    result = numpy.empty(int(ends[-1]), dtype = numpy.uint8)
+    for k in range(int(counts.max())):
+        active = counts > k
+        words = (u[active] >> numpy.uint64(7*k)) & numpy.uint64(0x7F)
+        more = (counts[active] > k+1).astype(numpy.uint64) << numpy.uint64(7)
+        result[starts[active] + k] = words | more
+    return result.tobytes()
+
+# Decode bytes (or bytearray) into list of integers
+def decodeIntegers(data):
+    if numpy is not None and len(data) >= 64:
+        return decodeIntegersNumpy(data)
+    return decodeIntegersPython(data)
+
+def decodeIntegersPython(data):
+    result = []
+    weight = 0
+    u = 0
+    for b in data:
+        if b < 128:
+            u += b << weight
+            result.append(u//2 if u & 0x1 == 0 else -(u//2))
+            weight = 0
+            u = 0
+        else:
+            u += (b & 0x7F) << weight
+            weight += 7
+    return result
+
+def decodeIntegersNumpy(data):
+    b = numpy.frombuffer(bytes(data), dtype = numpy.uint8)
+    last = b < 128
+    ends = numpy.nonzero(last)[0]
+    if len(ends) == 0:
+        return []
+    b = b[:ends[-1]+1]
+    starts = numpy.concatenate(([0], ends[:-1] + 1))
+    # Position of each byte within its encoding
+    group = numpy.cumsum(last[:len(b)]) - last[:len(b)]
+    offsets = numpy.arange(len(b)) - starts[group]
+    words = (b & 0x7F).astype(numpy.uint64) << (numpy.uint64(7) * offsets.astype(numpy.uint64))
+    u = numpy.bitwise_or.reduceat(words, starts)
+    x = numpy.where(u & numpy.uint64(1) == 0, (u >> numpy.uint64(1)).astype(numpy.int64),
+                    -(u >> numpy.uint64(1)).astype(numpy.int64))
+    return x.tolist()
+
 class CompressArray:
     bytes = None
 
     def __init__(self, ilist = []):
-        self.bytes = bytearray([])
-        for x in ilist:
-            self.append(x)
+        self.bytes = bytearray(encodeIntegers(ilist))
 
     def append(self, x):
         u = 2*x if x >= 0 else 2*(-x) + 1
@@ -63,20 +157,7 @@ class CompressArray:
         self.bytes.append(u)
         
     def toList(self):
-        result = []
-        weight = 0
-        u = 0
-        for b in self.bytes:
-            ab = b & 0x7F;
-            u += ab << weight
-            if b < 128:
-                x = u//2 if u & 0x1 == 0 else -u//2
-                result.append(x)
-                weight = 0
-                u = 0
-            else:
-                weight += 7
-        return result
+        return decodeIntegers(self.bytes)
         
     def hexify(self):
         return str(binascii.hexlify(self.bytes))
@@ -88,3 +169,318 @@ class CompressArray:
         return len(self.bytes)
 
     
+
+# Buffered output for proof files.
+# Text and binary (compressed) encodings of integer lists are written directly into a
+# preallocated buffer, which is written to the file once it reaches the flush size.
+# Flush size 0 writes each record as soon as it is complete
+class ProofSink:
+    file = None
+    buffer = None
+    length = 0
+    flushSize = 0
+    # Integers awaiting compressed encoding, which is performed in batches
+    pending = None
+    encodeBatch = 4096
+    # Statistics
+    flushCount = 0
+    bytesWritten = 0
+
+    def __init__(self, file, flushSize = 1 << 20):
+        self.file = file
+        self.flushSize = flushSize
+        self.buffer = bytearray(flushSize + 4096)
+        self.length = 0
+        self.pending = array.array('q')
+        self.flushCount = 0
+        self.bytesWritten = 0
+
+    # Make sure buffer has room for count more bytes
+    def reserve(self, count):
+        if self.length + count > len(self.buffer):
+            self.buffer.extend(bytearray(self.length + count - len(self.buffer)))
+
+    def endRecord(self):
+        if self.length >= self.flushSize:
+            self.flush()
+
+    def writeBytes(self, data):
+        if len(self.pending) > 0:
+            self.encodePending()
+        count = len(data)
+        self.reserve(count)
+        self.buffer[self.length:self.length+count] = data
+        self.length += count
+        self.endRecord()
+
+    def writeText(self, text):
+        self.writeBytes(text.encode('ascii'))
+
+    # Write values as line of text, separated by spaces
+    def writeLine(self, ilist):
+        self.writeText(" ".join([str(i) for i in ilist]) + '\n')
+
+    # Write values using same encoding as CompressArray
+    def writeCompressed(self, ilist):
+        self.pending.extend(ilist)
+        if len(self.pending) >= self.encodeBatch or self.flushSize == 0:
+            self.encodePending()
+
+    def encodePending(self):
+        data = encodeIntegers(self.pending)
+        self.pending = array.array('q')
+        self.writeBytes(data)
+
+    def flush(self):
+        if len(self.pending) > 0:
+            self.encodePending()
+        if self.length == 0:
+            return
+        with memoryview(self.buffer) as view:
+            self.file.write(view[:self.length])
+        self.bytesWritten += self.length
+        self.flushCount += 1
+        self.length = 0
+
+    def close(self):
+        self.flush()
+
+# Sinks with writer threads that are still running.
+# Used to shut them down when the program must exit
+activeSinks = []
+
+# Put item in bounded queue read by writer's thread.
+# Waits while the queue is full, but gives up if the thread has died (e.g., disk full),
+# raising the error it encountered
+def putChecked(q, item, writer, timeout = 0.1):
+    while True:
+        try:
+            q.put(item, timeout = timeout)
+            return
+        except queue.Full:
+            if writer.error is not None:
+                raise writer.error
+            if not writer.thread.is_alive():
+                raise OSError("Writer thread stopped")
+
+# Proof sink that performs encoding and output in a separate thread.
+# Records are passed to the thread in batches via a bounded queue.
+# When the queue is full, the solver blocks until the writer catches up
+class BackgroundSink:
+    sink = None
+    queue = None
+    thread = None
+    batch = []
+    batchSize = 256
+    # Set when writer thread should stop as soon as possible
+    abortEvent = None
+    # Exception raised by writer thread
+    error = None
+    # Statistics
+    batchCount = 0
+    stallCount = 0
+
+    def __init__(self, file, flushSize = 1 << 20, depth = 64, batchSize = 256):
+        self.sink = ProofSink(file, flushSize)
+        self.queue = queue.Queue(maxsize = depth)
+        self.batch = []
+        self.batchSize = batchSize
+        self.abortEvent = threading.Event()
+        self.error = None
+        self.batchCount = 0
+        self.stallCount = 0
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+        activeSinks.append(self)
+
+    # Writer thread.  Batch of None indicates end of output
+    def run(self):
+        try:
+            while not self.abortEvent.is_set():
+                try:
+                    batch = self.queue.get(timeout = 0.1)
+                except queue.Empty:
+                    continue
+                if batch is None:
+                    break
+                self.process(batch)
+            # Write whatever is already queued when aborting
+            while self.abortEvent.is_set():
+                try:
+                    batch = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if batch is None:
+                    break
+                self.process(batch)
+            self.sink.flush()
+        except Exception as ex:
+            self.error = ex
+
+    def process(self, batch):
+        for (fun, arg) in batch:
+            fun(arg)
+
+    def checkError(self):
+        if self.error is not None:
+            raise self.error
+
+    # Pass batch to writer thread, blocking when queue is full
+    def send(self):
+        self.checkError()
+        if self.queue.full():
+            self.stallCount += 1
+        putChecked(self.queue, self.batch, self)
+        self.batchCount += 1
+        self.batch = []
+
+    def add(self, fun, arg):
+        self.batch.append((fun, arg))
+        if len(self.batch) >= self.batchSize:
+            self.send()
+
+    def writeBytes(self, data):
+        self.add(self.sink.writeBytes, data)
+
+    def writeText(self, text):
+        self.add(self.sink.writeText, text)
+
+    def writeLine(self, ilist):
+        self.add(self.sink.writeLine, ilist)
+
+    def writeCompressed(self, ilist):
+        self.add(self.sink.writeCompressed, ilist)
+
+    # Records are written once writer thread gets to them
+    def flush(self):
+        if len(self.batch) > 0:
+            self.send()
+
+    # Write all records and stop writer thread
+    def close(self):
+        if self.thread is None:
+            return
+        try:
+            self.flush()
+            putChecked(self.queue, None, self)
+            self.thread.join()
+        finally:
+            self.thread = None
+            activeSinks.remove(self)
+        self.checkError()
+
+    # Stop writer thread without blocking indefinitely.
+    # Safe to call from signal handler, since it does not touch the queue
+    def abort(self, timeout = 5.0):
+        if self.thread is None:
+            return
+        self.abortEvent.set()
+        self.thread.join(timeout)
+        self.thread = None
+        activeSinks.remove(self)
+
+# Stop all writer threads, most recently created first, since those may write to older ones.
+# Called when program must exit
+def abortSinks(timeout = 5.0):
+    for sink in reversed(list(activeSinks)):
+        sink.abort(timeout)
+
+# Compressed output.  Mapping from file suffix to function that opens compressed file
+# for binary writing with specified level (None = library default)
+compressors = {
+    'gz'  : lambda fname, level : gzip.open(fname, 'wb') if level is None else gzip.open(fname, 'wb', compresslevel = level),
+    'xz'  : lambda fname, level : lzma.open(fname, 'wb', preset = level),
+    'bz2' : lambda fname, level : bz2.open(fname, 'wb') if level is None else bz2.open(fname, 'wb', compresslevel = level),
+}
+
+# Range of compression levels accepted by each compressor
+compressionLevels = {
+    'gz'  : (1, 9),
+    'xz'  : (0, 9),
+    'bz2' : (1, 9),
+}
+
+# Split file name into base name and compression suffix (None if not compressed)
+def splitCompression(fname):
+    fields = fname.split('.')
+    if len(fields) > 1 and fields[-1] in compressors:
+        return ('.'.join(fields[:-1]), fields[-1])
+    return (fname, None)
+
+# Open file for binary output.  Compressed files are written by dedicated thread
+def openOutput(fname, level = None):
+    (base, suffix) = splitCompression(fname)
+    if suffix is None:
+        return open(fname, 'wb')
+    return ThreadedWriter(compressors[suffix](fname, level))
+
+# File-like object that hands data to separate thread for writing.
+# Used for compressed files, so that compression runs off the solver's critical path.
+# Writes block when the queue is full
+class ThreadedWriter:
+    file = None
+    queue = None
+    thread = None
+    abortEvent = None
+    error = None
+
+    def __init__(self, file, depth = 8):
+        self.file = file
+        self.queue = queue.Queue(maxsize = depth)
+        self.abortEvent = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+        activeSinks.append(self)
+
+    # Writer thread.  Data of None indicates end of output
+    def run(self):
+        try:
+            while not self.abortEvent.is_set():
+                try:
+                    data = self.queue.get(timeout = 0.1)
+                except queue.Empty:
+                    continue
+                if data is None:
+                    break
+                self.file.write(data)
+            # Write whatever is already queued when aborting
+            while self.abortEvent.is_set():
+                try:
+                    data = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if data is None:
+                    break
+                self.file.write(data)
+            self.file.close()
+        except Exception as ex:
+            self.error = ex
+
+    def write(self, data):
+        if self.error is not None:
+            raise self.error
+        # Caller may reuse its buffer
+        putChecked(self.queue, bytes(data), self)
+
+    # Write all data, stop thread, and close file
+    def close(self):
+        if self.thread is None:
+            return
+        try:
+            putChecked(self.queue, None, self)
+            self.thread.join()
+        finally:
+            self.thread = None
+            activeSinks.remove(self)
+        if self.error is not None:
+            raise self.error
+
+    # Stop thread without blocking indefinitely.  File is closed so that data written so far can be recovered
+    def abort(self, timeout = 5.0):
+        if self.thread is None:
+            return
+        self.abortEvent.set()
+        self.thread.join(timeout)
+        self.thread = None
+        activeSinks.remove(self)
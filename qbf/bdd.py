@@ -152,7 +152,8 @@ class VariableNode(Node):
     inferTrueDown = None
     inferFalseDown = None
     
-    def __init__(self, id, variable, high, low, prover):
+    # Defining clauses are generated, unless their ids are supplied
+    def __init__(self, id, variable, high, low, prover, inferIds = None):
         Node.__init__(self, id, variable)
         self.high = high
         self.low = low
@@ -164,6 +165,10 @@ class VariableNode(Node):
         hid = self.high.id
         lid = self.low.id
 
+        if inferIds is not None:
+            (self.inferTrueUp, self.inferFalseUp, self.inferTrueDown, self.inferFalseDown) = inferIds
+            return
+
         if prover.mode == proof.ProverMode.noProof:
             self.inferTrueUp = None
             self.inferTrueDown = None
@@ -252,6 +257,7 @@ class Manager:
     cacheRemoved = 0
     nodesRemoved = 0
     gcCount = 0
+    nodesMapped = 0
 
     def __init__(self, prover = None, rootGenerator = None, nextNodeId = 0, verbLevel = 1):
         self.verbLevel = verbLevel
@@ -280,6 +286,7 @@ class Manager:
         self.cacheRemoved = 0
         self.nodesRemoved = 0
         self.gcCount = 0
+        self.nodesMapped = 0
 
     def newVariable(self, qlevel, name, id = None, existential = False):
         level = len(self.variables) + 1
@@ -301,7 +308,91 @@ class Manager:
             self.nodeCount += 1
             self.maxLiveCount = max(self.maxLiveCount, len(self.uniqueTable))
             return node
-  
+
+    # Nodes reachable from roots having ids >= firstId, with children listed before parents.
+    # Each given as tuple (id, level, high id, low id, ids of defining clauses)
+    def exportNodes(self, roots, firstId):
+        result = []
+        visited = set([])
+        stack = [(r, False) for r in roots if not r.isLeaf() and r.id >= firstId]
+        while len(stack) > 0:
+            (node, expanded) = stack.pop()
+            if node.id in visited:
+                continue
+            if expanded:
+                visited.add(node.id)
+                inferIds = (node.inferTrueUp, node.inferFalseUp, node.inferTrueDown, node.inferFalseDown)
+                result.append((node.id, node.variable.level, node.high.id, node.low.id, inferIds))
+                continue
+            stack.append((node, True))
+            for child in [node.low, node.high]:
+                if not child.isLeaf() and child.id >= firstId and child.id not in visited:
+                    stack.append((child, False))
+        return result
+
+    # Add nodes exported by another manager, whose defining clauses are already in the proof.
+    # nodeMap maps ids to existing nodes and is extended with the new ones.
+    # A node with the same key as an existing one, or having a child that was mapped
+    # onto a different node, is mapped onto the node found or made with the mapped children,
+    # with a proof that the imported node implies it.
+    # Return (implications, clauseList).  Implications maps the id of each such node
+    # to the id of the clause asserting the implication.
+    # Clauses in clauseList, as well as the implications, should be deleted
+    # once the driver has converted any validations that mention the mapped nodes
+    def importNodes(self, exported, nodeMap):
+        implications = {}
+        clauseList = []
+        generateClauses = self.prover.mode != proof.ProverMode.noProof
+        # Imported nodes that were mapped onto other nodes
+        mapped = {}
+        for (id, level, highId, lowId, inferIds) in exported:
+            variable = self.variables[level-1]
+            (high, low) = (nodeMap[highId], nodeMap[lowId])
+            key = (level, high.id, low.id)
+            if highId not in mapped and lowId not in mapped and key not in self.uniqueTable:
+                node = VariableNode(id, variable, high, low, self.prover, inferIds)
+                self.prover.idToQlevel[id] = node.qlevel
+                self.uniqueTable[key] = node
+                nodeMap[id] = node
+                self.nodeCount += 1
+                continue
+            node = VariableNode(id, variable, mapped.get(highId, high), mapped.get(lowId, low), self.prover, inferIds)
+            self.prover.idToQlevel[id] = node.qlevel
+            newNode = self.findOrMake(variable, high, low)
+            if generateClauses:
+                (implyHigh, implyLow) = (implications.get(highId, resolver.tautologyId), implications.get(lowId, resolver.tautologyId))
+                (highImply, lowImply) = self.importImplication(node, newNode, implyHigh, implyLow)
+                clist = [node.inferTrueUp, node.inferFalseUp, node.inferTrueDown, node.inferFalseDown, highImply]
+                clauseList += [c for c in clist if abs(c) != resolver.tautologyId]
+                implications[id] = lowImply
+            mapped[id] = node
+            nodeMap[id] = newNode
+            self.nodesMapped += 1
+        self.maxLiveCount = max(self.maxLiveCount, len(self.uniqueTable))
+        return (implications, clauseList)
+
+    # Prove that imported node implies node with the same variable and mapped children,
+    # given clauses asserting that each child implies its mapped version.
+    # Antecedents are listed in reverse order of resolution steps.
+    # Return ids of clauses for case when variable is true, and for the full implication
+    def importImplication(self, node, newNode, implyHigh, implyLow):
+        vid = node.variable.id
+        antecedents = [node.inferTrueDown, implyHigh, newNode.inferTrueUp]
+        antecedents = [a for a in antecedents if abs(a) != resolver.tautologyId]
+        comment = "Justification that imported %s ==> %s when %d is true" % (node.label(), newNode.label(), vid)
+        highId = self.prover.proveAddResolution([-vid, -node.id, newNode.id], antecedents, comment)
+        antecedents = [highId, node.inferFalseDown, implyLow, newNode.inferFalseUp]
+        antecedents = [a for a in antecedents if abs(a) != resolver.tautologyId]
+        lowId = self.prover.proveAddResolution([-node.id, newNode.id], antecedents)
+        return (highId, lowId)
+
+    # Mapping from id to node, for all nodes in unique table and the leaves
+    def nodeMap(self):
+        result = { node.id : node for node in self.uniqueTable.values() }
+        result[self.leaf0.id] = self.leaf0
+        result[self.leaf1.id] = self.leaf1
+        return result
+
     def literal(self, variable, phase):
         if phase == 1:
             return self.findOrMake(variable, self.leaf1, self.leaf0)
@@ -0,0 +1,351 @@
+# Parallel bucket elimination over quantifier levels
+# Terms in different subtrees of the elimination tree of quantifier levels have disjoint support
+# until their results reach a common ancestor.  Such subtrees are processed
+# by worker processes, forked once the input terms have been constructed.
+# Each worker writes its proof steps to a separate segment file.
+# The parent then merges the segments into its own proof, renumbering clause ids
+# and extension variables so that the ranges used by the workers don't overlap,
+# imports the BDDs of the workers' results, and processes the remaining levels.
+
+#####################################################################################
+# Copyright (c) 2021 Marijn Heule, Randal E. Bryant, Carnegie Mellon University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or
+# substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT
+# NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT
+# OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+########################################################################################
+
+import os
+import shutil
+import tempfile
+import multiprocessing
+
+import resolver
+
+class ParallelException(Exception):
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return "Parallel Exception: " + str(self.value)
+
+# Compute elimination tree of quantifier levels.
+# Levels are processed from the highest downward.
+# supports maps each level to the set of levels of the variables in the supports of its terms.
+# The result for a level goes to the highest of these levels below it.
+# Return mapping from level to parent level, or to None for the root of a tree
+def eliminationTree(supports, levels):
+    parents = {}
+    for level in sorted(levels, key = lambda x : -x):
+        support = supports[level]
+        support.discard(level)
+        if len(support) == 0:
+            parents[level] = None
+        else:
+            parent = max(support)
+            parents[level] = parent
+            supports[parent] |= support
+    return parents
+
+# Divide levels among workers.
+# Repeatedly split the heaviest subtree into those of its children,
+# until no subtree is more than a 1/workerCount share of the total weight.
+# Subtrees are then assigned to workers, heaviest first, to balance weight.
+# Return list of level lists, one per worker, each in processing order
+def chooseSubtrees(parents, weights, workerCount):
+    children = { level : [] for level in parents.keys() }
+    for level in parents.keys():
+        if parents[level] is not None:
+            children[parents[level]].append(level)
+    # Total weight of subtree.  Children are at higher levels than their parents
+    treeWeights = {}
+    for level in sorted(parents.keys(), key = lambda x : -x):
+        treeWeights[level] = weights[level] + sum([treeWeights[c] for c in children[level]])
+    candidates = [level for level in parents.keys() if parents[level] is None]
+    total = sum([treeWeights[level] for level in candidates])
+    while len(candidates) > 0:
+        heaviest = max(candidates, key = lambda level: treeWeights[level])
+        if treeWeights[heaviest] * workerCount <= total:
+            break
+        # Splitting a chain of single-child levels gains no parallelism.
+        # Splice through it to the first level with multiple children
+        split = heaviest
+        while len(children[split]) == 1:
+            split = children[split][0]
+        if len(children[split]) == 0:
+            break
+        candidates.remove(heaviest)
+        candidates += children[split]
+    candidates = sorted([level for level in candidates if treeWeights[level] > 0], key = lambda level: -treeWeights[level])
+    loads = [0] * workerCount
+    assignments = [[] for w in range(workerCount)]
+    for root in candidates:
+        w = loads.index(min(loads))
+        loads[w] += treeWeights[root]
+        stack = [root]
+        while len(stack) > 0:
+            level = stack.pop()
+            assignments[w].append(level)
+            stack += children[level]
+    return [sorted(levels, key = lambda x : -x) for levels in assignments if len(levels) > 0]
+
+# Run in worker process.  Process levels, with proof going to segment file.
+# Report results, consisting of status, the terms destined for other levels,
+# the nodes of these terms, and the ranges of clause ids and node ids used
+def runWorker(solver, buckets, levelList, segmentName, index, results):
+    try:
+        firstNodeId = solver.manager.nextNodeId
+        firstTermId = solver.termCount + 1
+        solver.becomeWorker(segmentName)
+        status = "false" if solver.processQuantBuckets(buckets, levelList) is False else None
+        levelSet = set(levelList)
+        terms = []
+        for level in buckets.keys():
+            if level not in levelSet:
+                for id in buckets[level]:
+                    if id >= firstTermId:
+                        term = solver.activeIds[id]
+                        terms.append((term.root.id, term.validation))
+        nodes = solver.manager.exportNodes([solver.activeIds[id].root for id in solver.activeIds.keys() if id >= firstTermId], firstNodeId)
+        solver.prover.close()
+        results.put((index, status, terms, nodes, solver.prover.clauseCount, solver.manager.nextNodeId))
+    except BaseException as ex:
+        results.put((index, "failed (%s)" % str(ex), [], [], 0, 0))
+
+# Proof segment written by worker, with information required to merge it into parent proof
+class Segment:
+    index = 0
+    fname = None
+    status = None
+    # Pairs (root id, validation clause id) for terms produced by worker
+    terms = []
+    # Nodes of these terms, as exported by manager
+    nodes = []
+    # Ranges of ids used by worker
+    clauseCount = 0
+    nextNodeId = 0
+    # Amounts to add to clause ids and node ids created by worker
+    clauseShift = 0
+    nodeShift = 0
+
+    def __init__(self, index, fname, status, terms, nodes, clauseCount, nextNodeId):
+        self.index = index
+        self.fname = fname
+        self.status = status
+        self.terms = terms
+        self.nodes = nodes
+        self.clauseCount = clauseCount
+        self.nextNodeId = nextNodeId
+        self.clauseShift = 0
+        self.nodeShift = 0
+
+class ParallelBuckets:
+    solver = None
+    workerCount = 1
+    verbLevel = 1
+    writer = None
+    tempDir = None
+    # Mapping from input variable to its quantifier level
+    varLevels = {}
+    # Ids following those used by parent when workers were forked
+    firstClauseId = 0
+    firstNodeId = 0
+
+    def __init__(self, solver, workerCount):
+        self.solver = solver
+        self.workerCount = workerCount
+        self.verbLevel = solver.verbLevel
+        self.writer = solver.writer
+        self.tempDir = None
+        self.varLevels = {}
+        for (qlevel, (vars, isExistential)) in solver.quantMap.items():
+            for v in vars:
+                self.varLevels[v] = qlevel
+
+    # Assign levels to workers.  Return list of level lists, one per worker
+    def partition(self, buckets, levels):
+        supports = { level : set([]) for level in levels }
+        weights = { level : len(buckets[level]) for level in levels }
+        for level in levels:
+            for id in buckets[level]:
+                root = self.solver.activeIds[id].root
+                for vid in self.solver.manager.getSupportIds(root):
+                    supports[level].add(self.varLevels[vid])
+        parents = eliminationTree(supports, levels)
+        return chooseSubtrees(parents, weights, self.workerCount)
+
+    # Run bucket elimination over levels.  Return False if formula found to be False and None otherwise
+    def run(self, buckets, levels):
+        solver = self.solver
+        assignments = self.partition(buckets, levels)
+        if len(assignments) < 2:
+            if self.verbLevel >= 1:
+                self.writer.write("Parallel buckets: fewer than 2 subtrees available.  Running sequentially\n")
+            return solver.processQuantBuckets(buckets, levels)
+        if self.verbLevel >= 1:
+            inputCount = sum([len(buckets[level]) for level in levels])
+            workerCount = sum([len(buckets[level]) for assigned in assignments for level in assigned])
+            self.writer.write("Parallel buckets: %d workers handling %d of %d levels, containing %d of %d input terms\n" %
+                              (len(assignments), sum([len(assigned) for assigned in assignments]), len(levels), workerCount, inputCount))
+        try:
+            self.tempDir = tempfile.mkdtemp(prefix = "qbuckets-")
+        except OSError as ex:
+            raise ParallelException("Couldn't create directory for proof segments (%s)" % str(ex))
+        try:
+            segments = self.runWorkers(buckets, assignments)
+            falseSegments = [seg for seg in segments if seg.status == "false"]
+            if len(falseSegments) > 0:
+                # Proof of first refutation is sufficient
+                self.merge(falseSegments[:1])
+                return False
+            self.merge(segments)
+        finally:
+            shutil.rmtree(self.tempDir, ignore_errors = True)
+        self.importResults(segments, buckets, assignments)
+        assigned = set([level for levelList in assignments for level in levelList])
+        remaining = [level for level in levels if level not in assigned]
+        return solver.processQuantBuckets(buckets, remaining)
+
+    # Fork workers and gather their results.
+    # Stop once any worker finds the formula to be False.
+    # Return list of segments, ordered by worker index
+    def runWorkers(self, buckets, assignments):
+        self.firstClauseId = self.solver.prover.clauseCount + 1
+        self.firstNodeId = self.solver.manager.nextNodeId
+        # Workers must start with the state of the solver, and so they are forked
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = []
+        for index in range(len(assignments)):
+            fname = os.path.join(self.tempDir, "segment%d.qproof" % index)
+            p = context.Process(target = runWorker, daemon = True,
+                                args = (self.solver, buckets, assignments[index], fname, index, results))
+            p.start()
+            processes.append(p)
+        segments = [None] * len(processes)
+        try:
+            for count in range(len(processes)):
+                (index, status, terms, nodes, clauseCount, nextNodeId) = results.get()
+                if status is not None and status != "false":
+                    raise ParallelException("Worker %d %s" % (index, status))
+                fname = os.path.join(self.tempDir, "segment%d.qproof" % index)
+                segments[index] = Segment(index, fname, status, terms, nodes, clauseCount, nextNodeId)
+                if self.verbLevel >= 2:
+                    self.writer.write("Parallel buckets: worker %d finished.  %d clauses, %d nodes, %d terms produced\n" %
+                                      (index, clauseCount - self.firstClauseId + 1, nextNodeId - self.firstNodeId, len(terms)))
+                if status == "false":
+                    break
+        finally:
+            for p in processes:
+                if p.is_alive():
+                    p.terminate()
+            for p in processes:
+                p.join()
+        return [seg for seg in segments if seg is not None]
+
+    # Append proof segments, giving each its own range of clause ids and extension variables
+    def merge(self, segments):
+        manager = self.solver.manager
+        clauseShift = 0
+        nodeShift = 0
+        for seg in segments:
+            seg.clauseShift = clauseShift
+            seg.nodeShift = nodeShift
+            self.mergeSegment(seg)
+            clauseShift += seg.clauseCount - self.firstClauseId + 1
+            nodeShift += seg.nextNodeId - self.firstNodeId
+        manager.nextNodeId = self.firstNodeId + nodeShift
+
+    def shiftClause(self, seg, cid):
+        if cid is None or abs(cid) < self.firstClauseId or abs(cid) >= resolver.tautologyId:
+            return cid
+        return cid + seg.clauseShift if cid > 0 else cid - seg.clauseShift
+
+    def shiftNode(self, seg, id):
+        if id is None or abs(id) < self.firstNodeId or abs(id) >= resolver.tautologyId:
+            return id
+        return id + seg.nodeShift if id > 0 else id - seg.nodeShift
+
+    # Copy steps from segment into proof.
+    # Deletions of clauses created before the workers were forked are dropped,
+    # since other workers may still use those clauses
+    def mergeSegment(self, seg):
+        prover = self.solver.prover
+        try:
+            infile = open(seg.fname, 'r')
+        except Exception:
+            raise ParallelException("Couldn't open proof segment '%s'" % seg.fname)
+        for line in infile:
+            fields = line.split()
+            if len(fields) == 0 or fields[0] == 'c':
+                continue
+            cmd = fields[1]
+            values = [int(f) for f in fields[2:]]
+            if cmd == 'd':
+                ids = [self.shiftClause(seg, id) for id in values[:-1] if id >= self.firstClauseId]
+                if len(ids) > 0:
+                    prover.deleteClauses(ids)
+                continue
+            if cmd == 'x':
+                prover.copyStep(None, [cmd, str(values[0]), str(self.shiftNode(seg, values[1])), '0'])
+                continue
+            cid = self.shiftClause(seg, int(fields[0]))
+            if cmd == 'u':
+                (lit, oldId) = (values[0], self.shiftClause(seg, values[1]))
+                clause = [l for l in prover.clauseDict[oldId] if l != lit]
+                prover.copyStep(cid, [cmd, str(lit), str(oldId)], clause)
+            else:
+                # Added clause, followed by antecedents or blocking clauses
+                split = values.index(0)
+                clause = [self.shiftNode(seg, lit) for lit in values[:split]]
+                hints = [self.shiftClause(seg, h) for h in values[split+1:-1]]
+                prover.copyStep(cid, [cmd] + [str(lit) for lit in clause] + ['0'] + [str(h) for h in hints] + ['0'], clause)
+        infile.close()
+
+    # Create nodes and terms for results of workers and place them in buckets.
+    # Remove the terms that the workers consumed
+    def importResults(self, segments, buckets, assignments):
+        solver = self.solver
+        nodeMap = solver.manager.nodeMap()
+        newIds = []
+        for seg in segments:
+            exported = [(self.shiftNode(seg, id), level, self.shiftNode(seg, hid), self.shiftNode(seg, lid),
+                         tuple([self.shiftClause(seg, cid) for cid in inferIds]))
+                        for (id, level, hid, lid, inferIds) in seg.nodes]
+            (implications, clauseList) = solver.manager.importNodes(exported, nodeMap)
+            for (rootId, validation) in seg.terms:
+                rootId = self.shiftNode(seg, rootId)
+                root = nodeMap[rootId]
+                validation = self.shiftClause(seg, validation)
+                if rootId in implications:
+                    # Root was mapped onto equivalent node
+                    comment = "Validation of %s" % root.label()
+                    newValidation = solver.prover.proveAddResolution([root.id], [validation, implications[rootId]], comment)
+                    clauseList.append(validation)
+                    validation = newValidation
+                newIds.append(solver.addTerm(root, validation))
+            clauseList += list(implications.values())
+            if len(clauseList) > 0:
+                solver.prover.deleteClauses(clauseList)
+        if self.verbLevel >= 1 and solver.manager.nodesMapped > 0:
+            self.writer.write("Parallel buckets: %d imported nodes mapped onto equivalent nodes\n" % solver.manager.nodesMapped)
+        for levelList in assignments:
+            for level in levelList:
+                ids = buckets[level]
+                buckets[level] = []
+                for id in ids:
+                    solver.removeTerm(id)
+        for id in newIds:
+            solver.placeInQuantBucket(buckets, id)
@@ -23,6 +23,7 @@
 import sys
 import bdd
 import resolver
+import util
 
 
 class ProverException(Exception):
@@ -43,6 +44,8 @@ class Prover:
     clauseCount = 0
     proofCount = 0
     file = None
+    # File inherited from parent by worker process
+    inherited = None
     writer = None
     opened = False
     verbLevel = 1
@@ -63,7 +66,8 @@ class Prover:
     # Restrict justifications that encounter degenerate case
     restrictDegeneracies = set([])
 
-    def __init__(self, fname = None, writer = None, mode = None, verbLevel = 1):
+    # Background writer thread, when enabled, with queue of specified depth
+    def __init__(self, fname = None, writer = None, mode = None, verbLevel = 1, background = None):
         if mode is None:
             self.mode = ProverMode.noProof
         else:
@@ -76,11 +80,17 @@ class Prover:
         else:
             self.opened = True
             try:
-                self.file = open(fname, 'w')
+                self.file = util.openText(fname, 'w')
             except Exception:
                 raise ProverException("Could not open file '%s'" % fname)
-            fields = fname.split('.')
+            (base, suffix) = util.splitCompression(fname)
+            fields = base.split('.')
             self.doQrat = fields[-1] == 'qrat'
+            # Compress in separate thread
+            if suffix is not None and background is None:
+                background = 8
+        if background is not None:
+            self.file = util.BackgroundWriter(self.file, closeFile = self.opened, depth = background)
         self.writer = sys.stderr if writer is None else writer
         self.clauseCount = 0
         self.proofCount = 0
@@ -90,6 +100,16 @@ class Prover:
         self.evarQlevels = {}
         self.restrictDegeneracies = set([])
 
+    # Send proof steps to segment file, as is done by worker process.
+    # Keep inherited file, so that it won't be flushed or closed by this process
+    def redirect(self, fname):
+        self.inherited = self.file
+        try:
+            self.file = open(fname, 'w')
+        except Exception:
+            raise ProverException("Could not open file '%s'" % fname)
+        self.opened = True
+
     def inputDone(self):
         self.inputClauseCount = self.clauseCount
 
@@ -165,6 +185,17 @@ class Prover:
             self.file.write(' '.join(fields) + '\n')
         return self.clauseCount
 
+    # Copy step generated by another prover, with its clause Id (None when unnumbered)
+    # already adjusted for this proof
+    def copyStep(self, id, fields, clause = None):
+        if id is None:
+            fields = ['-'] + fields
+        else:
+            self.clauseCount = id
+            self.clauseDict[id] = clause
+            fields = [str(id)] + fields
+        self.file.write(' '.join(fields) + '\n')
+
     ## Refutation and satisfaction steps
 
     # Declare variable levels when not default
@@ -337,6 +368,11 @@ class Prover:
             self.writer.write("Added clauses without antecedents: %d\n" % acount)
             self.writer.write("Added clauses requiring proofs: %d\n" % (self.proofCount))
 
-    def __del__(self):
-        if self.opened:
+    # Finish writing proof and close file
+    def close(self):
+        if isinstance(self.file, util.BackgroundWriter) or self.opened:
             self.file.close()
+        self.opened = False
+
+    def __del__(self):
+        self.close()
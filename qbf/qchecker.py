@@ -25,11 +25,23 @@
 import sys
 import getopt
 import datetime
+import gzip
+import lzma
+import bz2
 
 def usage(name):
     print("Usage: %s [-v] -m (s|r|d) -i FILE.qcnf -p FILE.qproof" % name)
     print("   -m MODE   Set proof mode (s = satisfaction, r = refutation.  Default is to work either way)")
     print("   -v        Print more helpful diagnostic information if there is an error")
+    print("   Files ending in .gz, .xz, or .bz2 are decompressed while reading")
+
+# Open text file for reading, decompressing on the fly according to suffix
+def openInput(fname):
+    compressors = { 'gz' : gzip, 'xz' : lzma, 'bz2' : bz2 }
+    suffix = fname.split('.')[-1]
+    if suffix in compressors:
+        return compressors[suffix].open(fname, 'rt')
+    return open(fname, 'r')
 
 ######################################################################################
 # Checker format
@@ -265,7 +277,7 @@ class QcnfReader():
         self.failed = False
         self.errorMessage = ""
         try:
-            self.file = open(fname, 'r')
+            self.file = openInput(fname)
         except Exception:
             self.fail("Could not open file '%s'" % fname)
             return
@@ -621,7 +633,7 @@ class Prover:
             self.failProof("Problem with QCNF file")
             return
         try:
-            pfile = open(fname)
+            pfile = openInput(fname)
         except:
             self.failProof("Couldn't open proof file '%s" % fname)
             return
@@ -31,22 +31,26 @@ import bdd
 import resolver
 import proof
 import util
+import parallel
 
 
 # Increase maximum recursion depth
 sys.setrecursionlimit(50 * sys.getrecursionlimit())
 
 def usage(name):
-    sys.stderr.write("Usage: %s [-h][-v LEVEL] [-m (n|d|s|r)] [-l e|u|eu] [-i CNF] [-o file.{qrat,qproof}] [-B BPERM] [-p VPERM] [-c CLUSTER] [-L logfile]\n" % name)
+    sys.stderr.write("Usage: %s [-h][-v LEVEL] [-m (n|d|s|r)] [-l e|u|eu] [-i CNF] [-o file.{qrat,qproof}[.gz|.xz|.bz2]] [-B BPERM] [-p VPERM] [-c CLUSTER] [-W DEPTH] [-K] [-j WORKERS] [-L logfile]\n" % name)
     sys.stderr.write("  -h          Print this message\n")
     sys.stderr.write("  -m MODE     Set proof mode (n = no proof, d = dual, s = satisfaction only, r = refutation only)\n")
     sys.stderr.write("  -l e|u|eu   Linearize quantifier blocks for existential (e) and/or universal (u) variables\n")
     sys.stderr.write("  -v LEVEL    Set verbosity level\n")
     sys.stderr.write("  -i CNF      Name of CNF input file\n")
-    sys.stderr.write("  -o pfile    Name of proof output file (QRAT or QPROOF format)\n")
+    sys.stderr.write("  -o pfile    Name of proof output file (QRAT or QPROOF format, optionally compressed)\n")
     sys.stderr.write("  -B BPERM    Process terms via bucket elimination ordered by permutation file BPERM\n")
     sys.stderr.write("  -p VPERM    Name of file specifying mapping from CNF variable to BDD level\n")
     sys.stderr.write("  -c CLUSTER  Name of file specifying how to group clauses into clusters\n")
+    sys.stderr.write("  -W DEPTH    Write proof in background thread, with queue of DEPTH batches\n")
+    sys.stderr.write("  -K          Load clauses and quantifier blocks from binary cache CNF.cache, creating or updating it when missing or out of date\n")
+    sys.stderr.write("  -j WORKERS  Process independent subtrees of quantifier levels with up to WORKERS processes (requires no proof or QPROOF refutation proof)\n")
     sys.stderr.write("  -L logfile  Append standard error output to logfile\n")
 
 # Verbosity levels
@@ -515,6 +519,14 @@ class SolverException(Exception):
         return "Solver Exception: " + str(self.value)
 
 
+class NullWriter:
+
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
 class Solver:
     
     verbLevel = 1
@@ -859,8 +871,9 @@ class Solver:
         if level > 0:
             buckets[level].append(id)
 
-    # Bucket elimination based on quantification levels
-    def runQuantBucket(self):
+    # Bucket elimination based on quantification levels.
+    # With multiple workers, independent subtrees of levels are processed in parallel
+    def runQuantBucket(self, workerCount = None):
         levels = sorted(self.quantMap.keys(), key = lambda x : -x)
         buckets = { level : [] for level in levels }
         # Insert ids into lists according quantification level
@@ -869,6 +882,35 @@ class Solver:
             if self.verbLevel >= 3:
                 self.writer.write("Initial cluster #%d.  Size: %d\n" % (id, self.activeIds[id].size))
             self.placeInQuantBucket(buckets, id)
+        if workerCount is not None:
+            runner = parallel.ParallelBuckets(self, workerCount)
+            if runner.run(buckets, levels) is False:
+                if self.outcome is None:
+                    # Formula found False by worker
+                    if self.verbLevel >= 1:
+                        self.writer.write("Parallel buckets: Formula FALSE\n")
+                    self.outcome = False
+                    self.manager.summarize()
+                return
+        elif self.processQuantBuckets(buckets, levels) is False:
+            return
+
+        # Get here only haven't hit 0
+        if self.prover.mode in [proof.ProverMode.satProof, proof.ProverMode.dualProof]:
+            # Make sure all clauses cleared away
+            self.prover.qcollect(1)
+
+        if self.verbLevel >= 0:
+            if self.prover.mode == proof.ProverMode.refProof:
+                self.writer.write("ERROR: Formula is TRUE\n")
+            else:
+                self.writer.write("Formula is TRUE\n")
+            self.manager.summarize()
+
+    # Process listed levels in order.  Results are placed in buckets according to their levels,
+    # and so those destined for other levels are left there.
+    # Return False if formula found to be False, and None otherwise
+    def processQuantBuckets(self, buckets, levels):
         for blevel in levels:
             vars, isExistential = self.quantMap[blevel]
             if self.verbLevel >= 3:
@@ -883,7 +925,7 @@ class Solver:
                     newId = self.combineTerms(id1, id2)
                     if newId < 0:
                         # Hit False case
-                        return
+                        return False
                     self.placeInQuantBucket(buckets, newId)
                 if blevel > 0 and len(buckets[blevel]) > 0:
                     id = buckets[blevel][0]
@@ -914,7 +956,7 @@ class Solver:
                             newId = self.uquantifyTermDual(id, v)
                         if newId < 0:
                             # Formula is False
-                            return
+                            return False
                         self.placeInQuantBucket(buckets, newId)
                 else:
                     # Satisfaction, or no proof
@@ -927,20 +969,25 @@ class Solver:
                                     self.writer.write("ERROR: Formula is FALSE\n")
                                 else:
                                     self.writer.write("Formula is FALSE\n")
-                                return
+                                return False
                         self.placeInQuantBucket(buckets, newId)
+        return None
 
-        # Get here only haven't hit 0
-        if self.prover.mode in [proof.ProverMode.satProof, proof.ProverMode.dualProof]:
-            # Make sure all clauses cleared away
-            self.prover.qcollect(1)
+    # Add term with root and validation generated elsewhere.  Return its id
+    def addTerm(self, root, validation):
+        self.termCount += 1
+        self.activeIds[self.termCount] = Term(self.manager, root, validation, mode = self.prover.mode)
+        return self.termCount
 
-        if self.verbLevel >= 0:
-            if self.prover.mode == proof.ProverMode.refProof:
-                self.writer.write("ERROR: Formula is TRUE\n")
-            else:
-                self.writer.write("Formula is TRUE\n")
-            self.manager.summarize()
+    def removeTerm(self, id):
+        del self.activeIds[id]
+
+    # Set up forked worker process.  Proof steps go to segment file, and all other output is discarded
+    def becomeWorker(self, segmentName):
+        self.prover.redirect(segmentName)
+        self.writer = NullWriter()
+        self.prover.writer = self.writer
+        self.manager.writer = self.writer
 
     # Provide roots of active nodes to garbage collector
     def rootGenerator(self):
@@ -960,8 +1007,11 @@ def run(name, args):
     clusterFile = None
     stretchExistential = False
     stretchUniversal = False
+    background = None
+    cache = False
+    workerCount = None
 
-    optlist, args = getopt.getopt(args, "hbB:c:m:l:v:i:o:m:p:L:")
+    optlist, args = getopt.getopt(args, "hbB:c:m:l:v:i:o:m:p:L:W:Kj:")
     for (opt, val) in optlist:
         if opt == '-h':
             usage(name)
@@ -1009,6 +1059,26 @@ def run(name, args):
                 return
         elif opt == '-L':
             logName = val
+        elif opt == '-W':
+            try:
+                background = int(val)
+            except:
+                sys.stderr.write("Invalid writer queue depth '%s'\n" % val)
+                return
+            if background < 1:
+                sys.stderr.write("Invalid writer queue depth %d\n" % background)
+                return
+        elif opt == '-K':
+            cache = True
+        elif opt == '-j':
+            try:
+                workerCount = int(val)
+            except:
+                sys.stderr.write("Invalid number of bucket workers '%s'\n" % val)
+                return
+            if workerCount < 1:
+                sys.stderr.write("Invalid number of bucket workers %d\n" % workerCount)
+                return
         else:
             sys.stderr.write("Unknown option '%s'\n" % opt)
             usage(name)
@@ -1022,11 +1092,19 @@ def run(name, args):
     writer = util.Logger(logName)
 
     try:
-        prover = proof.Prover(proofName, writer = writer, verbLevel = verbLevel, mode = mode)
+        prover = proof.Prover(proofName, writer = writer, verbLevel = verbLevel, mode = mode, background = background)
     except Exception as ex:
         writer.write("Couldn't create prover (%s)\n" % str(ex))
         return
 
+    if workerCount is not None:
+        if mode not in [proof.ProverMode.noProof, proof.ProverMode.refProof]:
+            writer.write("Parallel buckets require no proof or refutation proof\n")
+            return
+        if prover.doQrat:
+            writer.write("Parallel buckets cannot generate QRAT proof\n")
+            return
+
     start = datetime.datetime.now()
 
     if mode in [proof.ProverMode.satProof, proof.ProverMode.dualProof]:
@@ -1035,10 +1113,12 @@ def run(name, args):
         stretchUniversal = True
 
     try:
-        reader = util.QcnfReader(cnfName, bpermuter, stretchExistential, stretchUniversal)
+        reader = util.QcnfReader(cnfName, bpermuter, stretchExistential, stretchUniversal, cache = cache)
     except Exception as ex:
         writer.write("Aborted: %s\n" % str(ex))
         return
+    if reader.cacheStatus is not None and verbLevel >= 2:
+        writer.write("QCNF cache: %s\n" % reader.cacheStatus)
 
     if reader.stretched and mode != proof.ProverMode.noProof:
         prover.generateLevels(reader.varList)
@@ -1046,13 +1126,14 @@ def run(name, args):
     solver = Solver(reader, prover = prover, permuter = permuter, verbLevel = verbLevel)
 
     if clusterFile is None or solver.processClusters(clusterFile):
-        solver.runQuantBucket()
+        solver.runQuantBucket(workerCount)
 
 
     delta = datetime.datetime.now() - start
     seconds = delta.seconds + 1e-6 * delta.microseconds
     if verbLevel > 0:
         writer.write("Elapsed time for SAT: %.2f seconds\n" % seconds)
+    prover.close()
     if writer != sys.stderr:
         writer.close()
 
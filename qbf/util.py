@@ -22,6 +22,13 @@
 
 
 import sys
+import threading
+import queue
+import gzip
+import lzma
+import bz2
+
+import dimacs
 
 def trim(s):
     while len(s) > 0 and s[-1] in ' \r\n\t':
@@ -54,6 +61,102 @@ class Logger:
             self.outFile.close()
 
 
+###########################################################################################
+## Compressed files, based on suffix .gz, .xz, or .bz2
+###########################################################################################
+compressors = { 'gz' : gzip, 'xz' : lzma, 'bz2' : bz2 }
+
+# Split file name into base name and compression suffix (None if not compressed)
+def splitCompression(fname):
+    fields = fname.split('.')
+    if len(fields) > 1 and fields[-1] in compressors:
+        return ('.'.join(fields[:-1]), fields[-1])
+    return (fname, None)
+
+# Open text file, compressed according to suffix.  Mode is 'r' or 'w'
+def openText(fname, mode):
+    (base, suffix) = splitCompression(fname)
+    if suffix is None:
+        return open(fname, mode)
+    return compressors[suffix].open(fname, mode + 't')
+
+###########################################################################################
+## Perform output to file in separate thread
+###########################################################################################
+# Put item in bounded queue read by writer's thread.
+# Waits while the queue is full, but gives up if the thread has died (e.g., disk full),
+# raising the error it encountered
+def putChecked(q, item, writer, timeout = 0.1):
+    while True:
+        try:
+            q.put(item, timeout = timeout)
+            return
+        except queue.Full:
+            if writer.error is not None:
+                raise writer.error
+            if not writer.thread.is_alive():
+                raise OSError("Writer thread stopped")
+
+# Text is passed to writer thread in batches via bounded queue.
+# Writes block when queue is full
+class BackgroundWriter:
+    file = None
+    closeFile = False
+    queue = None
+    thread = None
+    batch = []
+    batchSize = 256
+    error = None
+
+    def __init__(self, file, closeFile = True, depth = 64, batchSize = 256):
+        self.file = file
+        self.closeFile = closeFile
+        self.queue = queue.Queue(maxsize = depth)
+        self.batch = []
+        self.batchSize = batchSize
+        self.error = None
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    # Writer thread.  Batch of None indicates end of output
+    def run(self):
+        try:
+            while True:
+                batch = self.queue.get()
+                if batch is None:
+                    break
+                self.file.write(''.join(batch))
+        except Exception as ex:
+            self.error = ex
+
+    def write(self, text):
+        self.batch.append(text)
+        if len(self.batch) >= self.batchSize:
+            self.send()
+
+    def send(self):
+        if self.error is not None:
+            raise self.error
+        putChecked(self.queue, self.batch, self)
+        self.batch = []
+
+    # Write all text, stop writer thread, and close file
+    def close(self):
+        if self.thread is None:
+            return
+        try:
+            if len(self.batch) > 0:
+                self.send()
+            putChecked(self.queue, None, self)
+            self.thread.join()
+        finally:
+            self.thread = None
+            if self.closeFile:
+                self.file.close()
+        if self.error is not None:
+            raise self.error
+
+
 class PermutationException(Exception):
 
     def __init__(self, value):
@@ -74,21 +177,86 @@ class CnfException(Exception):
     def __str__(self):
         return "CNF Exception: " + str(self.value)
 
+# Binary cache for QCNF files uses the CNF cache format of dimacs,
+# with the quantifier blocks stored as the prefix.
+# Each block is encoded as 1 (existential) or 0 (universal),
+# followed by the number of variables and then the variables
+qcnfCacheMagic = b'BDDQCF01'
+
+def encodeBlocks(blocks):
+    values = []
+    for (isExistential, vars) in blocks:
+        values += [1 if isExistential else 0, len(vars)] + vars
+    return values
+
+def decodeBlocks(values):
+    blocks = []
+    pos = 0
+    while pos < len(values):
+        count = values[pos+1]
+        blocks.append((values[pos] == 1, values[pos+2:pos+2+count]))
+        pos += 2 + count
+    return blocks
+
 # Read QCNF file.
 # Save variables as list of tuples with form (varNumber, qlevel, isExistential)
 # Save list of clauses, each is a list of literals (zero at end removed)
 # Also saves comment lines
+# The clause body is parsed in bulk when possible, with the quantifier declarations
+# checked line by line, falling back to reading the whole file line by line
+# for standard input and for files that fail the bulk validation checks.
+# Optionally, clauses and quantifier blocks are loaded from and saved to a binary cache next to the file
 class QcnfReader():
     file = None
     clauses = []
     # List of input variables.
     # Each is triple of form (varNumber, qlevel, isExistential)
     varList = []
+    # Quantifier blocks, as declared in file.
+    # Each is pair of form (isExistential, vars)
+    blocks = []
     nvar = 0
     # Were any of the quantifier blocks stretched into multiple levels
     stretched = False
+    # Outcome of using cache: None (not used), 'loaded', 'saved', or message describing failure
+    cacheStatus = None
     
-    def __init__(self, fname = None, permuter = None, stretchExistential = False, stretchUniversal = False):
+    def __init__(self, fname = None, permuter = None, stretchExistential = False, stretchUniversal = False, cache = False):
+        self.cacheStatus = None
+        if fname is None:
+            cache = False
+        if cache:
+            prefix = []
+            carray = dimacs.loadCache(fname, qcnfCacheMagic, prefix)
+            if carray is not None:
+                self.nvar = carray.nvar
+                self.startPrefix()
+                self.blocks = decodeBlocks(prefix)
+                qlevel = 1
+                foundDict = {}
+                for (isExistential, vars) in self.blocks:
+                    for v in vars:
+                        foundDict[v] = 0
+                    qlevel = self.addBlock(isExistential, vars, qlevel, permuter, stretchExistential, stretchUniversal)
+                self.addOuterVariables(foundDict)
+                self.clauses = carray.clauseLists()
+                self.cacheStatus = 'loaded'
+                return
+        if fname is not None:
+            declarations = []
+            carray = dimacs.readClauses(fname, prefixChars = b'ae', declarations = declarations)
+            if carray is not None:
+                self.nvar = carray.nvar
+                self.startPrefix()
+                foundDict = {}
+                qlevel = 1
+                for (lineNumber, line) in declarations:
+                    qlevel = self.declareVariables(lineNumber, trim(line), foundDict, qlevel, permuter, stretchExistential, stretchUniversal)
+                self.addOuterVariables(foundDict)
+                self.clauses = carray.clauseLists()
+                if cache:
+                    self.saveCache(fname, carray)
+                return
         if fname is None:
             opened = False
             self.file = sys.stdin
@@ -105,19 +273,33 @@ class QcnfReader():
             if opened:
                 self.file.close()
             raise ex
+        if cache:
+            self.saveCache(fname, dimacs.fromLists(self.nvar, self.clauses))
+
+    def saveCache(self, fname, carray):
+        try:
+            dimacs.saveCache(fname, carray, qcnfCacheMagic, encodeBlocks(self.blocks))
+            self.cacheStatus = 'saved'
+        except OSError as ex:
+            self.cacheStatus = "couldn't save cache (%s)" % str(ex)
+
+    # Clear quantifier prefix before adding blocks
+    def startPrefix(self):
+        self.stretched = False
+        self.varList = []
+        self.blocks = []
         
     # Read QCNF file.  Optionally, have split quantifier blocks into ones with single
     # variables.
     # Only use odd levels to keep room for extension variables at even levels
     def readCnf(self, permuter = None, stretchExistential = False, stretchUniversal = False):
         self.nvar = 0
-        self.stretched = False
+        self.startPrefix()
         # Dictionary of variables that have been declared.
         # Maps from var to line number
         foundDict = {}
         lineNumber = 0
         nclause = 0
-        self.varList = []
         qlevel = 1
         clauseCount = 0
         for line in self.file:
@@ -137,37 +319,7 @@ class QcnfReader():
                 except Exception:
                     raise CnfException("Line %d.  Bad header line '%s'.  Invalid number of variables or clauses" % (lineNumber, line))
             elif line[0] == 'a' or line[0] == 'e':
-                # Variable declaration
-                isExistential = line[0] == 'e'
-                try:
-                    vars = [int(s) for s in line[1:].split()]
-                except:
-                    raise CnfException("Line %d.  Non-integer field" % lineNumber)
-                # Last one should be 0
-                if vars[-1] != 0:
-                    raise CnfException("Line %d.  Clause line should end with 0" % lineNumber)
-                vars = vars[:-1]
-                # First make sure all vars are legitimate
-                for v in vars:
-                    if v <= 0 or v > self.nvar:
-                        raise CnfException("Line %d.  Invalid variable %d" % (lineNumber, v))
-                    if v in foundDict:
-                        raise CnfException("Line %d.  Variable %d already declared on line %d" % (lineNumber, v, foundDict[v]))
-                    foundDict[v] = lineNumber
-                # Now add them, either as a group, or sequentially
-                if isExistential and stretchExistential or (not isExistential and stretchUniversal):
-                    if len(vars) > 1:
-                        self.stretched = True
-                    if permuter is not None:
-                        vars = permuter.sortList(vars) 
-                    for v in vars:
-                        self.varList.append((v, qlevel, isExistential))
-                        qlevel += 2
-                else:
-                    for v in vars:
-                        self.varList.append((v, qlevel, isExistential))
-                    # Prepare for next set of input variables
-                    qlevel += 2
+                qlevel = self.declareVariables(lineNumber, line, foundDict, qlevel, permuter, stretchExistential, stretchUniversal)
             else:
                 if nclause == 0:
                     raise CnfException("Line %d.  No header line.  Not cnf" % (lineNumber))
@@ -192,7 +344,53 @@ class QcnfReader():
                 clauseCount += 1
         if clauseCount != nclause:
             raise CnfException("Line %d: Got %d clauses.  Expected %d" % (lineNumber, clauseCount, nclause))
-        # See if there are any undeclared variables.
+        self.addOuterVariables(foundDict)
+
+    # Process quantifier declaration line.
+    # Dictionary foundDict maps each variable declared so far to its line number.
+    # Return next available quantifier level
+    def declareVariables(self, lineNumber, line, foundDict, qlevel, permuter, stretchExistential, stretchUniversal):
+        # Variable declaration
+        isExistential = line[0] == 'e'
+        try:
+            vars = [int(s) for s in line[1:].split()]
+        except:
+            raise CnfException("Line %d.  Non-integer field" % lineNumber)
+        # Last one should be 0
+        if vars[-1] != 0:
+            raise CnfException("Line %d.  Clause line should end with 0" % lineNumber)
+        vars = vars[:-1]
+        # First make sure all vars are legitimate
+        for v in vars:
+            if v <= 0 or v > self.nvar:
+                raise CnfException("Line %d.  Invalid variable %d" % (lineNumber, v))
+            if v in foundDict:
+                raise CnfException("Line %d.  Variable %d already declared on line %d" % (lineNumber, v, foundDict[v]))
+            foundDict[v] = lineNumber
+        self.blocks.append((isExistential, vars))
+        return self.addBlock(isExistential, vars, qlevel, permuter, stretchExistential, stretchUniversal)
+
+    # Add quantifier block.
+    # Return next available quantifier level
+    def addBlock(self, isExistential, vars, qlevel, permuter, stretchExistential, stretchUniversal):
+        # Add variables, either as a group, or sequentially
+        if isExistential and stretchExistential or (not isExistential and stretchUniversal):
+            if len(vars) > 1:
+                self.stretched = True
+            if permuter is not None:
+                vars = permuter.sortList(vars) 
+            for v in vars:
+                self.varList.append((v, qlevel, isExistential))
+                qlevel += 2
+        else:
+            for v in vars:
+                self.varList.append((v, qlevel, isExistential))
+            # Prepare for next set of input variables
+            qlevel += 2
+        return qlevel
+
+    # Add any undeclared variables to outermost quantifier block
+    def addOuterVariables(self, foundDict):
         outerVars = [v for v in range(1, self.nvar+1) if v not in foundDict]
         if len(outerVars) > 0:
             # These are added as existential variables in first quantifier block